@@ -0,0 +1,124 @@
+from collections import Counter, defaultdict
+from django.apps import apps
+from django.db import transaction
+from django.db.models import Count, Sum, Q, F
+from .versions import bump
+
+BAND_STAT_FIELDS = ["player_count", "men_count", "women_count", "matchesplayed", "wins"]
+SOURCE_FIELDS = ["band_id", "gender", "is_active", "matchesplayed", "wins"]
+
+def band_stat_changes():
+    return defaultdict(Counter)
+
+def contribution(band_id=None, gender=None, is_active=False, matchesplayed=0, wins=0):
+    """What one player adds to their band's counters."""
+    if band_id is None or not is_active:
+        return band_id, Counter()
+    return band_id, Counter(
+        player_count=1,
+        men_count=int(gender == "Male"),
+        women_count=int(gender == "Female"),
+        matchesplayed=matchesplayed,
+        wins=wins,
+    )
+
+def remember_band_stat_source(sender, instance, **kwargs):
+    # Read __dict__ so deferred fields are not fetched; None means "look it up
+    # on save", an empty tuple an unsaved player that counts nowhere yet.
+    values = instance.__dict__
+    if values.get("id") is None:
+        instance._band_stat_source = ()
+    elif all(field in values for field in SOURCE_FIELDS):
+        instance._band_stat_source = tuple(values[field] for field in SOURCE_FIELDS)
+    else:
+        instance._band_stat_source = None
+
+def load_band_stat_source(player):
+    """Fetch the stored values of a player loaded with deferred fields, before they are overwritten."""
+    if getattr(player, "_band_stat_source", None) is None:
+        Player = apps.get_model("academy", "Player")
+        player._band_stat_source = Player.all_objects.filter(pk=player.pk).values_list(*SOURCE_FIELDS).first() or ()
+
+def record_player_change(changes, player, deleted=False):
+    """Add the difference between ``player`` as loaded and as it is now to ``changes``."""
+    old = player._band_stat_source
+    new = () if deleted else tuple(getattr(player, field) for field in SOURCE_FIELDS)
+
+    band_id, counts = contribution(*old)
+    changes[band_id].subtract(counts)
+    band_id, counts = contribution(*new)
+    changes[band_id].update(counts)
+    player._band_stat_source = new
+
+def apply_band_stat_changes(changes):
+    BandStats = apps.get_model("academy", "BandStats")
+    changed = False
+    for band_id, counts in changes.items():
+        values = {field: F(field) + delta for field, delta in counts.items() if delta}
+        if band_id is not None and values:
+            if not BandStats.objects.filter(band_id=band_id).update(**values):
+                # No row yet (a band written with bulk_create): count it from scratch
+                reconcile_band_stats([band_id])
+            changed = True
+    if changed:
+        # The band list shows these counters
+        bump(apps.get_model("academy", "Band"))
+
+def actual_band_stats(bands=None):
+    """Band counters computed from scratch in one grouped query, keyed by band id."""
+    Player = apps.get_model("academy", "Player")
+    players = Player.objects.all()
+    if bands is not None:
+        players = players.filter(band__in=bands)
+    rows = (
+        players
+        .values("band_id")
+        .annotate(
+            player_count=Count("pk"),
+            men_count=Count("pk", filter=Q(gender="Male")),
+            women_count=Count("pk", filter=Q(gender="Female")),
+            matchesplayed=Sum("matchesplayed"),
+            wins=Sum("wins"),
+        )
+        .order_by()
+    )
+    return {row.pop("band_id"): {field: row[field] or 0 for field in BAND_STAT_FIELDS} for row in rows}
+
+def reconcile_band_stats(bands=None, fix=True):
+    """
+    Compare the stored band counters with the players and, when ``fix`` is
+    set, overwrite the ones that drifted. Returns (band_id, field, stored,
+    actual) for every difference found.
+    """
+    Band = apps.get_model("academy", "Band")
+    BandStats = apps.get_model("academy", "BandStats")
+    if bands is not None:
+        bands = Band.objects.filter(pk__in=[getattr(band, "pk", band) for band in bands])
+    else:
+        bands = Band.objects.all()
+    band_ids = list(bands.values_list("pk", flat=True))
+
+    with transaction.atomic():
+        actual = actual_band_stats(band_ids)
+        stored = {stats.band_id: stats for stats in BandStats.objects.select_for_update().filter(band_id__in=band_ids)}
+
+        drift, changed, missing = [], [], []
+        for band_id in band_ids:
+            expected = actual.get(band_id, dict.fromkeys(BAND_STAT_FIELDS, 0))
+            stats = stored.get(band_id)
+            if stats is None:
+                drift.append((band_id, "missing", None, None))
+                missing.append(BandStats(band_id=band_id, **expected))
+                continue
+            differences = [(field, getattr(stats, field), expected[field]) for field in BAND_STAT_FIELDS if getattr(stats, field) != expected[field]]
+            if differences:
+                drift += [(band_id, *difference) for difference in differences]
+                for field, _, value in differences:
+                    setattr(stats, field, value)
+                changed.append(stats)
+
+        if fix and (missing or changed):
+            BandStats.objects.bulk_create(missing, batch_size=500)
+            BandStats.objects.bulk_update(changed, BAND_STAT_FIELDS, batch_size=500)
+            bump(Band)
+    return drift
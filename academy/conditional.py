@@ -0,0 +1,46 @@
+import hashlib
+from django.apps import apps
+from django.utils.timezone import now
+from django.views.decorators.cache import cache_control
+from django.views.decorators.http import condition
+from .versions import request_versions
+
+def page_etag(request, *parts):
+    """
+    ETag for a page rendered from ``parts``. The same URL renders differently
+    per user, per CSRF secret (forms embed tokens) and for HTMX, so those are
+    part of it too.
+    """
+    key = (request.user.pk, request.META.get("CSRF_COOKIE"), bool(request.htmx), request.get_full_path(), parts)
+    return hashlib.sha256(repr(key).encode()).hexdigest()[:32]
+
+def versions_etag(*names, moving=None):
+    """
+    ETag function for pages that only show rows of the versioned models
+    ``names``. ``moving``, a function of the request, adds what the page
+    shows that changes with time alone, and no write would bump.
+    """
+    def etag(request, *args, **kwargs):
+        parts = [sorted(request_versions(request, names).items())]
+        if moving is not None:
+            parts.append(moving(request))
+        return page_etag(request, *parts)
+    return etag
+
+def reign_days(request):
+    """The days each current reign has lasted, as the history shows them: one query."""
+    ChampionshipHistory = apps.get_model("academy", "ChampionshipHistory")
+    current = ChampionshipHistory.objects.filter(ended_on__isnull=True).order_by("pk").values_list("pk", "started_on")
+    today = now()
+    return [(pk, (today - started_on).days) for pk, started_on in current]
+
+def conditional_page(etag_func):
+    """
+    Answer a GET with 304 Not Modified, before the view runs a query or
+    renders anything, while the client's copy still has the ETag that
+    ``etag_func`` gives. Clients are told to revalidate on every use.
+    Only for views that do not take POST: the ETag is computed for any method.
+    """
+    def decorator(view):
+        return cache_control(private=True, no_cache=True)(condition(etag_func=etag_func)(view))
+    return decorator
@@ -1,5 +1,5 @@
 from django import forms
-from .models import Band, Player, Championship, Rule
+from .models import Band, Player, Championship, Rule, BulkGrant
 
 class BandForm(forms.ModelForm):
     class Meta:
@@ -52,6 +52,8 @@ class PlayerFilterForm(forms.Form):
             ("-wins", "Wins (High → Low)"),
             ("winningpercentage", "Win % (Low → High)"),
             ("-winningpercentage", "Win % (High → Low)"),
+            ("rating", "Rating (Low → High)"),
+            ("-rating", "Rating (High → Low)"),
             ("matchesplayed", "Matches (Low → High)"),
             ("-matchesplayed", "Matches (High → Low)"),
             ("networth", "Networth (Low → High)"),
@@ -60,3 +62,34 @@ class PlayerFilterForm(forms.Form):
         required=False,
         widget=forms.Select(attrs={"class": "form-select", "onchange": "this.form.submit();"})
     )
+
+class BulkGrantForm(forms.Form):
+    ACTIVE_CHOICES = [
+        ("true", "Active players"),
+        ("false", "Retired players"),
+        ("", "Active and retired"),
+    ]
+
+    target = forms.ChoiceField(choices=BulkGrant.TARGET_CHOICES, widget=forms.Select(attrs={"class": "form-select"}))
+    mode = forms.ChoiceField(choices=BulkGrant.MODE_CHOICES, widget=forms.Select(attrs={"class": "form-select"}))
+    amount = forms.FloatField(widget=forms.NumberInput(attrs={"class": "form-control", "step": "any"}))
+    bands = forms.ModelMultipleChoiceField(
+        queryset=Band.objects.all(),
+        required=False,
+        widget=forms.CheckboxSelectMultiple,
+    )
+    gender = forms.ChoiceField(
+        choices=[("", "All Genders")] + list(Player.GENDER_CHOICES),
+        required=False,
+        widget=forms.Select(attrs={"class": "form-select"}),
+    )
+    is_champion = forms.BooleanField(label="Only Champions", required=False)
+    active = forms.ChoiceField(
+        label="Players",
+        choices=ACTIVE_CHOICES,
+        required=False,
+        widget=forms.Select(attrs={"class": "form-select"}),
+    )
+
+    def clean_active(self):
+        return {"true": True, "false": False}.get(self.cleaned_data["active"])
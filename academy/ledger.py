@@ -0,0 +1,154 @@
+import math
+from collections import defaultdict
+from django.db import connection, transaction
+from django.db.models import F, Case, When, Value, FloatField, DateTimeField, IntegerField, CharField, Sum, Count
+from django.utils.timezone import now
+from .models import Player, Band, LedgerEntry, BulkGrant
+from .versions import bump
+
+ACCOUNTS = [(Player.all_objects, "player_id"), (Band.objects, "band_id")]
+
+def post(entries, amount, reason, player=None, band=None, match=None, auction=None):
+    """Queue a ledger entry in ``entries``; nothing is written until apply_ledger."""
+    if amount:
+        entries.append(LedgerEntry(player=player, band=band, amount=amount, reason=reason, match=match, auction=auction))
+
+def add_to_balances(manager, deltas, batch_size=500):
+    # networth = networth + CASE id WHEN ... END: the database adds to whatever
+    # is stored at that moment, so concurrent writers cannot lose an update.
+    deltas = list(deltas.items())
+    for start in range(0, len(deltas), batch_size):
+        batch = dict(deltas[start:start + batch_size])
+        manager.filter(pk__in=batch).update(networth=F("networth") + Case(
+            *[When(pk=pk, then=Value(delta)) for pk, delta in batch.items()],
+            default=Value(0.0),
+            output_field=FloatField(),
+        ))
+
+def apply_ledger(entries):
+    """Append ``entries`` and move every balance they touch, in one transaction."""
+    if not entries:
+        return
+    with transaction.atomic(savepoint=False):
+        LedgerEntry.objects.bulk_create(entries, batch_size=500)
+        changed = []
+        for manager, account in ACCOUNTS:
+            deltas = defaultdict(float)
+            for entry in entries:
+                if getattr(entry, account) is not None:
+                    deltas[getattr(entry, account)] += entry.amount
+            add_to_balances(manager, deltas)
+            if deltas:
+                changed.append(manager.model)
+        bump(*changed)
+
+def record_adjustment(instance, old_networth):
+    """Log a networth typed in by hand, which the form has already saved."""
+    if instance.networth != old_networth:
+        account = "band" if isinstance(instance, Band) else "player"
+        LedgerEntry.objects.create(**{account: instance}, amount=instance.networth - old_networth, reason="adjustment")
+
+def open_accounts(players=(), bands=()):
+    """Opening entries for accounts created with bulk_create, which skips the post_save signal."""
+    entries = []
+    for player in players:
+        post(entries, player.networth, "opening", player=player)
+    for band in bands:
+        post(entries, band.networth, "opening", band=band)
+    LedgerEntry.objects.bulk_create(entries, batch_size=500)
+
+def grant_accounts(target, bands=(), gender="", is_champion=False, active=None):
+    """The players or bands a bulk grant with these filters applies to."""
+    if target == "band":
+        accounts = Band.objects.all()
+        if bands:
+            accounts = accounts.filter(pk__in=[getattr(band, "pk", band) for band in bands])
+        if is_champion:
+            accounts = accounts.filter(player_band__championship__isnull=False)
+        return accounts
+
+    accounts = Player.all_objects.all()
+    if active is not None:
+        accounts = accounts.filter(is_active=active)
+    if bands:
+        accounts = accounts.filter(band__in=[getattr(band, "pk", band) for band in bands])
+    if gender:
+        accounts = accounts.filter(gender=gender)
+    if is_champion:
+        accounts = accounts.filter(championship__isnull=False)
+    return accounts
+
+def bulk_grant(target, value, mode="fixed", user=None, **filters):
+    """
+    Add ``value`` to every player or band (``target``) matching ``filters``
+    (see grant_accounts): a fixed amount, or with mode="percent" that
+    percentage of each networth. The ledger entries are written with one
+    INSERT ... SELECT and the balances with one UPDATE, so the number of
+    queries does not grow with the roster. Returns the BulkGrant audit row.
+    """
+    manager, account = (Band.objects, "band") if target == "band" else (Player.all_objects, "player")
+    amount = F("networth") * Value(value / 100) if mode == "percent" else Value(float(value))
+    filters = {key: option for key, option in filters.items() if option not in (None, "", False, (), [])}
+    if target == "band":
+        # Gender and the active flag only describe players
+        filters.pop("gender", None)
+        filters.pop("active", None)
+    if "bands" in filters:
+        filters["bands"] = [getattr(band, "pk", band) for band in filters["bands"]]
+
+    with transaction.atomic():
+        accounts = manager.filter(pk__in=grant_accounts(target, **filters).values("pk"))
+        totals = accounts.aggregate(accounts=Count("pk"), total=Sum(amount, output_field=FloatField()))
+        grant = BulkGrant.objects.create(
+            target=target, mode=mode, value=value, filters=filters, created_by=user,
+            accounts=totals["accounts"], total=totals["total"] or 0,
+        )
+        if not grant.accounts:
+            return grant
+
+        rows = accounts.annotate(
+            ledger_amount=amount,
+            ledger_reason=Value("grant", output_field=CharField()),
+            ledger_grant=Value(grant.pk, output_field=IntegerField()),
+            ledger_created_at=Value(now(), output_field=DateTimeField()),
+        ).values_list("pk", "ledger_amount", "ledger_reason", "ledger_grant", "ledger_created_at").order_by()
+        select, params = rows.query.sql_with_params()
+        columns = ", ".join(
+            connection.ops.quote_name(LedgerEntry._meta.get_field(name).column)
+            for name in (account, "amount", "reason", "bulk_grant", "created_at")
+        )
+        with connection.cursor() as cursor:
+            cursor.execute(f"INSERT INTO {connection.ops.quote_name(LedgerEntry._meta.db_table)} ({columns}) {select}", params)
+
+        accounts.update(networth=F("networth") + amount)
+        bump(manager.model)
+    return grant
+
+def materialize_balances(fix=True):
+    """
+    Recompute every networth as the sum of its ledger entries and, when
+    ``fix`` is set, overwrite the ones that differ. Returns (account, stored,
+    ledger total) for every difference.
+    """
+    drift = []
+    with transaction.atomic():
+        for manager, account in ACCOUNTS:
+            totals = dict(
+                LedgerEntry.objects
+                .filter(**{f"{account}__isnull": False})
+                .values_list(account)
+                .annotate(total=Sum("amount"))
+                .order_by()
+            )
+            changed = []
+            for instance in manager.all().iterator(chunk_size=2000):
+                total = totals.get(instance.pk, 0.0)
+                # Float sums depend on the order they are added in
+                if not math.isclose(instance.networth, total, rel_tol=1e-9, abs_tol=1e-6):
+                    drift.append((instance, instance.networth, total))
+                    instance.networth = total
+                    changed.append(instance)
+            if fix and changed:
+                manager.bulk_update(changed, ["networth"], batch_size=500)
+                bump(manager.model)
+    return drift
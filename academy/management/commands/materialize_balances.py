@@ -0,0 +1,21 @@
+from django.core.management.base import BaseCommand
+from academy.ledger import materialize_balances
+
+
+class Command(BaseCommand):
+    help = "Recompute every player and band networth from the ledger and fix any drift."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--dry-run", action="store_true", help="Report drift without fixing it.")
+
+    def handle(self, *args, **options):
+        drift = materialize_balances(fix=not options["dry_run"])
+        for instance, stored, total in drift:
+            self.stdout.write(f"{instance._meta.model_name} {instance.pk} ({instance}): networth is {stored:.2f}, ledger says {total:.2f}")
+
+        if not drift:
+            self.stdout.write(self.style.SUCCESS("Balances match the ledger."))
+        elif options["dry_run"]:
+            self.stdout.write(self.style.WARNING(f"Found {len(drift)} drifted balances."))
+        else:
+            self.stdout.write(self.style.SUCCESS(f"Fixed {len(drift)} drifted balances."))
@@ -0,0 +1,25 @@
+from django.core.management.base import BaseCommand
+from academy.band_stats import reconcile_band_stats
+
+
+class Command(BaseCommand):
+    help = "Recount the denormalized band statistics from the players and fix any drift."
+
+    def add_arguments(self, parser):
+        parser.add_argument("band_ids", type=int, nargs="*", help="Only check these bands.")
+        parser.add_argument("--dry-run", action="store_true", help="Report drift without fixing it.")
+
+    def handle(self, *args, **options):
+        drift = reconcile_band_stats(options["band_ids"] or None, fix=not options["dry_run"])
+        for band_id, field, stored, actual in drift:
+            if field == "missing":
+                self.stdout.write(f"band {band_id}: no statistics row")
+            else:
+                self.stdout.write(f"band {band_id}: {field} is {stored}, should be {actual}")
+
+        if not drift:
+            self.stdout.write(self.style.SUCCESS("Band statistics are in sync."))
+        elif options["dry_run"]:
+            self.stdout.write(self.style.WARNING(f"Found {len(drift)} drifted values."))
+        else:
+            self.stdout.write(self.style.SUCCESS(f"Fixed {len(drift)} drifted values."))
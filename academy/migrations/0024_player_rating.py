@@ -0,0 +1,18 @@
+# Generated by Django 5.2.18 on 2026-10-18 17:07
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('academy', '0023_alter_player_name'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='player',
+            name='rating',
+            field=models.FloatField(default=1500),
+        ),
+    ]
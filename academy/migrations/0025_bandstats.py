@@ -0,0 +1,55 @@
+# Generated by Django 5.2.18 on 2026-10-18 17:31
+
+import django.db.models.deletion
+from django.db import migrations, models
+from django.db.models import Count, Sum, Q
+
+
+def populate_band_stats(apps, schema_editor):
+    Band = apps.get_model('academy', 'Band')
+    Player = apps.get_model('academy', 'Player')
+    BandStats = apps.get_model('academy', 'BandStats')
+
+    rows = (
+        Player.objects
+        .filter(is_active=True)
+        .values('band_id')
+        .annotate(
+            player_count=Count('pk'),
+            men_count=Count('pk', filter=Q(gender='Male')),
+            women_count=Count('pk', filter=Q(gender='Female')),
+            matchesplayed=Sum('matchesplayed'),
+            wins=Sum('wins'),
+        )
+        .order_by()
+    )
+    totals = {row.pop('band_id'): row for row in rows}
+    BandStats.objects.bulk_create(
+        (
+            BandStats(band_id=band_id, **{field: value or 0 for field, value in totals.get(band_id, {}).items()})
+            for band_id in Band.objects.values_list('pk', flat=True)
+        ),
+        batch_size=500,
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('academy', '0024_player_rating'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='BandStats',
+            fields=[
+                ('band', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True, related_name='stats', serialize=False, to='academy.band')),
+                ('player_count', models.IntegerField(default=0)),
+                ('men_count', models.IntegerField(default=0)),
+                ('women_count', models.IntegerField(default=0)),
+                ('matchesplayed', models.IntegerField(default=0)),
+                ('wins', models.IntegerField(default=0)),
+            ],
+        ),
+        migrations.RunPython(populate_band_stats, migrations.RunPython.noop),
+    ]
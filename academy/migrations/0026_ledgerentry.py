@@ -0,0 +1,49 @@
+# Generated by Django 5.2.18 on 2026-10-18 17:41
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+def open_accounts(apps, schema_editor):
+    Player = apps.get_model('academy', 'Player')
+    Band = apps.get_model('academy', 'Band')
+    LedgerEntry = apps.get_model('academy', 'LedgerEntry')
+
+    # Today's balances become the opening entries the ledger builds on
+    entries = [
+        LedgerEntry(player_id=pk, amount=networth, reason='opening')
+        for pk, networth in Player.objects.exclude(networth=0).values_list('pk', 'networth')
+    ]
+    entries += [
+        LedgerEntry(band_id=pk, amount=networth, reason='opening')
+        for pk, networth in Band.objects.exclude(networth=0).values_list('pk', 'networth')
+    ]
+    LedgerEntry.objects.bulk_create(entries, batch_size=500)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('academy', '0025_bandstats'),
+        ('match', '0020_singlematch_list_index'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='LedgerEntry',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('amount', models.FloatField()),
+                ('reason', models.CharField(choices=[('opening', 'Opening balance'), ('prize', 'Match prize'), ('entry', 'Match entry fee'), ('band_share', 'Band share of a match'), ('auction', 'Auction'), ('grant', 'Grant'), ('recall', 'Recall'), ('retirement', 'Retirement'), ('adjustment', 'Manual adjustment')], max_length=20)),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('auction', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='ledger_entries', to='academy.auction')),
+                ('band', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.CASCADE, related_name='ledger_entries', to='academy.band')),
+                ('match', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='ledger_entries', to='match.singlematch')),
+                ('player', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.CASCADE, related_name='ledger_entries', to='academy.player')),
+            ],
+            options={
+                'constraints': [models.CheckConstraint(condition=models.Q(models.Q(('band__isnull', True), ('player__isnull', False)), models.Q(('band__isnull', False), ('player__isnull', True)), _connector='OR'), name='ledger_entry_one_account')],
+            },
+        ),
+        migrations.RunPython(open_accounts, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,35 @@
+# Generated by Django 5.2.18 on 2026-10-18 17:46
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('academy', '0026_ledgerentry'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='BulkGrant',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('target', models.CharField(choices=[('player', 'Players'), ('band', 'Bands')], max_length=10)),
+                ('mode', models.CharField(choices=[('fixed', 'Fixed amount'), ('percent', 'Percentage of networth')], default='fixed', max_length=10)),
+                ('value', models.FloatField()),
+                ('filters', models.JSONField(default=dict)),
+                ('accounts', models.PositiveIntegerField(default=0)),
+                ('total', models.FloatField(default=0)),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('created_by', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='bulk_grants', to=settings.AUTH_USER_MODEL)),
+            ],
+        ),
+        migrations.AddField(
+            model_name='ledgerentry',
+            name='bulk_grant',
+            field=models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='ledger_entries', to='academy.bulkgrant'),
+        ),
+    ]
@@ -0,0 +1,27 @@
+# Generated by Django 5.2.18 on 2026-10-18 18:05
+
+from django.db import migrations, models
+
+
+def create_versions(apps, schema_editor):
+    CacheVersion = apps.get_model('academy', 'CacheVersion')
+    names = ['academy.band', 'academy.player', 'academy.championship', 'academy.championshiphistory', 'academy.rule', 'academy.auction']
+    CacheVersion.objects.bulk_create([CacheVersion(name=name) for name in names], ignore_conflicts=True)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('academy', '0027_bulkgrant'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='CacheVersion',
+            fields=[
+                ('name', models.CharField(max_length=100, primary_key=True, serialize=False)),
+                ('version', models.PositiveBigIntegerField(default=0)),
+            ],
+        ),
+        migrations.RunPython(create_versions, migrations.RunPython.noop),
+    ]
@@ -1,6 +1,9 @@
-from django.db import models
-from django.db.models.signals import pre_save, post_save
+from django.conf import settings
+from django.db import models, transaction
+from django.db.models.signals import pre_save, post_save, pre_delete, post_delete, post_init
 from django.utils.timezone import now
+from .band_stats import band_stat_changes, remember_band_stat_source, load_band_stat_source, record_player_change, apply_band_stat_changes, actual_band_stats
+from .versions import bump_saved, bump_deleted
 
 # Create your models here.
 class Band(models.Model):
@@ -12,25 +15,36 @@ class Band(models.Model):
     def __str__(self):
         return self.name
     
+    # The counters live in BandStats, kept current by Player.save and the
+    # bulk match writers; select_related("stats") to list bands in one query.
+    @property
+    def counters(self):
+        try:
+            return self.stats
+        except BandStats.DoesNotExist:
+            # Bands written with bulk_create get no row from create_band_stats:
+            # count their players instead. The unsaved row is cached as self.stats.
+            return BandStats(band=self, **actual_band_stats([self.pk]).get(self.pk, {}))
+
     @property
     def men_count(self):
-        return self.player_band.filter(gender='Male').count()
+        return self.counters.men_count
     
     @property
     def women_count(self):
-        return self.player_band.filter(gender='Female').count()
+        return self.counters.women_count
     
     @property
     def player_count(self):
-        return self.player_band.count()
+        return self.counters.player_count
     
     @property
     def matchesplayed(self):
-        return self.player_band.aggregate(total=models.Sum('matchesplayed'))['total'] or 0
+        return self.counters.matchesplayed
     
     @property
     def wins(self):
-        return self.player_band.aggregate(total=models.Sum('wins'))['total'] or 0
+        return self.counters.wins
     
     @property
     def winningpercentage(self):
@@ -38,6 +52,26 @@ class Band(models.Model):
         wins = self.wins
         return round((wins / matches) * 100, 2) if matches > 0 else 0
 
+class BandStats(models.Model):
+    """Totals over a band's active players."""
+    band = models.OneToOneField(Band, on_delete=models.CASCADE, primary_key=True, related_name="stats")
+    player_count = models.IntegerField(default=0)
+    men_count = models.IntegerField(default=0)
+    women_count = models.IntegerField(default=0)
+    matchesplayed = models.IntegerField(default=0)
+    wins = models.IntegerField(default=0)
+
+    def __str__(self):
+        return f"{self.band_id}: {self.player_count} players, {self.wins}/{self.matchesplayed}"
+
+def create_band_stats(sender, instance, created, **kwargs):
+    if created:
+        BandStats.objects.get_or_create(band=instance)
+
+post_save.connect(create_band_stats, sender=Band)
+
+DEFAULT_RATING = 1500
+
 class ActivePlayerManager(models.Manager):
     def get_queryset(self):
         # Override to filter only active players
@@ -56,6 +90,7 @@ class Player(models.Model):
     matchesplayed = models.PositiveIntegerField(default=0)
     winningpercentage = models.FloatField(default=0)
     networth = models.FloatField(default=0)
+    rating = models.FloatField(default=DEFAULT_RATING)
     image_url = models.CharField(max_length=120, null=True, blank=True)
     is_active = models.BooleanField(default=True)
 
@@ -72,6 +107,16 @@ class Player(models.Model):
 
     def __str__(self):
         return self.name
+
+    def save(self, *args, **kwargs):
+        # The band counters move in the same transaction as the player row;
+        # inside a caller's transaction no savepoint is needed for that
+        with transaction.atomic(using=kwargs.get("using"), savepoint=False):
+            load_band_stat_source(self)
+            super().save(*args, **kwargs)
+            changes = band_stat_changes()
+            record_player_change(changes, self)
+            apply_band_stat_changes(changes)
     
 def object_pre_save(sender, instance, *args, **kwargs):
     instance.winningpercentage = (instance.wins / instance.matchesplayed) * 100 if instance.matchesplayed else 0
@@ -80,10 +125,22 @@ def player_post_save(sender, instance, *args, **kwargs):
     spouse = instance.spouse
     if spouse and spouse.spouse != instance:
         spouse.spouse = instance
-        spouse.save()
+        spouse.save(update_fields=["spouse"])
+
+def player_pre_delete(sender, instance, *args, **kwargs):
+    # Deleting the band drops its counters along with its players
+    origin = kwargs.get("origin")
+    if isinstance(origin, Band) and origin.pk == instance.band_id:
+        return
+    load_band_stat_source(instance)
+    changes = band_stat_changes()
+    record_player_change(changes, instance, deleted=True)
+    apply_band_stat_changes(changes)
 
 pre_save.connect(object_pre_save, sender=Player) 
 post_save.connect(player_post_save, sender=Player)
+pre_delete.connect(player_pre_delete, sender=Player)
+post_init.connect(remember_band_stat_source, sender=Player)
 
 class Championship(models.Model):
     name = models.CharField(max_length=200)
@@ -98,51 +155,6 @@ class Championship(models.Model):
     def __str__(self):
         return self.name
 
-_old_players = {}
-
-def cache_old_player(sender, instance, **kwargs):
-    if instance.pk:
-        try:
-            old = Championship.objects.get(pk=instance.pk)
-            _old_players[instance.pk] = old.player
-        except Championship.DoesNotExist:
-            _old_players[instance.pk] = None
-
-
-def create_championship_history(sender, instance, created, **kwargs):
-    old_player = _old_players.pop(instance.pk, None)
-    new_player = instance.player
-
-    if created:
-        # New championship with player
-        if new_player:
-            ChampionshipHistory.objects.create(
-                championship=instance,
-                player=new_player,
-                started_on=instance.updated_on,
-            )
-    else:
-        if old_player != new_player:
-            # End old player's reign
-            if old_player:
-                ChampionshipHistory.objects.filter(
-                    championship=instance,
-                    player=old_player,
-                    ended_on__isnull=True
-                ).update(ended_on=now())
-
-            # Start new player's reign
-            if new_player:
-                ChampionshipHistory.objects.create(
-                    championship=instance,
-                    player=new_player,
-                    started_on=instance.updated_on,
-                )
-
-pre_save.connect(cache_old_player, sender=Championship) 
-post_save.connect(create_championship_history, sender=Championship)
-
-    
 class ChampionshipHistory(models.Model):
     championship = models.ForeignKey(Championship, on_delete=models.CASCADE, related_name="history")
     player = models.ForeignKey("Player", on_delete=models.CASCADE)
@@ -177,3 +189,100 @@ class Auction(models.Model):
 
     def __str__(self):
         return f"Auction: {self.player.name} from {self.from_band} → {self.to_band} for {self.price}"
+
+class BulkGrant(models.Model):
+    """Audit record of one grant applied to a whole set of players or bands at once."""
+    TARGET_CHOICES = [
+        ('player', 'Players'),
+        ('band', 'Bands'),
+    ]
+    MODE_CHOICES = [
+        ('fixed', 'Fixed amount'),
+        ('percent', 'Percentage of networth'),
+    ]
+
+    target = models.CharField(max_length=10, choices=TARGET_CHOICES)
+    mode = models.CharField(max_length=10, choices=MODE_CHOICES, default='fixed')
+    value = models.FloatField()
+    filters = models.JSONField(default=dict)
+    accounts = models.PositiveIntegerField(default=0)
+    total = models.FloatField(default=0)
+    created_by = models.ForeignKey(settings.AUTH_USER_MODEL, on_delete=models.SET_NULL, null=True, blank=True, related_name="bulk_grants")
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    def __str__(self):
+        amount = f"{self.value:g}%" if self.mode == 'percent' else f"₹{self.value:g}"
+        return f"Grant #{self.pk}: {amount} to {self.accounts} {self.get_target_display().lower()}"
+
+class LedgerEntry(models.Model):
+    """
+    One movement of money into or out of a player's or a band's account.
+    Entries are only ever appended; networth is the running total of them.
+    """
+    REASON_CHOICES = [
+        ('opening', 'Opening balance'),
+        ('prize', 'Match prize'),
+        ('entry', 'Match entry fee'),
+        ('band_share', 'Band share of a match'),
+        ('auction', 'Auction'),
+        ('grant', 'Grant'),
+        ('recall', 'Recall'),
+        ('retirement', 'Retirement'),
+        ('adjustment', 'Manual adjustment'),
+    ]
+
+    player = models.ForeignKey("Player", on_delete=models.CASCADE, null=True, blank=True, related_name="ledger_entries")
+    band = models.ForeignKey("Band", on_delete=models.CASCADE, null=True, blank=True, related_name="ledger_entries")
+    amount = models.FloatField()
+    reason = models.CharField(max_length=20, choices=REASON_CHOICES)
+    match = models.ForeignKey("match.SingleMatch", on_delete=models.SET_NULL, null=True, blank=True, related_name="ledger_entries")
+    auction = models.ForeignKey("Auction", on_delete=models.SET_NULL, null=True, blank=True, related_name="ledger_entries")
+    bulk_grant = models.ForeignKey("BulkGrant", on_delete=models.SET_NULL, null=True, blank=True, related_name="ledger_entries")
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        constraints = [
+            models.CheckConstraint(
+                condition=models.Q(player__isnull=False, band__isnull=True) | models.Q(player__isnull=True, band__isnull=False),
+                name="ledger_entry_one_account",
+            ),
+        ]
+
+    def __str__(self):
+        return f"{self.player or self.band}: {self.amount:+.2f} ({self.reason})"
+
+    def save(self, *args, **kwargs):
+        if self.pk is not None:
+            raise ValueError("Ledger entries are append-only.")
+        super().save(*args, **kwargs)
+
+def open_account(sender, instance, created, raw=False, **kwargs):
+    # Accounts created with money in them start with an opening entry, so the
+    # ledger always adds up to networth.
+    if created and not raw and instance.networth:
+        account = "band" if sender is Band else "player"
+        LedgerEntry.objects.create(**{account: instance}, amount=instance.networth, reason="opening")
+
+post_save.connect(open_account, sender=Player)
+post_save.connect(open_account, sender=Band)
+
+class CacheVersion(models.Model):
+    """A counter per model (by label), bumped whenever its rows change; cached fragments are keyed by it."""
+    name = models.CharField(max_length=100, primary_key=True)
+    version = models.PositiveBigIntegerField(default=0)
+
+    def __str__(self):
+        return f"{self.name} v{self.version}"
+
+post_save.connect(bump_saved, sender=Band)
+post_save.connect(bump_saved, sender=Player)
+post_save.connect(bump_saved, sender=Championship)
+post_save.connect(bump_saved, sender=ChampionshipHistory)
+post_save.connect(bump_saved, sender=Rule)
+post_save.connect(bump_saved, sender=Auction)
+post_delete.connect(bump_deleted, sender=Band)
+post_delete.connect(bump_deleted, sender=Player)
+post_delete.connect(bump_deleted, sender=Championship)
+post_delete.connect(bump_deleted, sender=ChampionshipHistory)
+post_delete.connect(bump_deleted, sender=Rule)
+post_delete.connect(bump_deleted, sender=Auction)
@@ -0,0 +1,36 @@
+from django.db.models import Prefetch
+from .models import Player, Championship, ChampionshipHistory, Auction
+
+def player_rows(players=None):
+    """Player table rows (players/partials/table_body.html): band and spouse names."""
+    players = Player.objects.all() if players is None else players
+    return players.select_related("band", "spouse")
+
+def player_cards(players=None):
+    """Player cards (player_image.html, band_view.html): band and the title each player holds."""
+    players = Player.objects.all() if players is None else players
+    return players.select_related("band", "championship")
+
+def player_choices(players=None):
+    """Players listed as form choices, labelled with their band's emoji."""
+    players = Player.objects.all() if players is None else players
+    return players.select_related("band")
+
+def championship_rows(championships=None):
+    """Championship rows and cards: the holder and the holder's band."""
+    championships = Championship.objects.all() if championships is None else championships
+    return championships.select_related("player__band")
+
+def championship_history(championships=None):
+    """Championships with every reign, each with its holder and band."""
+    championships = Championship.objects.all() if championships is None else championships
+    return championships.select_related("player").prefetch_related(
+        Prefetch("history", queryset=ChampionshipHistory.objects.select_related("player__band"))
+    )
+
+def auction_rows(auctions=None):
+    """Auction rows: the player and both band names."""
+    auctions = Auction.objects.all() if auctions is None else auctions
+    return auctions.select_related("player", "from_band", "to_band").only(
+        "price", "date", "player__name", "from_band__name", "to_band__name",
+    )
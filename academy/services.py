@@ -1,8 +1,9 @@
 from itertools import combinations
 import datetime
 from academy.models import Band, Player
+from academy.ledger import bulk_grant
 from match.models import SingleMatch
-from match.utils import generate_winner
+from match.utils import generate_winners
 import random
 from datetime import date
 
@@ -39,24 +40,16 @@ def create_league_matches():
                 count += 1
 
 def complete_all_matches():
-    matches = SingleMatch.objects.filter(winner=None)
-    for match in matches:
-        generate_winner(match)
+    generate_winners(SingleMatch.objects.filter(winner=None))
     return
 
 def add_certain_amount_to_players():
     AMOUNT = 1000
-    players = Player.objects.all()
-    for player in players:
-        player.networth += AMOUNT
-        player.save()
+    bulk_grant("player", AMOUNT, active=True)
 
 def add_certain_amount_to_bands():
     AMOUNT = 10000
-    bands = Band.objects.all()
-    for band in bands:
-        band.networth += AMOUNT
-        band.save()
+    bulk_grant("band", AMOUNT)
 
 def create_n_matches(match_count, price_amount, entry_amount):
     players_max_count = match_count * 2
@@ -0,0 +1,53 @@
+from django import template
+from django.conf import settings
+from django.core.cache import cache
+from django.core.cache.utils import make_template_fragment_key
+from academy.versions import current_versions, request_versions
+
+register = template.Library()
+
+class VersionedCacheNode(template.Node):
+    def __init__(self, nodelist, fragment_name, models, vary_on):
+        self.nodelist = nodelist
+        self.fragment_name = fragment_name
+        self.models = models
+        self.vary_on = vary_on
+
+    def render(self, context):
+        names = self.models.resolve(context).split()
+        request = context.get("request")
+        versions = request_versions(request, names) if request is not None else current_versions(names)
+        vary_on = [var.resolve(context) for var in self.vary_on]
+        vary_on += [f"{name}:{version}" for name, version in sorted(versions.items())]
+        key = make_template_fragment_key(self.fragment_name.resolve(context), vary_on)
+
+        content = cache.get(key)
+        outcome = "hits"
+        if content is None:
+            content = self.nodelist.render(context)
+            cache.set(key, content, getattr(settings, "FRAGMENT_CACHE_TIMEOUT", 300))
+            outcome = "misses"
+        stats = getattr(request, "fragment_cache", None)
+        if stats is not None:
+            stats[outcome] += 1
+        return content
+
+@register.tag
+def versioned_cache(parser, token):
+    """
+    {% versioned_cache "name" "academy.player academy.band" [vary_on ...] %}
+
+    Caches the enclosed fragment until one of the listed models (by label)
+    changes: the key holds their current versions, see academy.versions.
+    """
+    bits = token.split_contents()
+    if len(bits) < 3:
+        raise template.TemplateSyntaxError(f"'{bits[0]}' takes a fragment name and the models it shows.")
+    nodelist = parser.parse(("endversioned_cache",))
+    parser.delete_first_token()
+    return VersionedCacheNode(
+        nodelist,
+        parser.compile_filter(bits[1]),
+        parser.compile_filter(bits[2]),
+        [parser.compile_filter(bit) for bit in bits[3:]],
+    )
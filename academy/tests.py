@@ -1,3 +1,372 @@
+import datetime
+import logging
+from django.contrib.auth.models import User
+from django.core.cache import cache
+from django.db import connection, transaction
 from django.test import TestCase
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from django.utils.timezone import now
+from match.seed import seed_dataset
+from match.models import SingleMatch
+from match.tests import QueryBudgetTestCase
+from match.utils import generate_winner, generate_winners
+from .ledger import post, apply_ledger, materialize_balances, bulk_grant
+from .titles import transfer_titles
+from .versions import current_versions
+from .models import Rule, Player, Band, BandStats, LedgerEntry, BulkGrant, Championship, ChampionshipHistory
 
-# Create your tests here.
+class BandQueryTests(QueryBudgetTestCase):
+    def test_band_list(self):
+        self.assertQueryBudget(8, reverse("band-list"))
+
+    def test_band_create(self):
+        self.assertQueryBudget(5, reverse("band-create"))
+
+    def test_band_view(self):
+        self.assertQueryBudget(8, reverse("band-view", args=[self.band.pk]))
+
+    def test_band_update(self):
+        self.assertQueryBudget(6, reverse("band-update", args=[self.band.pk]))
+
+    def test_band_delete_confirm(self):
+        self.assertQueryBudget(6, reverse("band-delete", args=[self.band.pk]), htmx=True)
+
+    def test_band_delete(self):
+        self.assertQueryBudget(35, reverse("band-delete", args=[self.data["bands"][-1].pk]), method="post", htmx=True)
+
+    def test_band_delete_sends_only_the_player_count(self):
+        url = reverse("band-delete", args=[self.data["bands"][-1].pk])
+        response = self.client.post(url, headers={"HX-Request": "true"})
+        self.assertContains(response, 'id="players-count" hx-swap-oob="true"')
+        self.assertNotContains(response, "<tr")
+
+    def test_band_add_networth_form(self):
+        self.assertQueryBudget(7, reverse("band-add_networth"))
+
+    def test_band_add_networth(self):
+        self.assertQueryBudget(12, reverse("band-add_networth"), method="post", data={"target": "band", "mode": "fixed", "amount": 1000})
+
+    def test_player_grant(self):
+        data = {"target": "player", "mode": "percent", "amount": 10, "gender": "Male", "active": "true"}
+        self.assertQueryBudget(12, reverse("band-add_networth"), method="post", data=data)
+
+class PlayerQueryTests(QueryBudgetTestCase):
+    def test_player_list(self):
+        self.assertQueryBudget(8, reverse("player-list"))
+
+    def test_player_list_filtered(self):
+        self.assertQueryBudget(9, reverse("player-list"), data={"bands": [self.band.pk], "gender": "Male", "sort_by": "-rating"})
+
+    def test_player_images(self):
+        self.assertQueryBudget(8, reverse("player-image"))
+
+    def test_player_create(self):
+        self.assertQueryBudget(7, reverse("player-create"))
+
+    def test_player_view(self):
+        self.assertQueryBudget(8, reverse("player-view", args=[self.player.pk]))
+
+    def test_player_update(self):
+        self.assertQueryBudget(8, reverse("player-update", args=[self.player.pk]))
+
+    def test_player_delete_confirm(self):
+        self.assertQueryBudget(6, reverse("player-delete", args=[self.player.pk]), htmx=True)
+
+    def test_player_delete(self):
+        self.assertQueryBudget(19, reverse("player-delete", args=[self.player.pk]), method="post", htmx=True)
+
+    def test_player_delete_targets_its_row(self):
+        response = self.client.get(reverse("player-delete", args=[self.player.pk]), headers={"HX-Request": "true"})
+        self.assertContains(response, f'hx-target="#player-{self.player.pk}"')
+        response = self.client.post(reverse("player-delete", args=[self.player.pk]), headers={"HX-Request": "true"})
+        self.assertEqual(response.content, b"")
+
+    def test_player_permanently_delete(self):
+        self.assertQueryBudget(31, reverse("player-permanently-delete", args=[self.player.pk]), method="post")
+
+    def test_player_auction(self):
+        self.assertQueryBudget(8, reverse("player-auction", args=[self.player.pk]), method="post")
+
+    def test_player_recall(self):
+        retired = Player.objects.get(pk=self.data["players"][1].pk)
+        retired.is_active = False
+        retired.save()
+        self.assertQueryBudget(16, reverse("player-recall", args=[retired.pk]), method="post")
+
+    def test_hall_of_frame(self):
+        Player.objects.filter(pk__in=[player.pk for player in self.data["players"][:20]]).update(is_active=False)
+        self.assertQueryBudget(8, reverse("hall_of_frame"))
+
+class ChampionshipQueryTests(QueryBudgetTestCase):
+    def test_championship_list(self):
+        self.assertQueryBudget(8, reverse("championship-list"))
+
+    def test_championship_view(self):
+        self.assertQueryBudget(8, reverse("championship-view", args=[self.championship.pk]))
+
+    def test_championship_history(self):
+        self.assertQueryBudget(9, reverse("championship-history"))
+
+    def test_championship_create(self):
+        self.assertQueryBudget(6, reverse("championship-create"))
+
+    def test_championship_update(self):
+        self.assertQueryBudget(7, reverse("championship-update", args=[self.championship.pk]))
+
+    def test_championship_delete_confirm(self):
+        self.assertQueryBudget(6, reverse("championship-delete", args=[self.championship.pk]), htmx=True)
+
+    def test_championship_delete(self):
+        self.assertQueryBudget(12, reverse("championship-delete", args=[self.championship.pk]), method="post", htmx=True)
+
+    def test_auction_list(self):
+        self.assertQueryBudget(8, reverse("auction_list"))
+
+class RuleQueryTests(QueryBudgetTestCase):
+    def setUp(self):
+        super().setUp()
+        self.rule = Rule.objects.first()
+
+    def test_rule_list(self):
+        self.assertQueryBudget(7, reverse("rule-list"))
+
+    def test_rule_create(self):
+        self.assertQueryBudget(5, reverse("rule-create"))
+
+    def test_rule_view(self):
+        self.assertQueryBudget(6, reverse("rule-view", args=[self.rule.pk]))
+
+    def test_rule_update(self):
+        self.assertQueryBudget(6, reverse("rule-update", args=[self.rule.pk]))
+
+    def test_rule_delete_confirm(self):
+        self.assertQueryBudget(6, reverse("rule-delete", args=[self.rule.pk]), htmx=True)
+
+    def test_rule_delete(self):
+        self.assertQueryBudget(8, reverse("rule-delete", args=[self.rule.pk]), method="post", htmx=True)
+
+class LedgerTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.data = seed_dataset(bands=2, players_per_band=10, tournaments=1, matches=40, finished=0, championships=1, auctions=0, rules=0)
+        cls.user = User.objects.create_user("referee")
+
+    def setUp(self):
+        self.client.force_login(self.user)
+        sql_logger = logging.getLogger("wrestling.sql")
+        sql_logger.disabled = True
+        self.addCleanup(setattr, sql_logger, "disabled", False)
+
+    def test_balances_follow_the_ledger(self):
+        matches = self.data["matches"]
+        generate_winner(matches[0])
+        generate_winners(SingleMatch.objects.filter(pk__in=[match.pk for match in matches[1:]]))
+        player = Player.objects.get(pk=self.data["players"][0].pk)
+        self.client.post(reverse("band-add_networth"), {"target": "band", "mode": "fixed", "amount": 1000})
+        self.client.post(reverse("player-delete", args=[player.pk]))
+        self.client.post(reverse("player-recall", args=[player.pk]))
+
+        self.assertEqual(materialize_balances(fix=False), [])
+        self.assertEqual(Player.all_objects.get(pk=player.pk).networth, 1000)
+        self.assertEqual(LedgerEntry.objects.filter(reason="prize").count(), len(matches))
+
+    def test_apply_ledger_adds_to_stored_balance(self):
+        band = Band.objects.get(pk=self.data["bands"][0].pk)
+        stale = Band.objects.get(pk=band.pk)
+        entries = []
+        post(entries, 100, "grant", band=band)
+        post(entries, 50, "grant", band=band)
+        apply_ledger(entries)
+        # A write from an instance loaded before the grant does not undo it
+        stale.name = "Renamed"
+        stale.save(update_fields=["name"])
+        band.refresh_from_db()
+        self.assertEqual(band.networth, self.data["bands"][0].networth + 150)
+
+    def test_bulk_grant(self):
+        band = self.data["bands"][0]
+        grant = bulk_grant("player", 10, "percent", bands=[band], gender="Female", active=True)
+        players = [player for player in self.data["players"] if player.band_id == band.pk and player.gender == "Female"]
+
+        self.assertEqual(grant.accounts, len(players))
+        self.assertAlmostEqual(grant.total, sum(player.networth for player in players) / 10)
+        self.assertEqual(grant.filters, {"bands": [band.pk], "gender": "Female", "active": True})
+        self.assertEqual(grant.ledger_entries.count(), len(players))
+        for player in players:
+            self.assertAlmostEqual(Player.objects.get(pk=player.pk).networth, player.networth * 1.1)
+        self.assertEqual(Player.objects.get(pk=self.data["players"][0].pk).networth, self.data["players"][0].networth)
+        self.assertEqual(materialize_balances(fix=False), [])
+
+    def test_bulk_grant_is_constant_queries(self):
+        # Audit totals, audit row, INSERT ... SELECT and UPDATE in a savepoint, then the version bump
+        with self.assertNumQueries(7), self.captureOnCommitCallbacks(execute=True):
+            bulk_grant("player", 100)
+        with self.assertNumQueries(7), self.captureOnCommitCallbacks(execute=True):
+            bulk_grant("player", 100, bands=self.data["bands"][:1])
+        self.assertEqual(BulkGrant.objects.count(), 2)
+
+    def test_materialize_fixes_drift(self):
+        player = self.data["players"][1]
+        Player.objects.filter(pk=player.pk).update(networth=-1)
+        drift = materialize_balances()
+        self.assertEqual([(instance.pk, stored) for instance, stored, _ in drift], [(player.pk, -1)])
+        self.assertEqual(Player.objects.get(pk=player.pk).networth, player.networth)
+
+    def test_entries_are_append_only(self):
+        entry = LedgerEntry.objects.first()
+        entry.amount = 0
+        with self.assertRaises(ValueError):
+            entry.save()
+
+class TitleTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.data = seed_dataset(bands=2, players_per_band=6, tournaments=1, matches=0, championships=2, reigns=1, auctions=0, rules=0)
+        cls.first, cls.second = cls.data["championships"]
+        cls.challengers = [player for player in cls.data["players"] if player.pk not in (cls.first.player_id, cls.second.player_id)]
+
+    def championship_match(self, player_1, player_2):
+        return SingleMatch.objects.create(
+            name="Title Match", date=datetime.date.today(), player_1=player_1, player_2=player_2,
+            price_amount=500, entry_amount=250, is_championship_match=True,
+        )
+
+    def reigns(self, championship):
+        return list(championship.history.order_by("started_on", "pk").values_list("player_id", "ended_on"))
+
+    def test_generate_winner_moves_the_title(self):
+        holder, challenger = self.first.player, self.challengers[0]
+        match = self.championship_match(holder, challenger)
+        generate_winner(match)
+
+        match.refresh_from_db()
+        self.first.refresh_from_db()
+        reigns = self.reigns(self.first)
+        self.assertEqual(self.first.player_id, match.winner_id)
+        if match.winner_id == challenger.pk:
+            self.assertEqual([player for player, _ in reigns], [holder.pk, challenger.pk])
+            self.assertIsNotNone(reigns[0][1])
+        self.assertIsNone(reigns[-1][1])
+
+    def test_bulk_transfers_record_every_reign(self):
+        a, b, c = self.challengers[:3]
+        at = now()
+        history_before = ChampionshipHistory.objects.count()
+        # The first title passes through two holders; the second goes to the
+        # player who has just lost the first.
+        changes = [
+            (self.first, a, at),
+            (self.first, b, at + datetime.timedelta(seconds=1)),
+            (self.second, a, at + datetime.timedelta(seconds=2)),
+        ]
+        with self.assertNumQueries(8), self.captureOnCommitCallbacks(execute=True):
+            transfer_titles(changes)
+
+        self.assertEqual(Championship.objects.get(pk=self.first.pk).player_id, b.pk)
+        self.assertEqual(Championship.objects.get(pk=self.second.pk).player_id, a.pk)
+        self.assertEqual(ChampionshipHistory.objects.count(), history_before + 3)
+        self.assertEqual(self.reigns(self.first)[-2:], [(a.pk, at + datetime.timedelta(seconds=1)), (b.pk, None)])
+        self.assertEqual(ChampionshipHistory.objects.filter(ended_on__isnull=True).count(), 2)
+
+    def test_resolver_transfers_titles_in_bulk(self):
+        holder = self.first.player
+        matches = [self.championship_match(holder, challenger) for challenger in self.challengers[:5]]
+        generate_winners(SingleMatch.objects.filter(pk__in=[match.pk for match in matches]))
+
+        self.first.refresh_from_db()
+        open_reigns = ChampionshipHistory.objects.filter(championship=self.first, ended_on__isnull=True)
+        self.assertEqual(list(open_reigns.values_list("player_id", flat=True)), [self.first.player_id])
+        holders = [holder.pk] + [
+            match.winner_id for match in SingleMatch.objects.filter(pk__in=[match.pk for match in matches]).order_by("pk")
+            if match.winner_id != holder.pk
+        ]
+        self.assertEqual([player for player, _ in self.reigns(self.first)], holders[:len(self.reigns(self.first))])
+
+class BandStatsTests(TestCase):
+    def setUp(self):
+        # bulk_create sends no post_save, so these bands have no BandStats row
+        self.band, = Band.objects.bulk_create([Band(name="Bulk Band")])
+        Player.objects.bulk_create([
+            Player(name="Bulk One", gender="Male", band=self.band, matchesplayed=4, wins=3),
+            Player(name="Bulk Two", gender="Female", band=self.band, matchesplayed=6, wins=2),
+        ])
+
+    def test_counters_without_a_row(self):
+        band = Band.objects.get(pk=self.band.pk)
+        self.assertEqual((band.player_count, band.men_count, band.women_count), (2, 1, 1))
+        self.assertEqual(band.winningpercentage, 50.0)
+
+        band = Band.objects.select_related("stats").get(pk=self.band.pk)
+        self.assertEqual(band.wins, 5)
+
+    def test_band_pages_without_a_row(self):
+        self.client.force_login(User.objects.create_user("referee"))
+        sql_logger = logging.getLogger("wrestling.sql")
+        sql_logger.disabled = True
+        self.addCleanup(setattr, sql_logger, "disabled", False)
+        self.assertContains(self.client.get(reverse("band-list")), "Bulk Band")
+        self.assertContains(self.client.get(reverse("band-view", args=[self.band.pk])), "Bulk Band")
+
+    def test_first_write_creates_the_row(self):
+        Player.objects.create(name="Bulk Three", gender="Male", band=self.band)
+        stats = BandStats.objects.get(band=self.band)
+        self.assertEqual((stats.player_count, stats.men_count, stats.matchesplayed, stats.wins), (3, 2, 10, 5))
+
+class FragmentCacheTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.data = seed_dataset(bands=2, players_per_band=5, tournaments=1, matches=10, championships=1, auctions=2, rules=3)
+        cls.user = User.objects.create_user("referee")
+
+    def setUp(self):
+        cache.clear()
+        self.client.force_login(self.user)
+        sql_logger = logging.getLogger("wrestling.sql")
+        sql_logger.disabled = True
+        self.addCleanup(setattr, sql_logger, "disabled", False)
+
+    def get(self, name):
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(reverse(name))
+        return response, len(queries)
+
+    def test_unchanged_list_is_served_from_cache(self):
+        for name in ["band-list", "rule-list", "auction_list", "championship-list", "championship-history", "hall_of_frame"]:
+            response, first = self.get(name)
+            self.assertIn('"0 hits, 1 misses"', response.headers["Server-Timing"])
+            response, second = self.get(name)
+            self.assertIn('"1 hits, 0 misses"', response.headers["Server-Timing"])
+            self.assertLess(second, first, name)
+
+    def test_save_and_delete_invalidate(self):
+        self.get("rule-list")
+        with self.captureOnCommitCallbacks(execute=True):
+            rule = Rule.objects.create(name="Ladder Match", content="Climb.")
+        self.assertContains(self.get("rule-list")[0], "Ladder Match")
+        with self.captureOnCommitCallbacks(execute=True):
+            rule.delete()
+        self.assertNotContains(self.get("rule-list")[0], "Ladder Match")
+
+    def test_bulk_writes_invalidate(self):
+        self.get("band-list")
+        with self.captureOnCommitCallbacks(execute=True):
+            bulk_grant("band", 1000)
+        band = Band.objects.order_by("name").first()
+        self.assertContains(self.get("band-list")[0], f"₹ {band.networth:.2f}")
+
+    def test_versions_move_on_commit(self):
+        before = current_versions(["academy.rule"])
+        with self.captureOnCommitCallbacks(execute=True):
+            with transaction.atomic():
+                Rule.objects.create(name="Iron Man Match", content="Sixty minutes.")
+                self.assertEqual(current_versions(["academy.rule"]), before)
+        self.assertEqual(current_versions(["academy.rule"]), {"academy.rule": before["academy.rule"] + 1})
+
+    def test_cascade_bumps_each_model_once(self):
+        band = self.data["bands"][-1]
+        before = current_versions(["academy.band", "academy.player"])
+        with self.captureOnCommitCallbacks(execute=True):
+            band.delete()
+        after = current_versions(["academy.band", "academy.player"])
+        self.assertEqual(after, {name: version + 1 for name, version in before.items()})
@@ -0,0 +1,74 @@
+from collections import defaultdict
+from django.db import transaction
+from django.db.models import Case, When, Value, DateTimeField
+from .models import Championship, ChampionshipHistory
+from .versions import bump
+
+def take_title(titles, winner, loser):
+    """
+    Settle the title at stake in a championship match: the winner takes the
+    loser's title, unless they already hold one. ``titles`` maps holder ids
+    to championships and is updated in place. Returns the championship that
+    changed hands, or None.
+    """
+    if winner.pk in titles or loser.pk not in titles:
+        return None
+    championship = titles.pop(loser.pk)
+    titles[winner.pk] = championship
+    return championship
+
+def group_changes(changes):
+    reigns = defaultdict(list)
+    for championship, player, at in changes:
+        reigns[championship.pk].append((championship, player, at))
+    return reigns
+
+def record_reigns(changes):
+    """
+    Write the history for ``changes``, a list of (championship, new holder or
+    None, when) in the order they happened: the reigns open before the first
+    change are closed and one reign is opened per change, the last one left
+    open. Three queries, however many titles moved.
+    """
+    reigns = group_changes(changes)
+    if not reigns:
+        return
+    with transaction.atomic(savepoint=False):
+        ChampionshipHistory.objects.filter(championship__in=reigns, ended_on__isnull=True).update(
+            ended_on=Case(
+                *[When(championship=pk, then=Value(held[0][2])) for pk, held in reigns.items()],
+                output_field=DateTimeField(),
+            )
+        )
+        history = []
+        for held in reigns.values():
+            for (championship, player, at), following in zip(held, held[1:] + [None]):
+                if player is not None:
+                    history.append(ChampionshipHistory(
+                        championship=championship,
+                        player=player,
+                        started_on=at,
+                        ended_on=following[2] if following else None,
+                    ))
+        ChampionshipHistory.objects.bulk_create(history)
+        bump(ChampionshipHistory)
+
+def transfer_titles(changes):
+    """Hand championships to their new holders (see record_reigns for ``changes``) and record the reigns."""
+    reigns = group_changes(changes)
+    if not reigns:
+        return
+    championships = []
+    for held in reigns.values():
+        championship, player, at = held[-1]
+        championship.player = player
+        championship.updated_on = at
+        championships.append(championship)
+
+    with transaction.atomic():
+        record_reigns(changes)
+        # Release the titles first: one can move to a player who has just lost
+        # another, and the holder column is unique.
+        Championship.objects.filter(pk__in=reigns).update(player=None)
+        Championship.objects.bulk_update(championships, ["player", "updated_on"])
+        bump(Championship)
@@ -0,0 +1,50 @@
+from functools import partial
+from django.apps import apps
+from django.db import transaction
+from django.db.models import F
+
+def bump(*models):
+    """
+    Move the version of every model in ``models`` on, so fragments cached
+    from their rows are no longer read. Call it from bulk writes, which send
+    no signals. The counters live in the database, so every worker process
+    sees the same versions whatever cache backend is in use.
+
+    The counters move once the surrounding transaction commits: no reader
+    sees the new rows before then, and a counter row updated inside the
+    transaction would stay locked, and every parallel writer queued on it,
+    until the end.
+    """
+    names = {model._meta.label_lower for model in models}
+    if names:
+        transaction.on_commit(partial(write_versions, names))
+
+def write_versions(names):
+    CacheVersion = apps.get_model("academy", "CacheVersion")
+    if CacheVersion.objects.filter(name__in=names).update(version=F("version") + 1) < len(names):
+        CacheVersion.objects.bulk_create([CacheVersion(name=name, version=1) for name in names], ignore_conflicts=True)
+
+def current_versions(names):
+    """{name: version} for ``names``, read in one query; a model never bumped is at 0."""
+    CacheVersion = apps.get_model("academy", "CacheVersion")
+    versions = dict(CacheVersion.objects.filter(name__in=names).values_list("name", "version"))
+    return {name: versions.get(name, 0) for name in names}
+
+def request_versions(request, names):
+    """current_versions, read at most once per request: the ETag and the fragments of a page share them."""
+    versions = request.__dict__.setdefault("model_versions", {})
+    missing = [name for name in names if name not in versions]
+    if missing:
+        versions.update(current_versions(missing))
+    return {name: versions[name] for name in names}
+
+def bump_saved(sender, instance, raw=False, **kwargs):
+    if not raw:
+        bump(sender)
+
+def bump_deleted(sender, instance, origin=None, **kwargs):
+    # A cascade sends one signal per row; bump each model once per delete().
+    bumped = origin.__dict__.setdefault("_bumped_versions", set()) if origin is not None else set()
+    if sender not in bumped:
+        bumped.add(sender)
+        bump(sender)
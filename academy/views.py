@@ -1,6 +1,11 @@
 from django.shortcuts import render, get_object_or_404, redirect
-from .models import Band, Player, Championship, Rule, Auction, ChampionshipHistory
-from .forms import BandForm, PlayerForm, ChampionshipForm, PlayerFilterForm, RuleForm
+from django.http import HttpResponse
+from .models import Band, BandStats, Player, Championship, Rule, Auction, ChampionshipHistory, BulkGrant
+from .forms import BandForm, PlayerForm, ChampionshipForm, PlayerFilterForm, RuleForm, BulkGrantForm
+from .ledger import post, apply_ledger, record_adjustment, bulk_grant
+from .titles import record_reigns
+from .queries import player_rows, player_cards, championship_rows, championship_history, auction_rows
+from .conditional import conditional_page, versions_etag, reign_days
 from django.urls import reverse
 from django.contrib.auth.decorators import login_required
 from django.contrib import messages
@@ -8,8 +13,10 @@ from django.db import transaction
 import random
 from django.utils import timezone
 from match.models import Tournament, SingleMatch
+from match.standings import withdraw_results
+from match.search import unindexing, reindexing
 from django.db.models import Q
-from django.db.models import Exists, OuterRef
+from django.db.models import Exists, OuterRef, Sum
 
 
 def home_view(request):
@@ -19,28 +26,29 @@ def custom_404_view(request, exception):
     return render(request, '404.html', status=404)
 
 @login_required
+@conditional_page(versions_etag("academy.band"))
 def band_list(request):
-    bands = Band.objects.all().order_by('name')
-    total_active_players = Player.objects.count() 
+    bands = Band.objects.select_related('stats').order_by('name')
+    # Summed by the template after the rows, so a cached list runs no query for it
+    total_active_players = lambda: sum(band.player_count for band in bands)
     return render(request, 'academy/bands/band_list.html', {'bands': bands, 'total_active_players': total_active_players})
 
 @login_required
 def band_add_networth(request):
+    form = BulkGrantForm(request.POST or None, initial={'target': 'band', 'active': 'true'})
     if request.method == 'POST':
-        try:
-            amount = float(request.POST.get('amount', 0))
-            bands = Band.objects.all()
-
-            for band in bands:
-                band.networth += amount
-                band.save()
-
-            messages.success(request, f"Successfully added ₹{int(amount)} to all bands!")
-            return redirect('band-list')
-        except ValueError:
-            messages.error(request, "Invalid amount entered!")
+        if form.is_valid():
+            data = form.cleaned_data
+            grant = bulk_grant(
+                data['target'], data['amount'], data['mode'], user=request.user,
+                bands=data['bands'], gender=data['gender'], is_champion=data['is_champion'], active=data['active'],
+            )
+            messages.success(request, f"Granted ₹{grant.total:.2f} to {grant.accounts} {grant.get_target_display().lower()}!")
+            return redirect('band-list' if grant.target == 'band' else 'player-list')
+        messages.error(request, "Invalid amount entered!")
 
-    return render(request, 'academy/bands/band_add_networth.html')
+    grants = BulkGrant.objects.select_related('created_by').order_by('-created_at')[:10]
+    return render(request, 'academy/bands/band_add_networth.html', {'form': form, 'grants': grants})
 
 
 @login_required
@@ -60,9 +68,12 @@ def band_update(request, pk):
     form_name = "Update Band"
     band = get_object_or_404(Band, pk=pk)
     if request.method == "POST":
+        old_networth = band.networth
         form = BandForm(request.POST, instance=band)
         if form.is_valid():
-            form.save()
+            with transaction.atomic():
+                form.save()
+                record_adjustment(band, old_networth)
             return redirect('band-list')
     else:
         form = BandForm(instance=band)
@@ -72,21 +83,24 @@ def band_update(request, pk):
 def band_delete(request, pk):
     instance = get_object_or_404(Band, pk=pk)
     if request.method == "POST":
-        instance.delete()
+        # Its players go with it; their matches stay, without them
+        with transaction.atomic(), reindexing(SingleMatch.objects.filter(Q(player_1__band=instance) | Q(player_2__band=instance))):
+            instance.delete()
         if request.htmx:
-            bands = Band.objects.all()
-            return render(request, "academy/bands/partials/table_body.html", {"bands": bands})
+            # The row is swapped out by the confirm form; only the total is re-sent
+            total_active_players = BandStats.objects.aggregate(total=Sum("player_count"))["total"] or 0
+            return render(request, "academy/bands/partials/player_count.html", {"total_active_players": total_active_players, "oob": True})
 
     return render(
         request,
         "partials/confirm_delete.html",
-        {"instance": instance, "reverse_url": reverse("band-list"), "delete_view_name": "band-delete"},
+        {"instance": instance, "reverse_url": reverse("band-list"), "delete_view_name": "band-delete", "row_id": f"band-{instance.pk}"},
     )
 
 @login_required
 def band_view(request, pk):
-    instance = get_object_or_404(Band, pk=pk)
-    players = Player.objects.filter(band=instance).annotate(
+    instance = get_object_or_404(Band.objects.select_related('stats'), pk=pk)
+    players = player_cards(Player.objects.filter(band=instance)).annotate(
         is_champion=Exists(
             Championship.objects.filter(player=OuterRef('pk'))
         )
@@ -94,7 +108,7 @@ def band_view(request, pk):
     return render(request, 'academy/bands/band_view.html', {'instance': instance, 'players': players})
 
 def get_player_object_list(form):
-    players = Player.objects.all().order_by("name")
+    players = player_rows().order_by("name")
     if form.is_valid():
         bands = form.cleaned_data.get("bands")
         gender = form.cleaned_data.get("gender")
@@ -114,6 +128,7 @@ def get_player_object_list(form):
     return players
 
 @login_required
+@conditional_page(versions_etag("academy.player", "academy.band"))
 def player_list(request):
     form = PlayerFilterForm(request.GET or None)
     players = get_player_object_list(form)
@@ -124,9 +139,10 @@ def player_list(request):
     )
 
 @login_required
+@conditional_page(versions_etag("academy.player", "academy.band", "academy.championship"))
 def player_images(request):
     form = PlayerFilterForm(request.GET or None)
-    players = get_player_object_list(form)
+    players = player_cards(get_player_object_list(form))
     return render(
         request,
         "academy/players/player_image.html",
@@ -148,10 +164,15 @@ def player_create(request):
 @login_required
 def permanently_delete(request, pk):
     instance = get_object_or_404(Player.all_objects, pk=pk)
-    SingleMatch.objects.filter(
+    matches = SingleMatch.objects.filter(
             Q(player_1=instance) | Q(player_2=instance)
-        ).delete()
-    instance.delete()
+        )
+    with transaction.atomic():
+        # A winner is always one of the two players, so no match left behind has this one as winner
+        with unindexing(matches):
+            withdraw_results(matches)
+            matches.delete()
+        instance.delete()
     return redirect('player-list')
 
 @login_required
@@ -159,9 +180,12 @@ def player_update(request, pk):
     form_name = "Update Player"
     player = get_object_or_404(Player.all_objects, pk=pk)
     if request.method == "POST":
+        old_networth = player.networth
         form = PlayerForm(request.POST, instance=player)
         if form.is_valid():
-            form.save()
+            with transaction.atomic():
+                form.save()
+                record_adjustment(player, old_networth)
             return redirect('player-list')
     else:
         form = PlayerForm(instance=player)
@@ -169,7 +193,7 @@ def player_update(request, pk):
 
 @login_required
 def player_auction(request, pk):
-    player = get_object_or_404(Player, pk=pk)
+    player = get_object_or_404(player_rows(), pk=pk)
 
     if player.band is None or player.band.name != "NXT Generations Band":
         message = "This player is not eligible for auction (not in NXT Generations Band)."
@@ -187,17 +211,18 @@ def player_auction(request, pk):
 
     with transaction.atomic():
         player.band = selected_band
-        player.save()
+        player.save(update_fields=["band"])
 
-        selected_band.networth -= player.networth
-        selected_band.save()
-
-        Auction.objects.create(
+        auction = Auction.objects.create(
             player=player,
             from_band=old_band,
             to_band=selected_band,
             price=player.networth,
         )
+        entries = []
+        post(entries, -player.networth, "auction", band=selected_band, auction=auction)
+        apply_ledger(entries)
+        selected_band.refresh_from_db(fields=["networth"])
 
     message = f"{player.name} auctioned from {old_band.name} to {selected_band.name}!. Remaining Band Networth: {selected_band.networth:.2f}."
 
@@ -208,18 +233,16 @@ def player_auction(request, pk):
 def player_delete(request, pk):
     instance = get_object_or_404(Player, pk=pk)
     if request.method == "POST":
-        instance.networth = 0
-        instance.is_active = False
-        instance.save()
+        with transaction.atomic():
+            entries = []
+            post(entries, -instance.networth, "retirement", player=instance)
+            apply_ledger(entries)
+            instance.networth = 0
+            instance.is_active = False
+            instance.save(update_fields=["is_active"])
         
         if request.htmx:
-            form = PlayerFilterForm(request.GET or None)
-            players = get_player_object_list(form)
-            return render(
-                request,
-                "academy/players/partials/table_body.html",
-                {"players": players},
-            )
+            return HttpResponse()
 
     return render(
         request,
@@ -228,14 +251,16 @@ def player_delete(request, pk):
             "instance": instance,
             "reverse_url": reverse("player-list"),
             "delete_view_name": "player-delete",
+            "row_id": f"player-{instance.pk}",
         },
     )
 
 @login_required
 def player_view(request, pk):
-    instance = get_object_or_404(Player.all_objects, pk=pk)
+    instance = get_object_or_404(player_rows(Player.all_objects), pk=pk)
     return render(request, 'academy/players/player_view.html', {'instance': instance})
 
+# Not conditional: the holding durations (timesince) move by the minute
 @login_required
 def championship_list(request, pk=None):
     """
@@ -243,11 +268,11 @@ def championship_list(request, pk=None):
     - Shows the full list of championships
     - Optionally shows details of a selected championship (if pk is provided)
     """
-    championships = Championship.objects.all().order_by('name')
+    championships = championship_rows().order_by('name')
     instance = None
 
     if pk:
-        instance = get_object_or_404(Championship, pk=pk)
+        instance = get_object_or_404(championship_rows(), pk=pk)
 
     context = {
         'championships': championships,
@@ -261,7 +286,10 @@ def championship_create(request):
     if request.method == "POST":
         form = ChampionshipForm(request.POST)
         if form.is_valid():
-            form.save()
+            with transaction.atomic():
+                championship = form.save()
+                if championship.player:
+                    record_reigns([(championship, championship.player, championship.updated_on)])
             return redirect('championship-list')
     else:
         form = ChampionshipForm()
@@ -272,9 +300,13 @@ def championship_update(request, pk):
     form_name = "Update Championship"
     instance = get_object_or_404(Championship, pk=pk)
     if request.method == "POST":
+        old_player_id = instance.player_id
         form = ChampionshipForm(request.POST, instance=instance)
         if form.is_valid():
-            form.save()
+            with transaction.atomic():
+                championship = form.save()
+                if championship.player_id != old_player_id:
+                    record_reigns([(championship, championship.player, championship.updated_on)])
             return redirect('championship-list')
     else:
         form = ChampionshipForm(instance=instance)
@@ -286,16 +318,16 @@ def championship_delete(request, pk):
     if request.method == "POST":
         instance.delete()
         if request.htmx:
-            championships = Championship.objects.all().order_by('name')
-            return render(request, "academy/championship/partials/table_body.html", {"championships": championships})
+            return HttpResponse()
 
     return render(
         request,
         "partials/confirm_delete.html",
-        {"instance": instance, "reverse_url": reverse("championship-list"), "delete_view_name": "championship-delete"},
+        {"instance": instance, "reverse_url": reverse("championship-list"), "delete_view_name": "championship-delete", "row_id": f"championship-{instance.pk}"},
     )
 
 @login_required
+@conditional_page(versions_etag("academy.rule"))
 def rule_list(request):
     rules = Rule.objects.all().order_by('timestamp')
     return render(request, 'academy/rules/rule_list.html', {'rules': rules})
@@ -331,13 +363,12 @@ def rule_delete(request, pk):
     if request.method == "POST":
         instance.delete()
         if request.htmx:
-            rules = Rule.objects.all().order_by("timestamp")
-            return render(request, "academy/rules/partials/table_body.html", {"rules": rules})
+            return HttpResponse()
 
     return render(
         request,
         "partials/confirm_delete.html",
-        {"instance": instance, "reverse_url": reverse("rule-list"), "delete_view_name": "rule-delete"},
+        {"instance": instance, "reverse_url": reverse("rule-list"), "delete_view_name": "rule-delete", "row_id": f"rule-{instance.pk}"},
     )
 
 @login_required
@@ -346,24 +377,27 @@ def rule_view(request, pk):
     return render(request, 'academy/view.html', {'instance': instance})
 
 @login_required
+@conditional_page(versions_etag("academy.auction", "academy.player", "academy.band"))
 def auction_list(request):
-    auctions = Auction.objects.all().order_by('-date')
+    auctions = auction_rows().order_by('-date')
     context = {
         'auctions': auctions
     }
     return render(request, 'academy/auctions/auction_list.html', context)
     
 @login_required
+@conditional_page(versions_etag("academy.championship", "academy.championshiphistory", "academy.player", "academy.band", moving=reign_days))
 def championship_history_list(request):
-    championships = Championship.objects.prefetch_related("history__player")
+    championships = championship_history()
     context = {
         'championships': championships
     }
     return render(request, 'academy/championship/championship_history.html', context)
 
 @login_required
+@conditional_page(versions_etag("academy.player", "academy.band", "academy.championship"))
 def hall_of_frame(request):
-    players = Player.all_objects.filter(is_active=False)
+    players = player_cards(Player.all_objects.filter(is_active=False))
     context = {
         'title': 'Hall Of Frame',
         'players': players
@@ -372,9 +406,13 @@ def hall_of_frame(request):
 
 @login_required
 def player_recall(request, pk):
-    instance = get_object_or_404(Player.all_objects, pk=pk)
+    instance = get_object_or_404(player_rows(Player.all_objects), pk=pk)
     if instance:
-        instance.networth = 1000
-        instance.is_active = True
-        instance.save()
+        with transaction.atomic():
+            entries = []
+            post(entries, 1000 - instance.networth, "recall", player=instance)
+            apply_ledger(entries)
+            instance.networth = 1000
+            instance.is_active = True
+            instance.save(update_fields=["is_active"])
     return render(request, 'academy/players/player_view.html', {'instance': instance})
@@ -1,3 +1,17 @@
-from django.test import TestCase
+from django.urls import reverse
+from match.tests import QueryBudgetTestCase
 
-# Create your tests here.
+class AccountQueryTests(QueryBudgetTestCase):
+    def test_home(self):
+        self.assertQueryBudget(5, reverse("home"))
+
+    def test_login(self):
+        self.client.logout()
+        self.assertQueryBudget(0, reverse("login"))
+
+    def test_register(self):
+        self.client.logout()
+        self.assertQueryBudget(0, reverse("register"))
+
+    def test_logout(self):
+        self.assertQueryBudget(5, reverse("logout"))
@@ -1,6 +1,10 @@
 from django.contrib import admin
-from .models import SingleMatch, Player
+from django.db import transaction
+from .models import SingleMatch, Player, Job
+from .search import unindexing
+from .standings import apply_standing_changes, enter_players, result_changes, restate_results, withdraw_results
 from academy.models import ChampionshipHistory, Championship
+from academy.titles import record_reigns
 
 
 class PlayerAdmin(admin.ModelAdmin):
@@ -12,11 +16,43 @@ class SingleMatchAdmin(admin.ModelAdmin):
     list_filter = ("price_amount", "entry_amount")
     autocomplete_fields = ("player_1", "player_2", "winner")
 
+    # Standings and the search index follow admin writes as they follow the views
+    def save_model(self, request, obj, form, change):
+        with transaction.atomic():
+            if change:
+                with restate_results(SingleMatch.objects.filter(pk=obj.pk)):
+                    super().save_model(request, obj, form, change)
+            else:
+                super().save_model(request, obj, form, change)
+                apply_standing_changes(result_changes(SingleMatch.objects.filter(pk=obj.pk)))
+            enter_players(obj.tournament, [obj.player_1_id, obj.player_2_id])
+
+    def delete_model(self, request, obj):
+        self.delete_queryset(request, SingleMatch.objects.filter(pk=obj.pk))
+
+    def delete_queryset(self, request, queryset):
+        with transaction.atomic(), unindexing(queryset):
+            withdraw_results(queryset)
+            queryset.delete()
+
 class ChampionshipAdmin(admin.ModelAdmin):
     list_display = ("name", "player", "hike", "updated_on")
 
+    def save_model(self, request, obj, form, change):
+        # A new holder opens a reign here too, as in championship_update
+        with transaction.atomic():
+            old_player_id = Championship.objects.filter(pk=obj.pk).values_list("player_id", flat=True).first() if change else None
+            super().save_model(request, obj, form, change)
+            if obj.player_id != old_player_id:
+                record_reigns([(obj, obj.player, obj.updated_on)])
+
+class JobAdmin(admin.ModelAdmin):
+    list_display = ("pk", "kind", "status", "total", "created", "resolved", "queued_at", "finished_at")
+    list_filter = ("kind", "status")
+
 # Register all models
 admin.site.register(Player, PlayerAdmin)
 admin.site.register(SingleMatch, SingleMatchAdmin)
 admin.site.register(Championship, ChampionshipAdmin)
 admin.site.register(ChampionshipHistory)
+admin.site.register(Job, JobAdmin)
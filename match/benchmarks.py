@@ -0,0 +1,129 @@
+import datetime
+import logging
+import statistics
+import subprocess
+import time
+from django.conf import settings
+from django.contrib.auth.models import User
+from django.db import connection, transaction
+from django.db.models import Count
+from django.test import Client
+from django.urls import reverse
+from wrestling.middleware import QueryRecorder
+from academy.models import Band, Player, Championship, ChampionshipHistory, Auction
+from .models import SingleMatch, Tournament
+from .utils import generate_winner, create_round_robin
+
+def summarize(timings, queries):
+    timings = sorted(timings)
+    return {
+        "runs": len(timings),
+        "min_ms": round(timings[0] * 1000, 2),
+        "median_ms": round(statistics.median(timings) * 1000, 2),
+        "mean_ms": round(statistics.mean(timings) * 1000, 2),
+        "p95_ms": round(timings[min(len(timings) - 1, int(len(timings) * 0.95))] * 1000, 2),
+        "queries": max(queries),
+    }
+
+def measure(run, repeat):
+    timings, queries = [], []
+    for _ in range(repeat):
+        recorder = QueryRecorder()
+        with connection.execute_wrapper(recorder):
+            start = time.perf_counter()
+            run()
+            timings.append(time.perf_counter() - start)
+        queries.append(recorder.count)
+    return summarize(timings, queries)
+
+def bench_generate_winner(repeat, **options):
+    matches = iter(SingleMatch.objects.filter(winner__isnull=True, player_1__isnull=False, player_2__isnull=False)[:repeat + 1])
+
+    def run():
+        generate_winner(next(matches))
+    return run
+
+def bench_league(repeat, league_players=40, **options):
+    band = Band.objects.annotate(size=Count("player_band")).order_by("-size", "pk").first()
+    players = list(Player.objects.filter(band=band).select_related("band")[:league_players])
+
+    def run():
+        tournament = Tournament.objects.create(name="Benchmark League", date=datetime.date.today())
+        create_round_robin(players, "Benchmark Match ", tournament, 500, 250, datetime.date.today())
+    return run
+
+def view_bench(url_name, **params):
+    def bench(repeat, client=None, **options):
+        url = reverse(url_name)
+
+        def run():
+            response = client.get(url, params)
+            assert response.status_code == 200, f"{url} returned {response.status_code}"
+        return run
+    return bench
+
+BENCHMARKS = {
+    "generate_winner": bench_generate_winner,
+    "league": bench_league,
+    "singlematch_list": view_bench("singlematch_list"),
+    "singlematch_search": view_bench("singlematch_list", q="Band 1"),
+    "band_list": view_bench("band-list"),
+    "championship_history_list": view_bench("championship-history"),
+    "upcoming_main_tournament": view_bench("main_event"),
+}
+
+def git_commit():
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "HEAD"], cwd=settings.BASE_DIR, capture_output=True, text=True, check=True
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+def dataset_size():
+    return {
+        "bands": Band.objects.count(),
+        "players": Player.all_objects.count(),
+        "matches": SingleMatch.objects.count(),
+        "championships": Championship.objects.count(),
+        "championship_history": ChampionshipHistory.objects.count(),
+        "auctions": Auction.objects.count(),
+    }
+
+def run_benchmarks(names=None, repeat=5, **options):
+    """
+    Time each benchmark ``repeat`` times against the current database and
+    return the results as a JSON-ready dict. Everything the benchmarks write
+    is rolled back at the end.
+    """
+    names = names or list(BENCHMARKS)
+    sql_logger = logging.getLogger("wrestling.sql")
+    results = {}
+
+    with transaction.atomic():
+        user = User.objects.create_superuser("benchmark", password=None)
+        client = Client(SERVER_NAME=settings.ALLOWED_HOSTS[0] if settings.ALLOWED_HOSTS else "testserver")
+        client.force_login(user)
+
+        disabled, sql_logger.disabled = sql_logger.disabled, True
+        try:
+            for name in names:
+                run = BENCHMARKS[name](repeat, client=client, **options)
+                try:
+                    with transaction.atomic():
+                        run()  # warm up caches and connections
+                        results[name] = measure(run, repeat)
+                except Exception as error:
+                    # Keep going: a path that breaks at this scale is a result too
+                    results[name] = {"error": f"{type(error).__name__}: {error}"}
+        finally:
+            sql_logger.disabled = disabled
+            transaction.set_rollback(True)
+
+    return {
+        "commit": git_commit(),
+        "created_at": datetime.datetime.now(datetime.timezone.utc).isoformat(),
+        "repeat": repeat,
+        "dataset": dataset_size(),
+        "results": results,
+    }
@@ -0,0 +1,47 @@
+from django.db.models import Count, Max
+from django.utils.timezone import now
+from academy.conditional import page_etag
+from academy.versions import request_versions
+from .models import SingleMatch, Tournament, Notification
+
+# Match pages show player, band and title names alongside the matches
+CARD_MODELS = ["academy.player", "academy.band", "academy.championship"]
+
+def rows_state(queryset, field="updated_at"):
+    """Row count and latest ``field`` of ``queryset``: moves when a row is added, removed or saved."""
+    state = queryset.aggregate(count=Count("pk"), latest=Max(field))
+    return state["count"], state["latest"]
+
+def card_versions(request):
+    return sorted(request_versions(request, CARD_MODELS).items())
+
+def tournament_list_etag(request):
+    return page_etag(request, rows_state(Tournament.objects.all()))
+
+def tournament_detail_etag(request, pk):
+    # Standings only change with the results of the tournament's matches
+    return page_etag(
+        request,
+        rows_state(Tournament.objects.filter(pk=pk)),
+        rows_state(SingleMatch.objects.filter(tournament=pk)),
+        card_versions(request),
+    )
+
+def singlematch_detail_etag(request, pk):
+    return page_etag(
+        request,
+        rows_state(SingleMatch.objects.filter(pk=pk)),
+        rows_state(Tournament.objects.filter(tournament__pk=pk)),
+        rows_state(Notification.objects.filter(match=pk), "timestamp"),
+        card_versions(request),
+    )
+
+def main_event_etag(request):
+    # The countdown to the championship freeze moves with the date
+    return page_etag(
+        request,
+        now().date(),
+        rows_state(Tournament.objects.filter(is_main_tournament=True)),
+        rows_state(SingleMatch.objects.filter(tournament__is_main_tournament=True)),
+        card_versions(request),
+    )
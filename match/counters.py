@@ -0,0 +1,74 @@
+from django.db import connection, transaction
+from academy.models import Player, object_pre_save
+from academy.band_stats import band_stat_changes, record_player_change, apply_band_stat_changes
+from academy.versions import bump
+from .models import SingleMatch
+
+COUNTER_FIELDS = ["wins", "matchesplayed", "winningpercentage"]
+
+def match_counters(tournaments=None):
+    """
+    Wins and matches played by every player across all resolved matches, in
+    one grouped query. With ``tournaments``, only the players who appear in
+    them are counted (over their whole history).
+    Returns {player_id: (wins, matchesplayed)}.
+    """
+    table = SingleMatch._meta.db_table
+    scope, params = "", []
+    if tournaments is not None:
+        tournament_ids = [getattr(tournament, "pk", tournament) for tournament in tournaments]
+        if not tournament_ids:
+            return {}
+        placeholders = ", ".join(["%s"] * len(tournament_ids))
+        scope = (
+            f"WHERE player_id IN (SELECT player_1_id FROM {table} WHERE tournament_id IN ({placeholders}) "
+            f"UNION SELECT player_2_id FROM {table} WHERE tournament_id IN ({placeholders}))"
+        )
+        params = tournament_ids * 2
+
+    sql = (
+        "SELECT player_id, SUM(won), COUNT(*) FROM ("
+        f"SELECT player_1_id AS player_id, CASE WHEN winner_id = player_1_id THEN 1 ELSE 0 END AS won FROM {table} "
+        "WHERE winner_id IS NOT NULL AND player_1_id IS NOT NULL "
+        "UNION ALL "
+        f"SELECT player_2_id, CASE WHEN winner_id = player_2_id THEN 1 ELSE 0 END FROM {table} "
+        "WHERE winner_id IS NOT NULL AND player_2_id IS NOT NULL"
+        f") AS results {scope} GROUP BY player_id"
+    )
+    with connection.cursor() as cursor:
+        cursor.execute(sql, params)
+        return {player_id: (wins, played) for player_id, wins, played in cursor.fetchall()}
+
+def reconcile_player_counters(tournaments=None, fix=True):
+    """
+    Recompute wins, matches played and winning percentage from the match
+    history and, when ``fix`` is set, write the ones that differ with one
+    bulk_update (band statistics follow). Returns (player, field, stored,
+    actual) for every difference.
+    """
+    with transaction.atomic():
+        counters = match_counters(tournaments)
+        drift, changed = [], []
+        for player in Player.all_objects.iterator(chunk_size=2000):
+            if tournaments is not None and player.pk not in counters:
+                continue
+            stored = [getattr(player, field) for field in COUNTER_FIELDS]
+            player.wins, player.matchesplayed = counters.get(player.pk, (0, 0))
+            object_pre_save(Player, player)
+            differences = [
+                (player, field, old, getattr(player, field))
+                for field, old in zip(COUNTER_FIELDS, stored)
+                if getattr(player, field) != old
+            ]
+            if differences:
+                drift += differences
+                changed.append(player)
+
+        if fix and changed:
+            Player.all_objects.bulk_update(changed, COUNTER_FIELDS, batch_size=500)
+            bump(Player)
+            changes = band_stat_changes()
+            for player in changed:
+                record_player_change(changes, player)
+            apply_band_stat_changes(changes)
+    return drift
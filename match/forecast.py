@@ -0,0 +1,88 @@
+from itertools import combinations
+import numpy as np
+from django.db.models import Q
+from academy.models import Player
+from .utils import skill_probability, SKILL_WEIGHT, RANDOM_WEIGHT
+
+# Simulation x pairing cells worked on at once: each takes a few dozen bytes
+# across the round's arrays, so a chunk peaks near 20 MB whatever the field
+# size.
+CHUNK_CELLS = 500_000
+# The largest field the tournament_forecast page simulates: the work grows
+# with the number of pairings, so bigger fields go to the forecast_tournament
+# command.
+MAX_FORECAST_PLAYERS = 64
+
+def tournament_players(tournament):
+    return (
+        Player.all_objects
+        .filter(Q(single_match_player_1__tournament=tournament) | Q(single_match_player_2__tournament=tournament))
+        .select_related("band")
+        .distinct()
+        .order_by("name")
+    )
+
+def play_round_robin(rng, skill, first, second, entrants):
+    """
+    Play one round robin between the ``entrants`` of every simulation.
+
+    ``entrants`` is a (simulations, players) boolean mask; the return value is
+    the number of wins each player picked up in each simulation.
+    """
+    simulations, player_count = entrants.shape
+    played = entrants[:, first] & entrants[:, second]
+
+    # Same draw as pick_winner: a skill share plus a random share, then a coin toss
+    p1_final_prob = skill * SKILL_WEIGHT + rng.random(played.shape) * RANDOM_WEIGHT
+    p1_wins = rng.random(played.shape) < p1_final_prob
+    winners = np.where(p1_wins, first, second)
+
+    rows = np.broadcast_to(np.arange(simulations)[:, None], played.shape)
+    slots = (rows * player_count + winners)[played]
+    return np.bincount(slots, minlength=simulations * player_count).reshape(simulations, player_count)
+
+def simulate_champions(rng, skill, first, second, simulations, player_count):
+    wins = play_round_robin(rng, skill, first, second, np.ones((simulations, player_count), dtype=bool))
+    champions = np.full(simulations, -1)
+    pending = np.ones(simulations, dtype=bool)
+
+    # Tie-break rounds, as in generate_tournament_winner: the players sharing the
+    # most wins play each other again until a single leader is left.
+    while pending.any():
+        rows = np.flatnonzero(pending)
+        leaders = wins[rows] == wins[rows].max(axis=1, keepdims=True)
+        decided = leaders.sum(axis=1) == 1
+        champions[rows[decided]] = leaders[decided].argmax(axis=1)
+        pending[rows[decided]] = False
+
+        rows, leaders = rows[~decided], leaders[~decided]
+        if len(rows):
+            wins[rows] += play_round_robin(rng, skill, first, second, leaders)
+    return champions
+
+def forecast_tournament(players, runs=10000, seed=None, chunk_size=None):
+    """
+    Simulate a full round robin plus tie-break rounds ``runs`` times and return
+    a list of (player, probability of winning) pairs, most likely winner first.
+    Nothing is written to the database. By default a chunk holds as many
+    simulations as fit in CHUNK_CELLS.
+    """
+    players = list(players)
+    if len(players) < 2:
+        return [(player, 1.0) for player in players]
+
+    pairs = list(combinations(range(len(players)), 2))
+    first = np.array([i for i, _ in pairs])
+    second = np.array([j for _, j in pairs])
+    skill = np.array([skill_probability(players[i], players[j])[0] for i, j in pairs])
+
+    chunk_size = chunk_size or max(1, CHUNK_CELLS // len(pairs))
+    rng = np.random.default_rng(seed)
+    titles = np.zeros(len(players), dtype=np.int64)
+    for start in range(0, runs, chunk_size):
+        simulations = min(chunk_size, runs - start)
+        champions = simulate_champions(rng, skill, first, second, simulations, len(players))
+        titles += np.bincount(champions, minlength=len(players))
+
+    forecast = [(player, float(titles[i] / runs)) for i, player in enumerate(players)]
+    return sorted(forecast, key=lambda item: item[1], reverse=True)
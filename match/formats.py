@@ -0,0 +1,141 @@
+import math
+from collections import defaultdict
+from django.db import transaction
+from .models import SingleMatch
+from .utils import MatchResolver
+from .standings import enter_players
+
+def swiss_round_count(player_count):
+    return max(1, math.ceil(math.log2(player_count))) if player_count > 1 else 0
+
+def swiss_pairings(players, scores, played, byes):
+    """
+    Pair players inside their score group: the best placed unpaired player
+    meets the next best one they have not met yet. If everyone left has
+    already been met, a rematch is allowed rather than leaving players out.
+    With an odd field the lowest placed player without a bye sits the round out.
+    """
+    ranked = sorted(players, key=lambda player: (-scores[player.pk], -player.rating, player.pk))
+    if len(ranked) % 2:
+        bye = next((player for player in reversed(ranked) if player.pk not in byes), ranked[-1])
+        ranked.remove(bye)
+        byes.add(bye.pk)
+
+    pairs = []
+    while ranked:
+        player = ranked.pop(0)
+        opponent = next(
+            (other for other in ranked if frozenset((player.pk, other.pk)) not in played),
+            ranked[0],
+        )
+        ranked.remove(opponent)
+        pairs.append((player, opponent))
+    return pairs
+
+def play_swiss(players, rounds, name_prefix, tournament, price_amount, entry_amount, match_date, count=1, state=None, on_save=None, on_round=None):
+    """
+    Play ``rounds`` Swiss rounds between ``players``, each committed in its
+    own transaction on freshly locked players. ``on_round`` is called in that
+    transaction with the state after the round; passed back as ``state``, it
+    resumes with the next round. Returns the next match number.
+    """
+    resolver = MatchResolver(on_save)
+    players = [resolver.add_player(player) for player in players]
+    enter_players(tournament, players)
+    state = state or {"round": 0, "count": count, "scores": {}, "played": [], "byes": []}
+    count = state["count"]
+    # JSON object keys are strings
+    scores = defaultdict(int, {int(player_id): score for player_id, score in state["scores"].items()})
+    played = {frozenset(pair) for pair in state["played"]}
+    byes = set(state["byes"])
+
+    for round_number in range(state["round"] + 1, rounds + 1):
+        with transaction.atomic():
+            resolver.refresh()
+            for player_1, player_2 in swiss_pairings(players, scores, played, byes):
+                winner = resolver.resolve(SingleMatch(
+                    name=f"{name_prefix}{count}",
+                    date=match_date,
+                    tournament=tournament,
+                    round_number=round_number,
+                    player_1=player_1,
+                    player_2=player_2,
+                    winner=None,
+                    price_amount=price_amount,
+                    entry_amount=entry_amount
+                ))
+                scores[winner.pk] += 1
+                played.add(frozenset((player_1.pk, player_2.pk)))
+                count += 1
+            resolver.save()
+            if on_round:
+                on_round({
+                    "round": round_number,
+                    "count": count,
+                    "scores": dict(scores),
+                    "played": [sorted(pair) for pair in played],
+                    "byes": sorted(byes),
+                })
+    return count
+
+def bracket_order(size):
+    """Seed numbers in bracket order, so seed 1 can only meet seed 2 in the final."""
+    order = [1]
+    while len(order) < size:
+        order = [seed for top in order for seed in (top, 2 * len(order) + 1 - top)]
+    return order
+
+def play_single_elimination(players, name_prefix, tournament, price_amount, entry_amount, match_date, count=1, state=None, on_save=None, on_round=None):
+    """
+    Seed ``players`` by rating into a knockout bracket and play it out round by
+    round, each round committed in its own transaction on freshly locked
+    players. Top seeds get a bye when the field is not a power of two.
+    ``state`` and ``on_round`` resume a bracket as in play_swiss.
+    Returns the champion.
+    """
+    resolver = MatchResolver(on_save)
+    players = {player.pk: resolver.add_player(player) for player in players}
+    enter_players(tournament, players)
+    if state:
+        alive = [players.get(player_id) for player_id in state["alive"]]
+        round_number, count = state["round"] + 1, state["count"]
+    else:
+        seeds = sorted(players.values(), key=lambda player: (-player.rating, player.pk))
+        if not seeds:
+            return None
+        size = 2 ** math.ceil(math.log2(len(seeds))) if len(seeds) > 1 else 1
+        alive = [seeds[seed - 1] if seed <= len(seeds) else None for seed in bracket_order(size)]
+        round_number = 1
+
+    while len(alive) > 1:
+        next_round = []
+        with transaction.atomic():
+            resolver.refresh()
+            for player_1, player_2 in zip(alive[::2], alive[1::2]):
+                if player_1 is None or player_2 is None:
+                    next_round.append(player_1 or player_2)
+                    continue
+                next_round.append(resolver.resolve(SingleMatch(
+                    name=f"{name_prefix}{count}",
+                    date=match_date,
+                    tournament=tournament,
+                    round_number=round_number,
+                    player_1=player_1,
+                    player_2=player_2,
+                    winner=None,
+                    price_amount=price_amount,
+                    entry_amount=entry_amount
+                )))
+                count += 1
+            resolver.save()
+            if on_round:
+                on_round({"round": round_number, "count": count, "alive": [getattr(player, "pk", None) for player in next_round]})
+        alive = next_round
+        round_number += 1
+    return alive[0]
+
+def bracket_rounds(matches):
+    rounds = defaultdict(list)
+    for match in matches:
+        rounds[match.round_number or 1].append(match)
+    return sorted(rounds.items())
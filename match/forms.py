@@ -22,13 +22,13 @@ class SingleMatchForm(forms.ModelForm):
     )
 
     player_1 = forms.ModelChoiceField(
-        queryset=Player.objects.all().order_by("name"),
+        queryset=Player.objects.select_related("band").order_by("name"),
         widget=forms.Select(attrs={'class': 'form-select'}),
         label="Player 1"
     )
 
     player_2 = forms.ModelChoiceField(
-        queryset=Player.objects.all().order_by("name"),
+        queryset=Player.objects.select_related("band").order_by("name"),
         widget=forms.Select(attrs={'class': 'form-select'}),
         label="Player 2"
     )
@@ -96,7 +96,9 @@ class PlayerSelectionFilterForm(forms.Form):
     )
     sort_by = forms.ChoiceField(
         choices=[
-            ("", "Default (Win % High → Low)"),
+            ("", "Default (Rating High → Low)"),
+            ("rating", "Rating (Low → High)"),
+            ("-rating", "Rating (High → Low)"),
             ("name", "Name (A-Z)"),
             ("-name", "Name (Z-A)"),
             ("wins", "Wins (Low → High)"),
@@ -131,7 +133,7 @@ class PlayerSelectionFilterForm(forms.Form):
         if sort_by:
             queryset = queryset.order_by(sort_by)
         else:
-            queryset = queryset.order_by("-winningpercentage")
+            queryset = queryset.order_by("-rating")
         return queryset
     
 class CreateMatchSetupForm(forms.Form):
@@ -143,7 +145,7 @@ class CreateMatchSetupForm(forms.Form):
     )
 
     players = forms.ModelMultipleChoiceField(
-        queryset=Player.objects.all().order_by("-winningpercentage"),
+        queryset=Player.objects.select_related("band").order_by("-rating"),
         widget=forms.CheckboxSelectMultiple,
         label="Select Players"
     )
@@ -178,9 +180,22 @@ class CreateMatchSetupForm(forms.Form):
         )
 
         self.fields["players"].label_from_instance = lambda player: (
-            f"""{player.band.emoji or ''} {player.name}{' ©️' if player.id in champions else ''} | {'M' if player.gender == "Male" else 'F'} | {round(player.winningpercentage, 2)}%"""
+            f"""{player.band.emoji or ''} {player.name}{' ©️' if player.id in champions else ''} | {'M' if player.gender == "Male" else 'F'} | {round(player.winningpercentage, 2)}% | {round(player.rating)}"""
         ).strip()
 
+class SwissSetupForm(CreateMatchSetupForm):
+    tournament_format = "swiss"
+
+    rounds = forms.IntegerField(
+        label="Rounds",
+        required=False,
+        min_value=1,
+        help_text="Optional. Defaults to log2 of the number of players, enough to leave a single unbeaten player."
+    )
+
+class EliminationSetupForm(CreateMatchSetupForm):
+    tournament_format = "single_elimination"
+
 class ChampionshipChoiceField(forms.ModelChoiceField):
     """Custom field to display championship name + holder."""
     def label_from_instance(self, obj):
@@ -189,7 +204,7 @@ class ChampionshipChoiceField(forms.ModelChoiceField):
 
 class ChampionshipChallengeForm(forms.ModelForm):
     championship = ChampionshipChoiceField(
-        queryset=Championship.objects.all(),
+        queryset=Championship.objects.select_related("player"),
         widget=forms.Select(attrs={'class': 'form-select'})
     )
 
@@ -206,4 +221,18 @@ class ChampionshipChallengeForm(forms.ModelForm):
             'date': forms.DateInput(attrs={'type': 'date', 'class': 'form-control'}),
             'price_amount': forms.NumberInput(attrs={'class': 'form-control'}),
             'entry_amount': forms.NumberInput(attrs={'class': 'form-control'}),
-        }
\ No newline at end of file
+        }
+class TournamentForecastForm(forms.Form):
+    players = forms.ModelMultipleChoiceField(
+        queryset=Player.objects.select_related("band").order_by("name"),
+        widget=forms.CheckboxSelectMultiple,
+        required=False,
+        label="Select Players",
+        help_text="Leave empty to forecast the players already entered in this tournament."
+    )
+    runs = forms.IntegerField(
+        label="Simulations",
+        min_value=1000,
+        max_value=100000,
+        initial=10000
+    )
@@ -0,0 +1,195 @@
+import datetime
+import logging
+import traceback
+from math import comb
+from django.db import transaction
+from django.db.models import F
+from django.utils.timezone import now
+from academy.models import Band, Player
+from .models import Job, SingleMatch, Tournament
+from .utils import create_round_robin, generate_tournament_winner, generate_winners
+from .formats import play_swiss, play_single_elimination, swiss_round_count
+
+logger = logging.getLogger(__name__)
+
+class JobCancelled(Exception):
+    pass
+
+def enqueue(kind, **payload):
+    return Job.objects.create(kind=kind, payload=payload)
+
+def claim_next_job():
+    """Take the oldest pending job. Safe with several workers: only one can flip it to running."""
+    while True:
+        job = Job.objects.filter(status="pending").order_by("pk").first()
+        if job is None:
+            return None
+        if Job.objects.filter(pk=job.pk, status="pending").update(status="running", started_at=now()):
+            job.refresh_from_db()
+            return job
+
+def job_progress(job):
+    """
+    Progress callback for MatchResolver: bumps the counters without rewriting
+    the whole row. It runs inside the chunk's transaction, so a cancelled job
+    rolls the chunk back and stops.
+    """
+    def on_save(created, resolved):
+        updated = (
+            Job.objects
+            .filter(pk=job.pk, status="running")
+            .update(created=F("created") + created, resolved=F("resolved") + resolved)
+        )
+        if not updated:
+            raise JobCancelled
+    return on_save
+
+def start_tournament_run(job, tournament_id, **state):
+    """
+    On the first run of a job, record the pairing ``state`` in its payload and
+    reset the tournament checkpoint. A resumed run gets the recorded state
+    back, so it walks the same pairings and picks up after the checkpoint.
+    """
+    if "state" not in job.payload:
+        job.payload["state"] = state
+        with transaction.atomic():
+            Job.objects.filter(pk=job.pk).update(payload=job.payload)
+            Tournament.objects.filter(pk=tournament_id).update(checkpoint=0)
+    return Tournament.objects.get(pk=tournament_id), job.payload["state"]
+
+def round_progress(job):
+    """
+    on_round callback for the Swiss and elimination formats: records the
+    state after each round in the payload, in the round's transaction, so a
+    resumed run carries on with the next round.
+    """
+    def on_round(state):
+        job.payload["state"] = state
+        Job.objects.filter(pk=job.pk).update(payload=job.payload)
+    return on_round
+
+def set_total(job, total):
+    Job.objects.filter(pk=job.pk).update(total=total)
+
+def selected_players(player_ids):
+    players = Player.all_objects.select_related("band").in_bulk(player_ids)
+    return [players[player_id] for player_id in player_ids if player_id in players]
+
+def play_match_setup(job, tournament_id, player_ids, match_name, price_amount, entry_amount, match_date, state=None):
+    tournament, _ = start_tournament_run(job, tournament_id)
+    match_date = datetime.date.fromisoformat(match_date)
+    players = selected_players(player_ids)
+    set_total(job, comb(len(players), 2))
+
+    count = create_round_robin(
+        players,
+        name_prefix=f"{match_name} Match ",
+        tournament=tournament,
+        price_amount=price_amount,
+        entry_amount=entry_amount,
+        match_date=match_date,
+        on_save=job_progress(job),
+    )
+    generate_tournament_winner(tournament, price_amount, entry_amount, match_date, count, on_save=job_progress(job))
+
+def play_swiss_setup(job, tournament_id, player_ids, rounds, match_name, price_amount, entry_amount, match_date, state=None):
+    tournament, state = start_tournament_run(job, tournament_id)
+    players = selected_players(player_ids)
+    rounds = rounds or swiss_round_count(len(players))
+    set_total(job, rounds * (len(players) // 2))
+
+    play_swiss(
+        players,
+        rounds,
+        name_prefix=f"{match_name} Match ",
+        tournament=tournament,
+        price_amount=price_amount,
+        entry_amount=entry_amount,
+        match_date=datetime.date.fromisoformat(match_date),
+        state=state,
+        on_save=job_progress(job),
+        on_round=round_progress(job),
+    )
+
+def play_elimination_setup(job, tournament_id, player_ids, match_name, price_amount, entry_amount, match_date, state=None):
+    tournament, state = start_tournament_run(job, tournament_id)
+    players = selected_players(player_ids)
+    set_total(job, max(len(players) - 1, 0))
+
+    play_single_elimination(
+        players,
+        name_prefix=f"{match_name} Match ",
+        tournament=tournament,
+        price_amount=price_amount,
+        entry_amount=entry_amount,
+        match_date=datetime.date.fromisoformat(match_date),
+        state=state,
+        on_save=job_progress(job),
+        on_round=round_progress(job),
+    )
+
+def league_groups(gender, band_ids):
+    groups = []
+    if band_ids:
+        for band in Band.objects.filter(pk__in=band_ids).order_by("pk"):
+            groups.append((f"{band.name} Stage Match: ", Player.objects.filter(band=band)))
+    else:
+        groups.append(("League Stage Match: ", Player.objects.all()))
+
+    return [
+        (name_prefix, list((players if gender == "Both" else players.filter(gender=gender)).order_by("pk").values_list("pk", flat=True)))
+        for name_prefix, players in groups
+    ]
+
+def play_league(job, tournament_id, gender, band_ids, price_amount, entry_amount, match_date, state=None):
+    if state is None:
+        state = {"groups": league_groups(gender, band_ids)}
+    tournament, state = start_tournament_run(job, tournament_id, **state)
+    match_date = datetime.date.fromisoformat(match_date)
+
+    players = Player.all_objects.select_related("band").in_bulk(
+        [player_id for _, player_ids in state["groups"] for player_id in player_ids]
+    )
+    groups = [
+        (name_prefix, [players[player_id] for player_id in player_ids if player_id in players])
+        for name_prefix, player_ids in state["groups"]
+    ]
+    set_total(job, sum(comb(len(group), 2) for _, group in groups))
+
+    count = 1
+    for name_prefix, players in groups:
+        count = create_round_robin(
+            players,
+            name_prefix=name_prefix,
+            tournament=tournament,
+            price_amount=price_amount,
+            entry_amount=entry_amount,
+            match_date=match_date,
+            count=count,
+            on_save=job_progress(job),
+        )
+    generate_tournament_winner(tournament, price_amount, entry_amount, match_date, count, on_save=job_progress(job))
+
+def complete_all_matches(job, state=None):
+    matches = SingleMatch.objects.filter(winner=None, tournament__is_main_tournament=False)
+    set_total(job, matches.count())
+    generate_winners(matches, on_save=job_progress(job))
+
+JOB_HANDLERS = {
+    "match_setup": play_match_setup,
+    "swiss": play_swiss_setup,
+    "single_elimination": play_elimination_setup,
+    "league": play_league,
+    "complete_all_matches": complete_all_matches,
+}
+
+def run_job(job):
+    try:
+        JOB_HANDLERS[job.kind](job, **job.payload)
+    except JobCancelled:
+        Job.objects.filter(pk=job.pk).update(finished_at=now())
+    except Exception:
+        logger.exception("Job %s failed", job.pk)
+        Job.objects.filter(pk=job.pk).update(status="failed", error=traceback.format_exc(), finished_at=now())
+    else:
+        Job.objects.filter(pk=job.pk).update(status="done", finished_at=now())
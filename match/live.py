@@ -0,0 +1,148 @@
+import asyncio
+import contextlib
+import json
+import logging
+from datetime import timedelta
+from asgiref.sync import sync_to_async
+from django.db.models import Max
+from django.utils.timezone import now
+from academy.models import ChampionshipHistory
+from .models import SingleMatch, Notification
+
+logger = logging.getLogger(__name__)
+
+POLL_INTERVAL = 1.0
+KEEPALIVE = 15
+RETRY_MS = 3000
+QUEUE_SIZE = 100
+# A result is timestamped before its transaction commits, so every poll
+# looks back this far and skips the results it has already sent.
+LOOKBACK = timedelta(seconds=10)
+
+class ChangeStream:
+    """
+    Reads what was written since the previous poll: match results, title
+    changes (new reigns) and notifications. Reigns and notifications are
+    followed by id, which SQLite hands out in commit order as it only has
+    one writer at a time; results by resolved_at, which later edits to a
+    match leave alone, so renaming a finished match does not send it again.
+    """
+
+    def __init__(self):
+        self.since = None
+        self.history_id = 0
+        self.notification_id = 0
+        self.sent = {}
+
+    def start(self):
+        """Begin at the present: only what is written from now on is streamed."""
+        self.since = now()
+        self.history_id = ChampionshipHistory.objects.aggregate(last=Max("pk"))["last"] or 0
+        self.notification_id = Notification.objects.aggregate(last=Max("pk"))["last"] or 0
+        self.sent = {}
+
+    def poll(self):
+        """Three queries, whatever has changed. Returns the new events, oldest first."""
+        events = []
+        results = (
+            SingleMatch.objects
+            .filter(winner__isnull=False, resolved_at__gt=self.since - LOOKBACK)
+            .select_related("player_1", "player_2", "winner")
+            .order_by("resolved_at", "pk")
+        )
+        for match in results:
+            if self.sent.get(match.pk) == match.resolved_at:
+                continue
+            self.sent[match.pk] = match.resolved_at
+            self.since = max(self.since, match.resolved_at)
+            events.append({
+                "type": "result",
+                "match": match.pk,
+                "tournament": match.tournament_id,
+                "name": match.name,
+                "players": [getattr(match.player_1, "name", None), getattr(match.player_2, "name", None)],
+                "winner": match.winner.name,
+            })
+        horizon = self.since - LOOKBACK
+        self.sent = {pk: resolved_at for pk, resolved_at in self.sent.items() if resolved_at > horizon}
+
+        for reign in ChampionshipHistory.objects.filter(pk__gt=self.history_id).select_related("championship", "player").order_by("pk"):
+            self.history_id = reign.pk
+            events.append({
+                "type": "title",
+                "tournament": None,
+                "championship": reign.championship.name,
+                "player": reign.player.name,
+            })
+
+        for notification in Notification.objects.filter(pk__gt=self.notification_id).select_related("match").order_by("pk"):
+            self.notification_id = notification.pk
+            events.append({
+                "type": "notification",
+                "match": notification.match_id,
+                "tournament": notification.match.tournament_id,
+                "content": notification.content,
+            })
+        return events
+
+class LiveFeed:
+    """
+    Fans the change stream out to every connected client. There is one
+    poller per process, started by the first subscriber and stopped after
+    the last, so the database sees the same queries whether one client or
+    a thousand are watching. A client too slow to keep up loses its oldest
+    events rather than holding the others back.
+    """
+
+    def __init__(self, stream=None, interval=POLL_INTERVAL):
+        self.stream = stream or ChangeStream()
+        self.interval = interval
+        self.subscribers = set()
+        self.task = None
+
+    async def run(self):
+        await sync_to_async(self.stream.start)()
+        while self.subscribers:
+            await asyncio.sleep(self.interval)
+            try:
+                events = await sync_to_async(self.stream.poll)()
+            except Exception:
+                logger.exception("Live feed poll failed")
+                continue
+            self.publish(events)
+
+    def publish(self, events):
+        for queue in self.subscribers:
+            for event in events:
+                if queue.full():
+                    queue.get_nowait()
+                queue.put_nowait(event)
+
+    @contextlib.asynccontextmanager
+    async def subscribe(self):
+        queue = asyncio.Queue(QUEUE_SIZE)
+        self.subscribers.add(queue)
+        if self.task is None or self.task.done() or self.task.get_loop() is not asyncio.get_running_loop():
+            self.task = asyncio.create_task(self.run())
+        try:
+            yield queue
+        finally:
+            self.subscribers.discard(queue)
+
+feed = LiveFeed()
+
+def format_event(event):
+    return f"event: {event['type']}\ndata: {json.dumps(event)}\n\n"
+
+async def event_stream(tournament_id=None, live_feed=feed, keepalive=KEEPALIVE):
+    """Server-Sent Events for one client; with ``tournament_id``, only that tournament's results and notifications."""
+    yield f"retry: {RETRY_MS}\n\n"
+    async with live_feed.subscribe() as queue:
+        while True:
+            try:
+                event = await asyncio.wait_for(queue.get(), keepalive)
+            except asyncio.TimeoutError:
+                yield ": keepalive\n\n"
+                continue
+            if tournament_id is None or event["tournament"] in (None, tournament_id):
+                yield format_event(event)
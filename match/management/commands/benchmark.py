@@ -0,0 +1,41 @@
+import json
+from django.core.management.base import BaseCommand, CommandError
+from match.benchmarks import BENCHMARKS, run_benchmarks
+
+
+class Command(BaseCommand):
+    help = "Time the hot paths against the current database and write the results as JSON."
+
+    def add_arguments(self, parser):
+        parser.add_argument("benchmarks", nargs="*", help=f"Benchmarks to run (default: all of {', '.join(BENCHMARKS)}).")
+        parser.add_argument("--repeat", type=int, default=5)
+        parser.add_argument("--league-players", type=int, default=40)
+        parser.add_argument("--output", help="Write the JSON results to this file.")
+        parser.add_argument("--baseline", help="JSON results of an earlier run to compare against.")
+
+    def handle(self, *args, **options):
+        unknown = set(options["benchmarks"]) - set(BENCHMARKS)
+        if unknown:
+            raise CommandError(f"Unknown benchmarks: {', '.join(sorted(unknown))}")
+
+        report = run_benchmarks(options["benchmarks"], repeat=options["repeat"], league_players=options["league_players"])
+
+        baseline = {}
+        if options["baseline"]:
+            with open(options["baseline"]) as f:
+                baseline = json.load(f)["results"]
+
+        self.stdout.write(f"{'benchmark':<28}{'median ms':>12}{'p95 ms':>12}{'queries':>10}{'vs baseline':>14}")
+        for name, result in report["results"].items():
+            if "error" in result:
+                self.stdout.write(self.style.ERROR(f"{name:<28}{result['error']}"))
+                continue
+            change = ""
+            if baseline.get(name, {}).get("median_ms"):
+                change = f"{result['median_ms'] / baseline[name]['median_ms']:.2f}x"
+            self.stdout.write(f"{name:<28}{result['median_ms']:>12}{result['p95_ms']:>12}{result['queries']:>10}{change:>14}")
+
+        if options["output"]:
+            with open(options["output"], "w") as f:
+                json.dump(report, f, indent=2)
+            self.stdout.write(self.style.SUCCESS(f"Wrote {options['output']}"))
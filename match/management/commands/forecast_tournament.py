@@ -0,0 +1,33 @@
+from django.core.management.base import BaseCommand, CommandError
+from academy.models import Player
+from match.models import Tournament
+from match.forecast import forecast_tournament, tournament_players
+
+
+class Command(BaseCommand):
+    help = "Simulate a tournament many times in memory and print each player's chance of winning it."
+
+    def add_arguments(self, parser):
+        parser.add_argument("tournament_id", type=int)
+        parser.add_argument("--players", type=int, nargs="+", help="Player ids to simulate instead of the tournament entrants.")
+        parser.add_argument("--runs", type=int, default=10000)
+        parser.add_argument("--seed", type=int)
+
+    def handle(self, *args, **options):
+        try:
+            tournament = Tournament.objects.get(pk=options["tournament_id"])
+        except Tournament.DoesNotExist:
+            raise CommandError(f"Tournament {options['tournament_id']} does not exist.")
+
+        if options["players"]:
+            players = Player.all_objects.filter(pk__in=options["players"]).select_related("band")
+        else:
+            players = tournament_players(tournament)
+
+        forecast = forecast_tournament(players, runs=options["runs"], seed=options["seed"])
+        if not forecast:
+            raise CommandError(f"No players to simulate for {tournament}.")
+
+        self.stdout.write(f"{tournament} — {options['runs']} simulations")
+        for player, probability in forecast:
+            self.stdout.write(f"{player.name:<40} {probability * 100:6.2f}%")
@@ -0,0 +1,30 @@
+from django.core.management.base import BaseCommand
+from academy.models import Player, DEFAULT_RATING
+from academy.versions import bump
+from match.models import SingleMatch
+from match.ratings import replay_ratings
+
+
+class Command(BaseCommand):
+    help = "Rebuild every player's rating from scratch by replaying all resolved matches in date order."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--chunk-size", type=int, default=5000)
+
+    def handle(self, *args, **options):
+        results = (
+            SingleMatch.objects
+            .filter(winner__isnull=False, player_1__isnull=False, player_2__isnull=False)
+            .order_by("date", "resolved_at", "pk")
+            .values_list("player_1_id", "player_2_id", "winner_id")
+            .iterator(chunk_size=options["chunk_size"])
+        )
+        ratings = replay_ratings(results)
+
+        players = list(Player.all_objects.only("pk", "rating"))
+        for player in players:
+            player.rating = ratings.get(player.pk, DEFAULT_RATING)
+        Player.all_objects.bulk_update(players, ["rating"], batch_size=500)
+        bump(Player)
+
+        self.stdout.write(self.style.SUCCESS(f"Rebuilt ratings for {len(players)} players."))
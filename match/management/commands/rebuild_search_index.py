@@ -0,0 +1,15 @@
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+from match.search import SEARCH_TABLE, search_enabled, rebuild_search_index
+
+
+class Command(BaseCommand):
+    help = "Rebuild the full-text search index used by the match list search box."
+
+    def handle(self, *args, **options):
+        if not search_enabled():
+            raise CommandError("The full-text search index is only available on SQLite.")
+        rebuild_search_index()
+        with connection.cursor() as cursor:
+            cursor.execute(f"SELECT COUNT(*) FROM {SEARCH_TABLE}")
+            self.stdout.write(self.style.SUCCESS(f"Indexed {cursor.fetchone()[0]} matches."))
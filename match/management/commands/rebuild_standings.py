@@ -0,0 +1,17 @@
+from django.core.management.base import BaseCommand
+from match.models import Tournament
+from match.standings import rebuild_standings
+
+
+class Command(BaseCommand):
+    help = "Rebuild the tournament standings table from the matches, every entrant included."
+
+    def add_arguments(self, parser):
+        parser.add_argument("tournament_ids", type=int, nargs="*", help="Only rebuild these tournaments.")
+
+    def handle(self, *args, **options):
+        tournaments = None
+        if options["tournament_ids"]:
+            tournaments = Tournament.objects.filter(pk__in=options["tournament_ids"])
+        rows = rebuild_standings(tournaments)
+        self.stdout.write(self.style.SUCCESS(f"Rebuilt {rows} standing rows."))
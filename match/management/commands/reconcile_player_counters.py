@@ -0,0 +1,23 @@
+from django.core.management.base import BaseCommand
+from match.counters import reconcile_player_counters
+
+
+class Command(BaseCommand):
+    help = "Recompute player wins, matches played and winning percentage from the match history."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--tournament", type=int, nargs="+", dest="tournament_ids", help="Only reconcile the players of these tournaments.")
+        parser.add_argument("--dry-run", action="store_true", help="Report drift without fixing it.")
+
+    def handle(self, *args, **options):
+        drift = reconcile_player_counters(options["tournament_ids"], fix=not options["dry_run"])
+        for player, field, stored, actual in drift:
+            self.stdout.write(f"{player.name}: {field} is {stored}, should be {actual}")
+
+        players = len({player.pk for player, *_ in drift})
+        if not drift:
+            self.stdout.write(self.style.SUCCESS("Player counters match the match history."))
+        elif options["dry_run"]:
+            self.stdout.write(self.style.WARNING(f"Found {len(drift)} drifted values on {players} players."))
+        else:
+            self.stdout.write(self.style.SUCCESS(f"Fixed {len(drift)} drifted values on {players} players."))
@@ -0,0 +1,35 @@
+import time
+from django.core.management.base import BaseCommand
+from match.jobs import claim_next_job, run_job
+from match.models import Job
+
+
+class Command(BaseCommand):
+    help = "Run queued background jobs (league creation, match setup, Swiss and elimination brackets, complete all matches)."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--once", action="store_true", help="Exit when the queue is empty instead of waiting for more jobs.")
+        parser.add_argument("--interval", type=float, default=1.0, help="Seconds to wait between polls of an empty queue.")
+        parser.add_argument(
+            "--requeue-running",
+            action="store_true",
+            help="Put jobs left running by a crashed worker back on the queue. Only use when no other worker is alive.",
+        )
+
+    def handle(self, *args, **options):
+        if options["requeue_running"]:
+            requeued = Job.objects.filter(status="running").update(status="pending")
+            self.stdout.write(f"Requeued {requeued} interrupted job(s).")
+
+        while True:
+            job = claim_next_job()
+            if job is None:
+                if options["once"]:
+                    return
+                time.sleep(options["interval"])
+                continue
+
+            self.stdout.write(f"Running {job}")
+            run_job(job)
+            job.refresh_from_db()
+            self.stdout.write(f"Finished {job} in {job.elapsed:.1f}s")
@@ -0,0 +1,51 @@
+import time
+from django.core.management.base import BaseCommand
+from match.seed import seed_dataset
+
+
+class Command(BaseCommand):
+    help = "Generate a seeded synthetic league with bulk inserts, for benchmarks and load testing."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--bands", type=int, default=50)
+        parser.add_argument("--players", type=int, default=5000)
+        parser.add_argument("--tournaments", type=int, default=100)
+        parser.add_argument("--matches", type=int, default=1000000)
+        parser.add_argument("--championships", type=int, default=20)
+        parser.add_argument("--history", type=int, default=10000, help="Championship reigns, spread over the championships.")
+        parser.add_argument("--auctions", type=int, default=50000)
+        parser.add_argument("--rules", type=int, default=20)
+        parser.add_argument("--finished", type=float, default=0.8, help="Share of matches that already have a winner.")
+        parser.add_argument("--label", default="Synthetic", help="Prefix for every generated name; use a new one to add to an existing league.")
+        parser.add_argument("--seed", type=int, default=0)
+        parser.add_argument("--chunk-size", type=int, default=10000)
+
+    def handle(self, *args, **options):
+        start = time.perf_counter()
+        written = 0
+
+        def progress(count):
+            nonlocal written
+            written += count
+            self.stdout.write(f"{written}/{options['matches']} matches ({time.perf_counter() - start:.0f}s)")
+
+        data = seed_dataset(
+            bands=options["bands"],
+            players_per_band=max(options["players"] // max(options["bands"], 1), 2),
+            tournaments=options["tournaments"],
+            matches=options["matches"],
+            championships=options["championships"],
+            reigns=max(options["history"] // max(options["championships"], 1), 1),
+            auctions=options["auctions"],
+            rules=options["rules"],
+            finished=options["finished"],
+            label=options["label"],
+            seed=options["seed"],
+            chunk_size=options["chunk_size"],
+            keep_matches=0,
+            progress=progress,
+        )
+        self.stdout.write(self.style.SUCCESS(
+            f"Created {len(data['bands'])} bands, {len(data['players'])} players and {written} matches "
+            f"in {time.perf_counter() - start:.0f}s."
+        ))
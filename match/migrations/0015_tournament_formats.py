@@ -0,0 +1,23 @@
+# Generated by Django 5.2.18 on 2026-10-18 17:09
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('match', '0014_singlematch_is_championship_match'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='singlematch',
+            name='round_number',
+            field=models.PositiveIntegerField(blank=True, null=True),
+        ),
+        migrations.AddField(
+            model_name='tournament',
+            name='format',
+            field=models.CharField(choices=[('round_robin', 'Round Robin'), ('swiss', 'Swiss'), ('single_elimination', 'Single Elimination')], default='round_robin', max_length=20),
+        ),
+    ]
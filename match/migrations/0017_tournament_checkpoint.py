@@ -0,0 +1,23 @@
+# Generated by Django 5.2.18 on 2026-10-18 17:12
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('match', '0016_job'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='tournament',
+            name='checkpoint',
+            field=models.PositiveIntegerField(default=0, help_text='Number of the next league match to generate; earlier pairings are already committed.'),
+        ),
+        migrations.AlterField(
+            model_name='job',
+            name='status',
+            field=models.CharField(choices=[('pending', 'Pending'), ('running', 'Running'), ('done', 'Done'), ('failed', 'Failed'), ('cancelled', 'Cancelled')], db_index=True, default='pending', max_length=10),
+        ),
+    ]
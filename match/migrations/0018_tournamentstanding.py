@@ -0,0 +1,65 @@
+# Generated by Django 5.2.18 on 2026-10-18 17:13
+
+import django.db.models.deletion
+from django.db import migrations, models
+from django.db.models import Count, Sum, Q, F
+
+
+def populate_standings(apps, schema_editor):
+    SingleMatch = apps.get_model('match', 'SingleMatch')
+    TournamentStanding = apps.get_model('match', 'TournamentStanding')
+
+    standings = {}
+    matches = SingleMatch.objects.filter(tournament__isnull=False, winner__isnull=False)
+    for slot in ('player_1', 'player_2'):
+        won = Q(winner=F(slot))
+        rows = (
+            matches
+            .filter(**{f'{slot}__isnull': False})
+            .values_list('tournament_id', f'{slot}_id')
+            .annotate(
+                played=Count('pk'),
+                wins=Count('pk', filter=won),
+                prize=Sum('price_amount', filter=won),
+                entry=Sum('entry_amount', filter=~won),
+            )
+            .order_by()
+        )
+        for tournament_id, player_id, played, wins, prize, entry in rows:
+            standing = standings.setdefault(
+                (tournament_id, player_id),
+                TournamentStanding(tournament_id=tournament_id, player_id=player_id),
+            )
+            standing.played += played
+            standing.wins += wins
+            standing.losses += played - wins
+            standing.networth_delta += (prize or 0) * 2/3 - (entry or 0) * 2/3
+    TournamentStanding.objects.bulk_create(standings.values(), batch_size=500)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('academy', '0024_player_rating'),
+        ('match', '0017_tournament_checkpoint'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='TournamentStanding',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('played', models.PositiveIntegerField(default=0)),
+                ('wins', models.PositiveIntegerField(default=0)),
+                ('losses', models.PositiveIntegerField(default=0)),
+                ('networth_delta', models.FloatField(default=0)),
+                ('player', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='tournament_standings', to='academy.player')),
+                ('tournament', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='standings', to='match.tournament')),
+            ],
+            options={
+                'indexes': [models.Index(fields=['tournament', '-wins', 'played'], name='standing_rank_idx')],
+                'constraints': [models.UniqueConstraint(fields=('tournament', 'player'), name='unique_tournament_standing')],
+            },
+        ),
+        migrations.RunPython(populate_standings, migrations.RunPython.noop),
+    ]
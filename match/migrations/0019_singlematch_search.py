@@ -0,0 +1,47 @@
+from django.db import migrations
+
+SEARCH_TABLE = 'match_singlematch_search'
+
+
+def create_search_index(apps, schema_editor):
+    if schema_editor.connection.vendor != 'sqlite':
+        return
+    matches = apps.get_model('match', 'SingleMatch')._meta.db_table
+    tournaments = apps.get_model('match', 'Tournament')._meta.db_table
+    players = apps.get_model('academy', 'Player')._meta.db_table
+    bands = apps.get_model('academy', 'Band')._meta.db_table
+    with schema_editor.connection.cursor() as cursor:
+        cursor.execute(
+            f'CREATE VIRTUAL TABLE IF NOT EXISTS {SEARCH_TABLE} USING fts5('
+            'name, player_1, player_2, winner, band_1, band_2, tournament, '
+            "tokenize = 'unicode61 remove_diacritics 2', prefix = '2 3')"
+        )
+        cursor.execute(
+            f'INSERT INTO {SEARCH_TABLE} (rowid, name, player_1, player_2, winner, band_1, band_2, tournament) '
+            'SELECT m.id, m.name, p1.name, p2.name, w.name, b1.name, b2.name, t.name '
+            f'FROM {matches} m '
+            f'LEFT JOIN {players} p1 ON p1.id = m.player_1_id '
+            f'LEFT JOIN {players} p2 ON p2.id = m.player_2_id '
+            f'LEFT JOIN {players} w ON w.id = m.winner_id '
+            f'LEFT JOIN {bands} b1 ON b1.id = p1.band_id '
+            f'LEFT JOIN {bands} b2 ON b2.id = p2.band_id '
+            f'LEFT JOIN {tournaments} t ON t.id = m.tournament_id'
+        )
+
+
+def drop_search_index(apps, schema_editor):
+    if schema_editor.connection.vendor != 'sqlite':
+        return
+    with schema_editor.connection.cursor() as cursor:
+        cursor.execute(f'DROP TABLE IF EXISTS {SEARCH_TABLE}')
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('match', '0018_tournamentstanding'),
+    ]
+
+    operations = [
+        migrations.RunPython(create_search_index, drop_search_index),
+    ]
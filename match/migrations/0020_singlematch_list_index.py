@@ -0,0 +1,23 @@
+# Generated by Django 5.2.18 on 2026-10-18 17:17
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('academy', '0024_player_rating'),
+        ('match', '0019_singlematch_search'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='singlematch',
+            name='is_finished',
+            field=models.GeneratedField(db_persist=True, expression=models.Case(models.When(then=models.Value(False), winner__isnull=True), default=models.Value(True)), output_field=models.BooleanField()),
+        ),
+        migrations.AddIndex(
+            model_name='singlematch',
+            index=models.Index(fields=['is_finished', '-updated_at', '-id'], name='singlematch_list_idx'),
+        ),
+    ]
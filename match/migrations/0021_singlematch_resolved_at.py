@@ -0,0 +1,26 @@
+# Generated by Django 5.2.18 on 2026-10-18 18:26
+
+from django.db import migrations, models
+from django.db.models import F
+
+
+def backfill_resolved_at(apps, schema_editor):
+    # The last edit is the best guess there is for results recorded before the field
+    SingleMatch = apps.get_model('match', 'SingleMatch')
+    SingleMatch.objects.filter(winner__isnull=False).update(resolved_at=F('updated_at'))
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('match', '0020_singlematch_list_index'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='singlematch',
+            name='resolved_at',
+            field=models.DateTimeField(blank=True, db_index=True, help_text='When the winner was recorded; unlike updated_at, later edits leave it alone.', null=True),
+        ),
+        migrations.RunPython(backfill_resolved_at, migrations.RunPython.noop),
+    ]
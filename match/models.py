@@ -3,17 +3,27 @@ from academy.models import Player
 from django.contrib.contenttypes.models import ContentType
 from django.contrib.contenttypes.fields import GenericForeignKey
 from django.db.models import Q
-from academy.models import Championship
-from django.db.models.signals import pre_save, post_save
+from academy.models import Band
+from django.db.models.signals import pre_save, post_save, post_init
+from .search import SEARCH_TABLE, search_enabled, fts_query, reindex_matches, reindex_match_ids
+from django.utils.timezone import now
 
 # Create your models here.
 class Tournament(models.Model):
+    FORMAT_CHOICES = [
+        ('round_robin', 'Round Robin'),
+        ('swiss', 'Swiss'),
+        ('single_elimination', 'Single Elimination'),
+    ]
+
     name = models.CharField(max_length=200)
     date = models.DateField()
     updated_at = models.DateTimeField(auto_now=True) 
     is_completed = models.BooleanField(default=False)
     is_main_tournament = models.BooleanField(default=False)
     image_url = models.CharField(max_length=120, null=True, blank=True)
+    format = models.CharField(max_length=20, choices=FORMAT_CHOICES, default='round_robin')
+    checkpoint = models.PositiveIntegerField(default=0, help_text="Number of the next league match to generate; earlier pairings are already committed.")
 
     def __str__(self):
         return self.name
@@ -22,6 +32,8 @@ class SingleMatchQuerySet(models.QuerySet):
     def search(self, query=None):
         if query is None or query == "":
             return self.none()
+        if search_enabled(self.db):
+            return self.full_text_search(query)
         lookups = (
             Q(name__icontains=query) |
             Q(player_1__name__icontains=query) |
@@ -31,7 +43,19 @@ class SingleMatchQuerySet(models.QuerySet):
             Q(player_2__band__name__icontains=query) |
             Q(tournament__name__icontains=query)
         )
-        return self.filter(lookups) 
+        return self.filter(lookups)
+
+    def full_text_search(self, query):
+        """Ranked, prefix-matching search through the FTS5 index, best match first."""
+        query = fts_query(query)
+        if not query:
+            return self.none()
+        return self.extra(
+            tables=[SEARCH_TABLE],
+            where=[f"{SEARCH_TABLE}.rowid = {self.model._meta.db_table}.id", f"{SEARCH_TABLE} MATCH %s"],
+            params=[query],
+            select={"search_rank": f"{SEARCH_TABLE}.rank"},
+        ).order_by("search_rank")
 
 class SingleMatchManager(models.Manager):
     def get_queryset(self):
@@ -44,34 +68,64 @@ class SingleMatch(models.Model):
     name = models.CharField(max_length=200)
     date = models.DateField()
     tournament = models.ForeignKey(Tournament, on_delete=models.SET_NULL, null=True, blank=True, related_name="tournament")
+    round_number = models.PositiveIntegerField(null=True, blank=True)
     player_1 = models.ForeignKey(Player, on_delete=models.SET_NULL, null=True, blank=True, related_name="single_match_player_1")
     player_2 = models.ForeignKey(Player, on_delete=models.SET_NULL, null=True, blank=True, related_name="single_match_player_2")
     winner = models.ForeignKey(Player, on_delete=models.SET_NULL, null=True, blank=True, related_name="single_match_winner")
     price_amount = models.FloatField(default=0)
     entry_amount = models.FloatField(default=0)
     updated_at = models.DateTimeField(auto_now=True) 
+    resolved_at = models.DateTimeField(null=True, blank=True, db_index=True, help_text="When the winner was recorded; unlike updated_at, later edits leave it alone.")
     is_championship_match = models.BooleanField(default=False)
+    is_finished = models.GeneratedField(
+        expression=models.Case(
+            models.When(winner__isnull=True, then=models.Value(False)),
+            default=models.Value(True),
+        ),
+        output_field=models.BooleanField(),
+        db_persist=True,
+    )
 
     objects = SingleMatchManager()
 
+    class Meta:
+        indexes = [
+            # Serves the match list ordering: unfinished first, most recent first
+            models.Index(fields=["is_finished", "-updated_at", "-id"], name="singlematch_list_idx"),
+        ]
+
     def __str__(self):
         return f"{self.name} - {self.player_1} vs {self.player_2}"
-    
-def update_championship_on_winner(sender, instance, created, **kwargs):
-    if not instance.is_championship_match or not instance.winner:
-        return 
-    championship = Championship.objects.filter(
-        player__in=[instance.player_1, instance.player_2]
-    )
-    if not championship or len(championship) == 2:
-        return
-    championship = championship.first()
-    if championship.player == instance.winner:
+
+def index_single_match(sender, instance, **kwargs):
+    reindex_match_ids([instance.pk])
+
+def remember_indexed_name(sender, instance, **kwargs):
+    # __dict__ so that instances loaded with only() do not fetch the name
+    instance._indexed_name = instance.__dict__.get("name")
+
+def reindex_renamed(sender, instance, created, **kwargs):
+    name = instance.__dict__.get("name")
+    if created or name == getattr(instance, "_indexed_name", name):
         return
-    championship.player = instance.winner
-    championship.save()
+    if sender is Player:
+        reindex_matches("%s IN (m.player_1_id, m.player_2_id, m.winner_id)", [instance.pk])
+    elif sender is Band:
+        reindex_matches(
+            f"EXISTS (SELECT 1 FROM {Player._meta.db_table} p WHERE p.band_id = %s AND p.id IN (m.player_1_id, m.player_2_id))",
+            [instance.pk],
+        )
+    else:
+        reindex_matches("m.tournament_id = %s", [instance.pk])
+    instance._indexed_name = name
 
-post_save.connect(update_championship_on_winner, sender=SingleMatch)
+post_save.connect(index_single_match, sender=SingleMatch)
+post_init.connect(remember_indexed_name, sender=Player)
+post_init.connect(remember_indexed_name, sender=Band)
+post_init.connect(remember_indexed_name, sender=Tournament)
+post_save.connect(reindex_renamed, sender=Player)
+post_save.connect(reindex_renamed, sender=Band)
+post_save.connect(reindex_renamed, sender=Tournament)
     
 class Notification(models.Model):
     match = models.ForeignKey(SingleMatch, on_delete=models.CASCADE, related_name="match_notification")
@@ -81,4 +135,76 @@ class Notification(models.Model):
     timestamp = models.DateTimeField(auto_now=False,auto_now_add=True)
 
     def __str__(self):
-        return f"Notification for {self.match}"
\ No newline at end of file
+        return f"Notification for {self.match}"
+
+class Job(models.Model):
+    STATUS_CHOICES = [
+        ('pending', 'Pending'),
+        ('running', 'Running'),
+        ('done', 'Done'),
+        ('failed', 'Failed'),
+        ('cancelled', 'Cancelled'),
+    ]
+
+    kind = models.CharField(max_length=50)
+    payload = models.JSONField(default=dict)
+    status = models.CharField(max_length=10, choices=STATUS_CHOICES, default='pending', db_index=True)
+    total = models.PositiveIntegerField(default=0)
+    created = models.PositiveIntegerField(default=0)
+    resolved = models.PositiveIntegerField(default=0)
+    error = models.TextField(blank=True)
+    queued_at = models.DateTimeField(auto_now_add=True)
+    started_at = models.DateTimeField(null=True, blank=True)
+    finished_at = models.DateTimeField(null=True, blank=True)
+
+    def __str__(self):
+        return f"Job #{self.pk} {self.kind} ({self.status})"
+
+    @property
+    def is_active(self):
+        return self.status in ('pending', 'running')
+
+    @property
+    def elapsed(self):
+        if not self.started_at:
+            return 0
+        return ((self.finished_at or now()) - self.started_at).total_seconds()
+
+    @property
+    def created_per_second(self):
+        return round(self.created / self.elapsed, 1) if self.elapsed else 0
+
+    @property
+    def resolved_per_second(self):
+        return round(self.resolved / self.elapsed, 1) if self.elapsed else 0
+
+    @property
+    def percent(self):
+        return round(min(self.resolved / self.total, 1) * 100, 1) if self.total else 0
+
+    @property
+    def eta(self):
+        """Seconds left at the current resolve rate, or None when it cannot be estimated yet."""
+        if self.status != 'running' or not self.total or not self.resolved or not self.elapsed:
+            return None
+        return max(self.total - self.resolved, 0) / (self.resolved / self.elapsed)
+
+
+class TournamentStanding(models.Model):
+    tournament = models.ForeignKey(Tournament, on_delete=models.CASCADE, related_name="standings")
+    player = models.ForeignKey(Player, on_delete=models.CASCADE, related_name="tournament_standings")
+    played = models.PositiveIntegerField(default=0)
+    wins = models.PositiveIntegerField(default=0)
+    losses = models.PositiveIntegerField(default=0)
+    networth_delta = models.FloatField(default=0)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=["tournament", "player"], name="unique_tournament_standing"),
+        ]
+        indexes = [
+            models.Index(fields=["tournament", "-wins", "played"], name="standing_rank_idx"),
+        ]
+
+    def __str__(self):
+        return f"{self.tournament} - {self.player}: {self.wins}/{self.played}"
@@ -0,0 +1,27 @@
+from .models import SingleMatch
+
+# Keyset pagination reads the ordering columns back from the rows
+MATCH_ROW_FIELDS = (
+    "name", "date", "price_amount", "entry_amount", "is_finished", "updated_at",
+    "tournament__name", "player_1__name", "player_2__name", "winner__name",
+)
+
+def match_rows(matches=None):
+    """Match table rows (singlematch/partials/table_body.html): tournament and player names only."""
+    matches = SingleMatch.objects.all() if matches is None else matches
+    return matches.select_related("tournament", "player_1", "player_2", "winner").only(*MATCH_ROW_FIELDS)
+
+def match_cards(matches=None):
+    """Match cards (tournament_details_partial.html, singlematch_detail.html): both players with band and title, and the winner."""
+    matches = SingleMatch.objects.all() if matches is None else matches
+    return matches.select_related(
+        "tournament",
+        "player_1__band", "player_1__championship",
+        "player_2__band", "player_2__championship",
+        "winner",
+    )
+
+def bracket_matches(matches=None):
+    """Bracket rounds: both players with their band, and the winner."""
+    matches = SingleMatch.objects.all() if matches is None else matches
+    return matches.select_related("player_1__band", "player_2__band", "winner")
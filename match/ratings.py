@@ -0,0 +1,35 @@
+from academy.models import DEFAULT_RATING
+
+K_FACTOR = 32
+
+def expected_score(rating, opponent_rating):
+    """Elo probability that a player rated ``rating`` beats one rated ``opponent_rating``."""
+    return 1 / (1 + 10 ** ((opponent_rating - rating) / 400))
+
+def rating_change(winner_rating, loser_rating):
+    return K_FACTOR * (1 - expected_score(winner_rating, loser_rating))
+
+def update_ratings(winner, loser):
+    change = rating_change(winner.rating, loser.rating)
+    winner.rating += change
+    loser.rating -= change
+
+def replay_ratings(results):
+    """
+    Replay ``(player_1_id, player_2_id, winner_id)`` results in order, starting
+    every player at DEFAULT_RATING, and return the final rating per player id.
+    """
+    ratings = {}
+    for player_1_id, player_2_id, winner_id in results:
+        if winner_id == player_1_id:
+            loser_id = player_2_id
+        elif winner_id == player_2_id:
+            loser_id = player_1_id
+        else:
+            continue
+        winner_rating = ratings.get(winner_id, DEFAULT_RATING)
+        loser_rating = ratings.get(loser_id, DEFAULT_RATING)
+        change = rating_change(winner_rating, loser_rating)
+        ratings[winner_id] = winner_rating + change
+        ratings[loser_id] = loser_rating - change
+    return ratings
@@ -0,0 +1,94 @@
+import re
+from contextlib import contextmanager
+from django.apps import apps
+from django.db import connections
+
+SEARCH_TABLE = "match_singlematch_search"
+
+def search_enabled(using="default"):
+    return connections[using].vendor == "sqlite"
+
+def fts_query(text):
+    """Turn free text into an FTS5 query: every word must match, as a prefix."""
+    terms = re.findall(r"\w+", text or "")
+    return " ".join(f'"{term}"*' for term in terms)
+
+def create_search_table(cursor):
+    cursor.execute(
+        f"CREATE VIRTUAL TABLE IF NOT EXISTS {SEARCH_TABLE} USING fts5("
+        "name, player_1, player_2, winner, band_1, band_2, tournament, "
+        "tokenize = 'unicode61 remove_diacritics 2', prefix = '2 3')"
+    )
+
+def index_sql(where):
+    SingleMatch = apps.get_model("match", "SingleMatch")
+    Tournament = apps.get_model("match", "Tournament")
+    Player = apps.get_model("academy", "Player")
+    Band = apps.get_model("academy", "Band")
+    return (
+        f"INSERT INTO {SEARCH_TABLE} (rowid, name, player_1, player_2, winner, band_1, band_2, tournament) "
+        "SELECT m.id, m.name, p1.name, p2.name, w.name, b1.name, b2.name, t.name "
+        f"FROM {SingleMatch._meta.db_table} m "
+        f"LEFT JOIN {Player._meta.db_table} p1 ON p1.id = m.player_1_id "
+        f"LEFT JOIN {Player._meta.db_table} p2 ON p2.id = m.player_2_id "
+        f"LEFT JOIN {Player._meta.db_table} w ON w.id = m.winner_id "
+        f"LEFT JOIN {Band._meta.db_table} b1 ON b1.id = p1.band_id "
+        f"LEFT JOIN {Band._meta.db_table} b2 ON b2.id = p2.band_id "
+        f"LEFT JOIN {Tournament._meta.db_table} t ON t.id = m.tournament_id "
+        f"WHERE {where}"
+    )
+
+def reindex_matches(where, params, using="default"):
+    """Refresh the index rows of every match selected by ``where`` (an SQL condition on ``m``)."""
+    if not search_enabled(using):
+        return
+    SingleMatch = apps.get_model("match", "SingleMatch")
+    with connections[using].cursor() as cursor:
+        cursor.execute(
+            f"DELETE FROM {SEARCH_TABLE} WHERE rowid IN (SELECT m.id FROM {SingleMatch._meta.db_table} m WHERE {where})",
+            params,
+        )
+        cursor.execute(index_sql(where), params)
+
+def reindex_match_ids(match_ids, using="default"):
+    match_ids = list(match_ids)
+    if match_ids:
+        reindex_matches(f"m.id IN ({', '.join(['%s'] * len(match_ids))})", match_ids, using)
+
+def remove_match_ids(match_ids, using="default"):
+    match_ids = list(match_ids)
+    if not match_ids or not search_enabled(using):
+        return
+    with connections[using].cursor() as cursor:
+        cursor.execute(f"DELETE FROM {SEARCH_TABLE} WHERE rowid IN ({', '.join(['%s'] * len(match_ids))})", match_ids)
+
+# Deleting rows does not go through signals: a signal per deleted match would
+# be one statement per row. The delete paths use these instead. Rows a delete
+# leaves behind never match a search, which joins the match table, and go with
+# the next rebuild_search_index.
+
+@contextmanager
+def unindexing(matches):
+    """Around a delete of ``matches``: their index rows are removed afterwards, in one statement."""
+    match_ids = list(matches.values_list("pk", flat=True))
+    yield
+    remove_match_ids(match_ids, matches.db)
+
+@contextmanager
+def reindexing(matches):
+    """
+    Around a delete that sets the players, winner or tournament of
+    ``matches`` to NULL: their index rows are refreshed afterwards, so the
+    deleted names stop matching.
+    """
+    match_ids = list(matches.values_list("pk", flat=True))
+    yield
+    reindex_match_ids(match_ids, matches.db)
+
+def rebuild_search_index(using="default"):
+    if not search_enabled(using):
+        return
+    with connections[using].cursor() as cursor:
+        create_search_table(cursor)
+        cursor.execute(f"DELETE FROM {SEARCH_TABLE}")
+        cursor.execute(index_sql("1 = 1"))
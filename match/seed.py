@@ -0,0 +1,134 @@
+import datetime
+import random
+from django.db import transaction
+from django.utils.timezone import now
+from academy.models import Band, Player, Championship, ChampionshipHistory, Auction, Rule, object_pre_save
+from academy.band_stats import reconcile_band_stats
+from academy.ledger import open_accounts
+from academy.versions import bump
+from .models import SingleMatch, Tournament, Notification
+from .search import reindex_match_ids
+from .standings import rebuild_standings
+
+GENDERS = ["Male", "Female"]
+
+def seed_dataset(bands=8, players_per_band=50, tournaments=6, matches=3000, championships=6,
+                 reigns=5, auctions=40, rules=10, finished=0.8, label="Seed", seed=0,
+                 chunk_size=10000, keep_matches=1000, progress=None):
+    """
+    Bulk-create a synthetic league: bands of players, tournaments full of
+    matches (``finished`` of them with a winner), championships with a history
+    of reigns, auctions and rules. ``label`` prefixes every name, so the
+    function can be called again to grow an existing dataset.
+
+    Matches are written ``chunk_size`` at a time, so millions of them fit in
+    memory; only the first ``keep_matches`` are returned and ``progress`` is
+    called with the size of every chunk written.
+    Returns a dict with the created objects.
+    """
+    rng = random.Random(seed)
+    today = datetime.date.today()
+    seeded_at = now()
+
+    with transaction.atomic():
+        new_bands = Band.objects.bulk_create(
+            Band(name=f"{label} Band {i}", networth=rng.randint(10_000, 500_000), emoji="🔥")
+            for i in range(bands)
+        )
+        new_players = []
+        for band in new_bands:
+            for i in range(players_per_band):
+                player = Player(
+                    name=f"{label} {band.name} Player {i}",
+                    gender=GENDERS[i % 2],
+                    band=band,
+                    networth=rng.randint(0, 50_000),
+                    rating=rng.gauss(1500, 150),
+                )
+                player.matchesplayed = rng.randint(0, 200)
+                player.wins = rng.randint(0, player.matchesplayed)
+                object_pre_save(Player, player)
+                new_players.append(player)
+        new_players = Player.objects.bulk_create(new_players, batch_size=chunk_size)
+        open_accounts(new_players, new_bands)
+
+        new_tournaments = Tournament.objects.bulk_create(
+            Tournament(
+                name=f"{label} Tournament {i}",
+                date=today - datetime.timedelta(days=7 * i),
+                is_main_tournament=i == 0,
+                is_completed=i > 1,
+            )
+            for i in range(tournaments)
+        )
+        new_matches = []
+        for start in range(0, matches, chunk_size):
+            chunk = []
+            for i in range(start, min(start + chunk_size, matches)):
+                player_1, player_2 = rng.sample(new_players, 2)
+                finished_match = rng.random() < finished
+                chunk.append(SingleMatch(
+                    name=f"{label} Match {i}",
+                    date=today - datetime.timedelta(days=i % 60),
+                    tournament=new_tournaments[i % len(new_tournaments)] if new_tournaments else None,
+                    player_1=player_1,
+                    player_2=player_2,
+                    winner=rng.choice([player_1, player_2]) if finished_match else None,
+                    resolved_at=seeded_at if finished_match else None,
+                    price_amount=rng.choice([500, 1000, 2000]),
+                    entry_amount=rng.choice([250, 500]),
+                ))
+            chunk = SingleMatch.objects.bulk_create(chunk)
+            reindex_match_ids(match.pk for match in chunk)
+            if len(new_matches) < keep_matches:
+                new_matches.extend(chunk[:keep_matches - len(new_matches)])
+            if progress:
+                progress(len(chunk))
+        Notification.objects.bulk_create(
+            Notification(match=match, content=f"Notification for {match.name}")
+            for match in new_matches[:100]
+        )
+
+        holders = rng.sample(new_players, min(championships, len(new_players)))
+        new_championships = Championship.objects.bulk_create(
+            Championship(name=f"{label} Championship {i}", player=holder, hike=rng.choice([1000, 5000]))
+            for i, holder in enumerate(holders)
+        )
+        history = []
+        for championship in new_championships:
+            started = now() - datetime.timedelta(days=30 * (reigns + 1))
+            for reign in range(reigns):
+                ended = started + datetime.timedelta(days=30)
+                history.append(ChampionshipHistory(
+                    championship=championship,
+                    player=championship.player if reign == reigns - 1 else rng.choice(new_players),
+                    started_on=started,
+                    ended_on=None if reign == reigns - 1 else ended,
+                ))
+                started = ended
+
+        ChampionshipHistory.objects.bulk_create(history, batch_size=chunk_size)
+
+        Auction.objects.bulk_create(
+            (
+                Auction(player=player, from_band=player.band, to_band=rng.choice(new_bands), price=player.networth)
+                for player in (rng.choice(new_players) for _ in range(auctions))
+            ),
+            batch_size=chunk_size,
+        )
+        Rule.objects.bulk_create(
+            Rule(name=f"{label} Rule {i}", content=f"Rule {i} of the {label} league.")
+            for i in range(rules)
+        )
+
+        rebuild_standings(new_tournaments)
+        reconcile_band_stats(new_bands)
+        bump(Band, Player, Championship, ChampionshipHistory, Auction, Rule)
+
+    return {
+        "bands": new_bands,
+        "players": new_players,
+        "tournaments": new_tournaments,
+        "matches": new_matches,
+        "championships": new_championships,
+    }
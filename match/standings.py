@@ -0,0 +1,135 @@
+from collections import Counter, defaultdict
+from contextlib import contextmanager
+from django.db import transaction
+from django.db.models import Count, Sum, Q, F, Exists, OuterRef
+from academy.models import LedgerEntry
+from .models import SingleMatch, TournamentStanding
+
+STANDING_FIELDS = ["played", "wins", "losses", "networth_delta"]
+
+def standing_changes():
+    """Pending standing changes keyed by (tournament_id, player_id)."""
+    return defaultdict(Counter)
+
+def record_result(changes, match, winner, loser, winner_change, loser_change):
+    if not match.tournament_id:
+        return
+    changes[(match.tournament_id, winner.pk)].update(played=1, wins=1, networth_delta=winner_change)
+    changes[(match.tournament_id, loser.pk)].update(played=1, losses=1, networth_delta=loser_change)
+
+def apply_standing_changes(changes):
+    """Add ``changes`` to the stored standings, creating rows for new entrants."""
+    if not changes:
+        return
+    existing = {
+        (standing.tournament_id, standing.player_id): standing
+        for standing in TournamentStanding.objects.filter(
+            tournament_id__in={tournament_id for tournament_id, _ in changes},
+            player_id__in={player_id for _, player_id in changes},
+        )
+    }
+
+    updated, created = [], []
+    for (tournament_id, player_id), change in changes.items():
+        standing = existing.get((tournament_id, player_id))
+        if standing is None:
+            standing = TournamentStanding(tournament_id=tournament_id, player_id=player_id)
+            created.append(standing)
+        else:
+            updated.append(standing)
+        for field in STANDING_FIELDS:
+            setattr(standing, field, getattr(standing, field) + change[field])
+
+    TournamentStanding.objects.bulk_update(updated, STANDING_FIELDS, batch_size=500)
+    TournamentStanding.objects.bulk_create(created, batch_size=500)
+
+def enter_players(tournament, players):
+    """Give every entrant of ``tournament`` a standings row, so they are listed before their first result."""
+    if tournament is None:
+        return
+    player_ids = {getattr(player, "pk", player) for player in players} - {None}
+    TournamentStanding.objects.bulk_create(
+        [TournamentStanding(tournament_id=getattr(tournament, "pk", tournament), player_id=player_id) for player_id in player_ids],
+        ignore_conflicts=True,
+        batch_size=500,
+    )
+
+def result_changes(matches, sign=1):
+    """
+    What ``matches`` count for in their tournaments' standings, as changes
+    (``sign=-1`` takes them back), with one grouped query over both player
+    slots and one over the ledger. Every entrant gets a row, played or not. Prize and
+    entry money is what the ledger recorded, championship hikes included;
+    matches settled before the ledger count the amounts they list.
+    """
+    matches = matches.filter(tournament__isnull=False)
+    money = LedgerEntry.objects.filter(player__isnull=False, reason__in=["prize", "entry"])
+    unsettled = ~Exists(money.filter(match=OuterRef("pk")))
+
+    slots = []
+    for slot in ("player_1", "player_2"):
+        won = Q(winner=F(slot))
+        slots.append(
+            matches
+            .filter(**{f"{slot}__isnull": False})
+            .values_list("tournament_id", f"{slot}_id")
+            .annotate(
+                played=Count("pk", filter=Q(winner__isnull=False)),
+                wins=Count("pk", filter=won),
+                prize=Sum("price_amount", filter=won & unsettled),
+                entry=Sum("entry_amount", filter=Q(winner__isnull=False) & ~won & unsettled),
+            )
+            .order_by()
+        )
+
+    changes = standing_changes()
+    for tournament_id, player_id, played, wins, prize, entry in slots[0].union(slots[1], all=True):
+        changes[(tournament_id, player_id)].update(
+            played=sign * played,
+            wins=sign * wins,
+            losses=sign * (played - wins),
+            networth_delta=sign * ((prize or 0) * 2/3 - (entry or 0) * 2/3),
+        )
+
+    paid = (
+        money
+        .filter(match__in=matches.filter(winner__isnull=False))
+        .values_list("match__tournament", "player_id")
+        .annotate(total=Sum("amount"))
+        .order_by()
+    )
+    for tournament_id, player_id, total in paid:
+        changes[(tournament_id, player_id)].update(networth_delta=sign * total)
+    return changes
+
+def withdraw_results(matches):
+    """Take ``matches`` out of the standings; call it in the transaction that deletes them, before the delete."""
+    apply_standing_changes(result_changes(matches, sign=-1))
+
+@contextmanager
+def restate_results(matches):
+    """
+    Around an edit of ``matches``: their results are taken out of the
+    standings as they were and counted again as they are after the edit.
+    Use it inside a transaction.
+    """
+    changes = result_changes(matches, sign=-1)
+    yield
+    for key, change in result_changes(matches).items():
+        changes[key].update(change)
+    apply_standing_changes(changes)
+
+def rebuild_standings(tournaments=None):
+    """Recompute standings from the matches, every entrant included (see result_changes)."""
+    matches = SingleMatch.objects.all()
+    if tournaments is not None:
+        matches = matches.filter(tournament__in=tournaments)
+    changes = result_changes(matches)
+
+    standings = TournamentStanding.objects.all()
+    if tournaments is not None:
+        standings = standings.filter(tournament__in=tournaments)
+    with transaction.atomic():
+        standings.delete()
+        apply_standing_changes(changes)
+    return len(changes)
@@ -1,3 +1,724 @@
-from django.test import TestCase
+import asyncio
+import base64
+import contextlib
+import datetime
+import io
+import json
+import logging
+from unittest import mock
+from django.contrib.auth.models import User
+from django.core.management import call_command
+from django.db import connection
+from django.db.models import F, Q
+from django.test import TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from django.utils.timezone import now
+from academy.models import Player, LedgerEntry, Rule, Championship, ChampionshipHistory
+from academy.titles import transfer_titles
+from academy.ledger import materialize_balances
+from academy.band_stats import reconcile_band_stats
+from .models import SingleMatch, Job, Notification, Tournament, TournamentStanding
+from . import forecast, jobs
+from .jobs import claim_next_job, run_job
+from .live import ChangeStream, LiveFeed, event_stream
+from .search import SEARCH_TABLE
+from .seed import seed_dataset
+from .standings import rebuild_standings
+from .counters import reconcile_player_counters
+from .utils import generate_winner, generate_winners, create_round_robin, MatchResolver, MatchConflict
 
-# Create your tests here.
+# Budgets are for pages rendered from scratch, not from the fragment cache
+@override_settings(CACHES={"default": {"BACKEND": "django.core.cache.backends.dummy.DummyCache"}})
+class QueryBudgetTestCase(TestCase):
+    """
+    Seeds a league big enough for N+1 queries to stand out, then checks that
+    pages stay within a fixed number of queries however many rows there are.
+    """
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user("referee", password="referee")
+        cls.data = seed_dataset()
+        cls.band = cls.data["bands"][0]
+        cls.player = cls.data["players"][0]
+        cls.tournament = cls.data["tournaments"][0]
+        cls.match = cls.data["matches"][0]
+        cls.championship = cls.data["championships"][0]
+
+    def setUp(self):
+        self.client.force_login(self.user)
+        sql_logger = logging.getLogger("wrestling.sql")
+        sql_logger.disabled = True
+        self.addCleanup(setattr, sql_logger, "disabled", False)
+
+    def grow(self):
+        """Add another batch of rows, some of them to the objects the tests look at."""
+        data = seed_dataset(bands=2, players_per_band=50, tournaments=2, matches=1000,
+                            championships=2, auctions=20, rules=5, label="Growth", seed=1)
+        SingleMatch.objects.filter(tournament__in=data["tournaments"]).update(tournament=self.tournament)
+        Player.objects.filter(band=data["bands"][0]).update(band=self.band)
+        rebuild_standings([self.tournament])
+        reconcile_band_stats([self.band, data["bands"][0]])
+
+    def count_queries(self, url, method="get", data=None, htmx=False):
+        headers = {"HX-Request": "true"} if htmx else {}
+        # Version bumps run on commit; they are part of the request's cost
+        with CaptureQueriesContext(connection) as queries, self.captureOnCommitCallbacks(execute=True):
+            response = getattr(self.client, method)(url, data, headers=headers)
+        self.assertLess(response.status_code, 400, url)
+        return len(queries)
+
+    def assertQueryBudget(self, budget, url, method="get", data=None, htmx=False):
+        """
+        Requests ``url`` before and after growing the dataset. The query count
+        must stay within ``budget`` and, for reads, must not change with the
+        number of rows.
+        """
+        if method == "get":
+            self.count_queries(url, method, data, htmx)
+            before = self.count_queries(url, method, data, htmx)
+            self.grow()
+            after = self.count_queries(url, method, data, htmx)
+            self.assertEqual(before, after, f"{url} runs more queries as the data grows")
+        else:
+            self.grow()
+            after = self.count_queries(url, method, data, htmx)
+        self.assertLessEqual(after, budget, f"{url} ran {after} queries, over its budget of {budget}")
+
+class TournamentQueryTests(QueryBudgetTestCase):
+    def test_tournament_list(self):
+        self.assertQueryBudget(7, reverse("tournament_list"))
+
+    def test_tournament_detail(self):
+        self.assertQueryBudget(12, reverse("tournament_detail", args=[self.tournament.pk]))
+
+    def test_tournament_create(self):
+        self.assertQueryBudget(5, reverse("tournament_create"))
+
+    def test_tournament_create_league(self):
+        self.assertQueryBudget(7, reverse("tournament_create_league", args=[self.tournament.pk]))
+
+    def test_tournament_match_setup(self):
+        self.assertQueryBudget(9, reverse("tournament_match_setup", args=[self.tournament.pk]))
+
+    def test_tournament_swiss_setup(self):
+        self.assertQueryBudget(9, reverse("tournament_swiss_setup", args=[self.tournament.pk]))
+
+    def test_tournament_elimination_setup(self):
+        self.assertQueryBudget(9, reverse("tournament_elimination_setup", args=[self.tournament.pk]))
+
+    def test_tournament_bracket(self):
+        self.assertQueryBudget(7, reverse("tournament_bracket", args=[self.tournament.pk]))
+
+    def test_tournament_update(self):
+        self.assertQueryBudget(6, reverse("tournament_update", args=[self.tournament.pk]))
+
+    def test_tournament_delete_confirm(self):
+        self.assertQueryBudget(6, reverse("tournament_delete", args=[self.tournament.pk]), htmx=True)
+
+    def test_tournament_delete(self):
+        self.assertQueryBudget(14, reverse("tournament_delete", args=[self.data["tournaments"][-1].pk]), method="post", htmx=True)
+
+    def test_main_event(self):
+        self.assertQueryBudget(11, reverse("main_event"))
+
+    def test_main_event_partial(self):
+        self.assertQueryBudget(11, reverse("main_event"), data={"tournament_id": self.tournament.pk}, htmx=True)
+
+    def test_tournament_forecast(self):
+        self.assertQueryBudget(7, reverse("tournament_forecast", args=[self.tournament.pk]), data={"runs": 100})
+
+    def test_tournament_complete(self):
+        self.assertQueryBudget(7, reverse("tournament_complete", args=[self.tournament.pk]))
+
+    def test_challenge_for_championship(self):
+        self.assertQueryBudget(10, reverse("challenge_for_championship", args=[self.player.pk]))
+
+class SingleMatchQueryTests(QueryBudgetTestCase):
+    def test_singlematch_list(self):
+        self.assertQueryBudget(10, reverse("singlematch_list"))
+
+    def test_singlematch_list_next_page(self):
+        response = self.client.get(reverse("singlematch_list"))
+        cursor = response.context["matches"].next_cursor
+        self.assertQueryBudget(10, reverse("singlematch_list"), data={"after": cursor})
+
+    def test_singlematch_list_tampered_cursor(self):
+        first_page = [match.pk for match in self.client.get(reverse("singlematch_list")).context["matches"]]
+        cursor = base64.urlsafe_b64encode(json.dumps([True, "garbage", 1]).encode()).decode()
+        response = self.client.get(reverse("singlematch_list"), {"after": cursor})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual([match.pk for match in response.context["matches"]], first_page)
+
+    def test_singlematch_search(self):
+        self.assertQueryBudget(12, reverse("singlematch_list"), data={"q": "Seed Band 1"})
+
+    def test_singlematch_detail(self):
+        self.assertQueryBudget(13, reverse("singlematch_detail", args=[self.match.pk]))
+
+    def test_singlematch_create(self):
+        self.assertQueryBudget(8, reverse("singlematch_create"))
+
+    def test_singlematch_update(self):
+        self.assertQueryBudget(9, reverse("singlematch_update", args=[self.match.pk]))
+
+    def test_singlematch_delete_confirm(self):
+        self.assertQueryBudget(8, reverse("singlematch_delete", args=[self.match.pk]), htmx=True)
+
+    def test_singlematch_delete(self):
+        self.assertQueryBudget(16, reverse("singlematch_delete", args=[self.match.pk]), method="post", htmx=True)
+
+    def test_singlematch_run(self):
+        match = SingleMatch.objects.filter(winner__isnull=True).first()
+        self.assertQueryBudget(24, reverse("singlematch_run", args=[match.pk]), method="post")
+
+    def test_complete_all_matches(self):
+        self.assertQueryBudget(6, reverse("complete_all_matches"), method="post")
+
+    def test_create_notification(self):
+        self.assertQueryBudget(6, reverse("create_notification", args=[self.match.pk]))
+
+class JobQueryTests(QueryBudgetTestCase):
+    def setUp(self):
+        super().setUp()
+        self.job = Job.objects.create(kind="complete_all_matches", status="running", total=100, created=40, resolved=10)
+
+    def test_job_detail(self):
+        self.assertQueryBudget(6, reverse("job_detail", args=[self.job.pk]))
+
+    def test_job_progress_partial(self):
+        self.assertQueryBudget(6, reverse("job_detail", args=[self.job.pk]), htmx=True)
+
+    def test_job_cancel(self):
+        self.assertQueryBudget(6, reverse("job_cancel", args=[self.job.pk]), method="post")
+
+    def test_job_resume(self):
+        self.assertQueryBudget(6, reverse("job_resume", args=[self.job.pk]), method="post")
+
+class BracketJobTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user("referee", password="referee")
+        cls.data = seed_dataset(bands=2, players_per_band=4, tournaments=1, matches=0, championships=0, auctions=0, rules=0)
+        cls.tournament = cls.data["tournaments"][0]
+
+    def setUp(self):
+        self.client.force_login(self.user)
+        sql_logger = logging.getLogger("wrestling.sql")
+        sql_logger.disabled = True
+        self.addCleanup(setattr, sql_logger, "disabled", False)
+
+    def start(self, view, **data):
+        response = self.client.post(reverse(view, args=[self.tournament.pk]), {
+            "players": [player.pk for player in self.data["players"]],
+            "match_name": "Bracket",
+            **data,
+        })
+        job = Job.objects.get()
+        self.assertRedirects(response, reverse("job_detail", args=[job.pk]), fetch_redirect_response=False)
+        return job
+
+    def rounds(self):
+        return list(SingleMatch.objects.filter(tournament=self.tournament).values_list("round_number", flat=True).order_by("round_number"))
+
+    def test_elimination_runs_as_a_job(self):
+        job = self.start("tournament_elimination_setup")
+        self.assertEqual(self.rounds(), [])
+        run_job(claim_next_job())
+
+        job.refresh_from_db()
+        self.assertEqual(job.status, "done")
+        self.assertEqual((job.total, job.resolved), (7, 7))
+        self.assertEqual(self.rounds(), [1, 1, 1, 1, 2, 2, 3])
+        self.assertContains(self.client.get(reverse("job_detail", args=[job.pk])), reverse("tournament_bracket", args=[self.tournament.pk]))
+
+    def test_swiss_resumes_after_the_last_committed_round(self):
+        job = self.start("tournament_swiss_setup", rounds=3)
+        record_round = jobs.round_progress
+
+        def cancel_after_first_round(job):
+            on_round = record_round(job)
+
+            def cancelling(state):
+                on_round(state)
+                # Cancelled from another request: the next round rolls back and stops
+                Job.objects.filter(pk=job.pk).update(status="cancelled")
+            return cancelling
+
+        with mock.patch("match.jobs.round_progress", cancel_after_first_round):
+            run_job(claim_next_job())
+        self.assertEqual(self.rounds(), [1] * 4)
+
+        self.client.post(reverse("job_resume", args=[job.pk]))
+        run_job(claim_next_job())
+        job.refresh_from_db()
+        self.assertEqual(job.status, "done")
+        self.assertEqual(job.resolved, 12)
+        self.assertEqual(self.rounds(), [1] * 4 + [2] * 4 + [3] * 4)
+
+class StandingsTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user("referee", password="referee")
+        cls.data = seed_dataset(bands=2, players_per_band=4, tournaments=2, matches=10, finished=0, championships=1, auctions=0, rules=0)
+
+    def setUp(self):
+        self.client.force_login(self.user)
+        sql_logger = logging.getLogger("wrestling.sql")
+        sql_logger.disabled = True
+        self.addCleanup(setattr, sql_logger, "disabled", False)
+
+    def table(self, played_only=False):
+        standings = TournamentStanding.objects.filter(played__gt=0) if played_only else TournamentStanding.objects.all()
+        return {
+            (standing.tournament_id, standing.player_id): (standing.played, standing.wins, standing.losses, round(standing.networth_delta, 6))
+            for standing in standings
+        }
+
+    def form_data(self, match, **changes):
+        return {
+            "name": match.name,
+            "date": match.date,
+            "tournament": match.tournament_id,
+            "player_1": match.player_1_id,
+            "player_2": match.player_2_id,
+            "price_amount": match.price_amount,
+            "entry_amount": match.entry_amount,
+            **changes,
+        }
+
+    def test_deleting_a_result_takes_it_back(self):
+        match = self.data["matches"][0]
+        before = self.table()
+        generate_winner(match)
+        self.assertNotEqual(self.table(), before)
+
+        self.client.post(reverse("singlematch_delete", args=[match.pk]), headers={"HX-Request": "true"})
+        self.assertEqual(self.table(), before)
+
+    def test_editing_a_result_moves_it(self):
+        match = self.data["matches"][0]
+        generate_winner(match)
+        other = next(tournament for tournament in self.data["tournaments"] if tournament.pk != match.tournament_id)
+        self.client.post(reverse("singlematch_update", args=[match.pk]), self.form_data(match, tournament=other.pk))
+
+        self.assertEqual(SingleMatch.objects.get(pk=match.pk).tournament_id, other.pk)
+        updated = self.table(played_only=True)
+        rebuild_standings()
+        self.assertEqual(updated, self.table(played_only=True))
+
+    def test_every_entrant_is_listed(self):
+        tournament = Tournament.objects.create(name="Open Night", date=datetime.date.today())
+        player_1, player_2 = self.data["players"][:2]
+        match = SingleMatch(name="Opener", date=datetime.date.today(), tournament=tournament, player_1=player_1, player_2=player_2)
+        self.client.post(reverse("singlematch_create"), self.form_data(match))
+
+        response = self.client.get(reverse("tournament_detail", args=[tournament.pk]))
+        self.assertEqual({standing.player_id for standing in response.context["standings"]}, {player_1.pk, player_2.pk})
+        self.assertEqual({standing.played for standing in response.context["standings"]}, {0})
+
+class SearchIndexTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user("librarian", password="librarian")
+        cls.data = seed_dataset(bands=2, players_per_band=10, tournaments=2, matches=60, championships=0, auctions=0, rules=0)
+
+    def setUp(self):
+        self.client.force_login(self.user)
+        sql_logger = logging.getLogger("wrestling.sql")
+        sql_logger.disabled = True
+        self.addCleanup(setattr, sql_logger, "disabled", False)
+
+    def index_rows(self):
+        with connection.cursor() as cursor:
+            cursor.execute(f"SELECT rowid FROM {SEARCH_TABLE}")
+            return {row[0] for row in cursor.fetchall()}
+
+    def test_deleted_tournament_is_not_found(self):
+        tournament = self.data["tournaments"][0]
+        tournament.name = "Zanzibar Cup"
+        tournament.save()
+        self.assertTrue(SingleMatch.objects.search("Zanzibar").exists())
+
+        self.client.post(reverse("tournament_delete", args=[tournament.pk]), headers={"HX-Request": "true"})
+        self.assertFalse(SingleMatch.objects.search("Zanzibar").exists())
+        self.assertEqual(self.index_rows(), set(SingleMatch.objects.values_list("pk", flat=True)))
+
+    def test_deleted_band_is_not_found(self):
+        band = self.data["bands"][0]
+        band.name = "Quokka Band"
+        band.save()
+        self.assertTrue(SingleMatch.objects.search("Quokka").exists())
+
+        self.client.post(reverse("band-delete", args=[band.pk]), headers={"HX-Request": "true"})
+        self.assertFalse(SingleMatch.objects.search("Quokka").exists())
+
+    def test_deleted_player_is_unindexed_at_once(self):
+        player = self.data["players"][0]
+        matches = set(SingleMatch.objects.filter(Q(player_1=player) | Q(player_2=player)).values_list("pk", flat=True))
+        self.assertGreater(len(matches), 1)
+
+        with CaptureQueriesContext(connection) as queries:
+            self.client.post(reverse("player-permanently-delete", args=[player.pk]))
+        index_deletes = [query for query in queries if query["sql"].startswith(f"DELETE FROM {SEARCH_TABLE}")]
+        self.assertEqual(len(index_deletes), 1)
+        self.assertFalse(self.index_rows() & matches)
+
+class PlayerCounterTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.data = seed_dataset(bands=2, players_per_band=10, tournaments=2, matches=200, championships=1, auctions=0, rules=0)
+
+    def test_reconcile_matches_history(self):
+        # The seeded counters are random, so nearly every player has drifted
+        self.assertTrue(reconcile_player_counters(fix=False))
+        reconcile_player_counters()
+        self.assertEqual(reconcile_player_counters(fix=False), [])
+        self.assertEqual(reconcile_band_stats(fix=False), [])
+
+        player = Player.objects.get(pk=self.data["players"][0].pk)
+        played = SingleMatch.objects.filter(Q(player_1=player) | Q(player_2=player), winner__isnull=False).count()
+        self.assertEqual(player.matchesplayed, played)
+        self.assertEqual(player.wins, SingleMatch.objects.filter(winner=player).count())
+
+    def test_reconcile_tournament_scope(self):
+        tournament = self.data["tournaments"][0]
+        drift = reconcile_player_counters([tournament], fix=False)
+        entrants = set(
+            SingleMatch.objects.filter(tournament=tournament).values_list("player_1", flat=True)
+        ) | set(SingleMatch.objects.filter(tournament=tournament).values_list("player_2", flat=True))
+        self.assertTrue(drift)
+        self.assertLessEqual({player.pk for player, *_ in drift}, entrants)
+
+    def test_reconcile_dry_run_is_two_reads(self):
+        # One grouped aggregate and one pass over the players, in a savepoint
+        with self.assertNumQueries(4):
+            reconcile_player_counters(fix=False)
+
+class ForecastTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user("referee", password="referee")
+        cls.data = seed_dataset(bands=2, players_per_band=10, tournaments=1, matches=40, finished=0, championships=0, auctions=0, rules=0)
+
+    def setUp(self):
+        self.client.force_login(self.user)
+        sql_logger = logging.getLogger("wrestling.sql")
+        sql_logger.disabled = True
+        self.addCleanup(setattr, sql_logger, "disabled", False)
+
+    def test_chunks_fit_the_cell_budget(self):
+        players = self.data["players"]
+        pairs = len(players) * (len(players) - 1) // 2
+        with mock.patch("match.forecast.CHUNK_CELLS", 1000), \
+                mock.patch("match.forecast.simulate_champions", wraps=forecast.simulate_champions) as simulate:
+            result = forecast.forecast_tournament(players, runs=50, seed=1)
+        self.assertTrue(all(call.args[4] * pairs <= 1000 for call in simulate.call_args_list))
+        self.assertEqual(sum(call.args[4] for call in simulate.call_args_list), 50)
+        self.assertAlmostEqual(sum(probability for _, probability in result), 1.0)
+
+    def test_large_field_is_refused(self):
+        url = reverse("tournament_forecast", args=[self.data["tournaments"][0].pk])
+        players = [player.pk for player in self.data["players"][:6]]
+        with mock.patch("match.views.MAX_FORECAST_PLAYERS", 5):
+            response = self.client.get(url, {"players": players, "runs": 1000})
+        self.assertEqual(response.context["forecast"], [])
+        self.assertContains(response, "at most 5 players")
+
+        response = self.client.get(url, {"players": players[:5], "runs": 1000})
+        self.assertEqual(len(response.context["forecast"]), 5)
+
+class MatchExecutionTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user("referee", password="referee")
+        cls.data = seed_dataset(bands=2, players_per_band=10, tournaments=1, matches=20, finished=0, championships=1, auctions=0, rules=0)
+
+    def setUp(self):
+        self.client.force_login(self.user)
+        sql_logger = logging.getLogger("wrestling.sql")
+        sql_logger.disabled = True
+        self.addCleanup(setattr, sql_logger, "disabled", False)
+
+    def prizes(self, match):
+        return LedgerEntry.objects.filter(match=match, reason="prize").count()
+
+    def test_stale_instances_pay_out_once(self):
+        match = self.data["matches"][0]
+        first, second = SingleMatch.objects.get(pk=match.pk), SingleMatch.objects.get(pk=match.pk)
+        generate_winner(first)
+        generate_winner(second)
+
+        self.assertEqual(self.prizes(match), 1)
+        self.assertEqual(second.winner_id, first.winner_id)
+        self.assertEqual(materialize_balances(fix=False), [])
+
+    def test_resolver_conflict_writes_nothing(self):
+        matches = list(SingleMatch.objects.filter(pk__in=[match.pk for match in self.data["matches"][:5]]))
+        resolver = MatchResolver()
+        for match in matches:
+            resolver.resolve(match)
+        # Another worker resolves one of them before this batch is saved
+        generate_winner(SingleMatch.objects.get(pk=matches[2].pk))
+
+        with self.assertRaises(MatchConflict):
+            resolver.save()
+        self.assertEqual(LedgerEntry.objects.filter(match__in=matches).values("match").distinct().count(), 1)
+
+    def test_generate_winners_skips_resolved_matches(self):
+        matches = SingleMatch.objects.filter(pk__in=[match.pk for match in self.data["matches"]])
+        generate_winner(matches.first())
+        resolved = generate_winners(matches)
+
+        self.assertEqual(len(resolved), len(self.data["matches"]) - 1)
+        self.assertFalse(matches.filter(winner__isnull=True).exists())
+        for match in matches:
+            self.assertEqual(self.prizes(match), 1)
+
+    def test_run_is_post_only(self):
+        match = self.data["matches"][0]
+        self.client.get(reverse("singlematch_run", args=[match.pk]))
+        self.assertIsNone(SingleMatch.objects.get(pk=match.pk).winner_id)
+        self.client.post(reverse("singlematch_run", args=[match.pk]))
+        self.client.post(reverse("singlematch_run", args=[match.pk]))
+        self.assertIsNotNone(SingleMatch.objects.get(pk=match.pk).winner_id)
+        self.assertEqual(self.prizes(match), 1)
+
+    def test_edits_keep_the_resolution_order(self):
+        first = self.data["matches"][0]
+        # A rematch, so the order of the two results moves the ratings
+        second = SingleMatch.objects.create(name="Rematch", date=first.date, player_1=first.player_1, player_2=first.player_2)
+        generate_winner(first)
+        generate_winner(second)
+        call_command("rebuild_ratings", stdout=io.StringIO())
+        ratings = dict(Player.all_objects.values_list("pk", "rating"))
+
+        first = SingleMatch.objects.get(pk=first.pk)
+        resolved_at = first.resolved_at
+        first.name = "Renamed"
+        first.save()
+        self.assertGreater(first.updated_at, resolved_at)
+        self.assertEqual(SingleMatch.objects.get(pk=first.pk).resolved_at, resolved_at)
+        call_command("rebuild_ratings", stdout=io.StringIO())
+        self.assertEqual(dict(Player.all_objects.values_list("pk", "rating")), ratings)
+
+    def test_chunks_keep_concurrent_results(self):
+        players = list(Player.objects.select_related("band").order_by("pk")[:6])
+        watched = players[0]
+        matchesplayed, wins = watched.matchesplayed, watched.wins
+
+        def on_save(created, resolved):
+            # Another request records a result for the same player between chunks
+            Player.all_objects.filter(pk=watched.pk).update(wins=F("wins") + 1, matchesplayed=F("matchesplayed") + 1)
+
+        # 15 pairings, saved in four chunks
+        create_round_robin(players, "Chunk Match ", self.data["tournaments"][0], 500, 250, datetime.date.today(), chunk_size=4, on_save=on_save)
+        played = SingleMatch.objects.filter(Q(player_1=watched) | Q(player_2=watched), name__startswith="Chunk Match ")
+        player = Player.all_objects.get(pk=watched.pk)
+        self.assertEqual(player.matchesplayed, matchesplayed + played.count() + 4)
+        self.assertEqual(player.wins, wins + played.filter(winner=watched).count() + 4)
+
+class ConditionalGetTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user("referee", password="referee")
+        cls.data = seed_dataset(bands=2, players_per_band=10, tournaments=1, matches=20, finished=0, championships=1, auctions=0, rules=2)
+        cls.tournament = cls.data["tournaments"][0]
+
+    def setUp(self):
+        self.client.force_login(self.user)
+        sql_logger = logging.getLogger("wrestling.sql")
+        sql_logger.disabled = True
+        self.addCleanup(setattr, sql_logger, "disabled", False)
+
+    def revalidate(self, url, etag, data=None, headers=None):
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(url, data, headers={"If-None-Match": etag, **(headers or {})})
+        return response, len(queries)
+
+    def test_unchanged_pages_are_not_modified(self):
+        pages = [
+            (reverse("tournament_list"), None, None),
+            (reverse("tournament_detail", args=[self.tournament.pk]), None, None),
+            (reverse("singlematch_detail", args=[self.data["matches"][0].pk]), None, None),
+            (reverse("main_event"), None, None),
+            (reverse("main_event"), {"tournament_id": self.tournament.pk}, {"HX-Request": "true"}),
+            (reverse("band-list"), None, None),
+            (reverse("player-list"), {"gender": "Male"}, None),
+            (reverse("rule-list"), None, None),
+        ]
+        for url, data, headers in pages:
+            # The first visit sets the CSRF cookie, which the ETag covers
+            self.client.get(url, data, headers=headers)
+            with CaptureQueriesContext(connection) as queries:
+                response = self.client.get(url, data, headers=headers)
+            self.assertEqual(response.status_code, 200, url)
+            self.assertIn("no-cache", response.headers["Cache-Control"])
+            response, count = self.revalidate(url, response.headers["ETag"], data, headers)
+            self.assertEqual(response.status_code, 304, url)
+            self.assertEqual(response.content, b"")
+            # A list served from the fragment cache already runs no more than the validators
+            self.assertLessEqual(count, len(queries), url)
+
+    def test_changes_are_sent_again(self):
+        url = reverse("tournament_detail", args=[self.tournament.pk])
+        self.client.get(url)
+        etag = self.client.get(url).headers["ETag"]
+        with self.captureOnCommitCallbacks(execute=True):
+            self.client.post(reverse("singlematch_run", args=[self.data["matches"][0].pk]))
+        response, _ = self.revalidate(url, etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertNotEqual(response.headers["ETag"], etag)
+
+        url = reverse("rule-list")
+        etag = self.client.get(url).headers["ETag"]
+        with self.captureOnCommitCallbacks(execute=True):
+            Rule.objects.create(name="Cage Match", content="No way out.")
+        self.assertContains(self.revalidate(url, etag)[0], "Cage Match")
+
+    def test_reign_durations_are_sent_again(self):
+        url = reverse("championship-history")
+        self.client.get(url)
+        etag = self.client.get(url).headers["ETag"]
+        self.assertEqual(self.revalidate(url, etag)[0].status_code, 304)
+        with mock.patch("academy.conditional.now", return_value=now() + datetime.timedelta(days=1)):
+            self.assertEqual(self.revalidate(url, etag)[0].status_code, 200)
+
+        # Holding times are shown by the minute, so the list is always rendered
+        self.assertNotIn("ETag", self.client.get(reverse("championship-list")).headers)
+
+    def test_etag_is_per_session(self):
+        url = reverse("tournament_list")
+        etag = self.client.get(url).headers["ETag"]
+        self.client.force_login(User.objects.create_user("announcer"))
+        self.assertEqual(self.revalidate(url, etag)[0].status_code, 200)
+
+class LiveFeedTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user("referee", password="referee")
+        cls.data = seed_dataset(bands=2, players_per_band=10, tournaments=1, matches=20, finished=0, championships=1, auctions=0, rules=0)
+
+    def setUp(self):
+        sql_logger = logging.getLogger("wrestling.sql")
+        sql_logger.disabled = True
+        self.addCleanup(setattr, sql_logger, "disabled", False)
+
+    def test_stream_sends_each_change_once(self):
+        stream = ChangeStream()
+        stream.start()
+        match = self.data["matches"][0]
+        generate_winner(match)
+        Notification.objects.create(match=match, content="What a finish!")
+        championship = self.data["championships"][0]
+        challenger = Player.objects.exclude(championship__isnull=False).first()
+        transfer_titles([(championship, challenger, now())])
+
+        with self.assertNumQueries(3):
+            events = stream.poll()
+        self.assertEqual([event["type"] for event in events], ["result", "title", "notification"])
+        self.assertEqual(events[0]["winner"], SingleMatch.objects.get(pk=match.pk).winner.name)
+        self.assertEqual(events[1]["player"], challenger.name)
+        self.assertEqual(stream.poll(), [])
+
+    def test_edited_result_is_not_sent_again(self):
+        stream = ChangeStream()
+        stream.start()
+        match = self.data["matches"][0]
+        generate_winner(match)
+        self.assertEqual([event["match"] for event in stream.poll()], [match.pk])
+
+        match = SingleMatch.objects.get(pk=match.pk)
+        match.name = "Renamed Main Event"
+        match.save()
+        self.assertEqual(stream.poll(), [])
+
+    async def test_one_poller_serves_every_client(self):
+        class Stream:
+            polls = 0
+
+            def start(self):
+                pass
+
+            def poll(self):
+                self.polls += 1
+                return [{"type": "result", "tournament": 1, "poll": self.polls}]
+
+        live_feed = LiveFeed(Stream(), interval=0.01)
+        async with contextlib.AsyncExitStack() as stack:
+            queues = [await stack.enter_async_context(live_feed.subscribe()) for _ in range(200)]
+            received = [await queue.get() for queue in queues]
+        self.assertEqual({event["poll"] for event in received}, {1})
+        await live_feed.task
+        self.assertLessEqual(live_feed.stream.polls, 2)
+
+    async def test_endpoint_streams_events(self):
+        await self.async_client.aforce_login(self.user)
+        response = await self.async_client.get(reverse("live_feed"), {"tournament": self.data["tournaments"][0].pk})
+        self.assertEqual(response["Content-Type"], "text/event-stream")
+        stream = response.streaming_content
+        self.assertTrue((await anext(stream)).startswith(b"retry:"))
+        await stream.aclose()
+        # The stream is not instrumented; the sync views still are, under ASGI
+        self.assertNotIn("Server-Timing", response.headers)
+        response = await self.async_client.get(reverse("tournament_list"))
+        self.assertIn("queries", response.headers["Server-Timing"])
+
+    async def test_stream_filters_by_tournament(self):
+        live_feed = LiveFeed(interval=3600)
+        events = event_stream(tournament_id=1, live_feed=live_feed, keepalive=3600)
+        await anext(events)
+        pending = asyncio.ensure_future(anext(events))
+        await asyncio.sleep(0)
+        live_feed.publish([
+            {"type": "result", "tournament": 2},
+            {"type": "title", "tournament": None},
+        ])
+        self.assertTrue((await pending).startswith("event: title\n"))
+        await events.aclose()
+        live_feed.task.cancel()
+
+class AdminTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_superuser("admin", password="admin")
+        cls.data = seed_dataset(bands=2, players_per_band=10, tournaments=1, matches=20, championships=1, auctions=0, rules=0)
+
+    def setUp(self):
+        self.client.force_login(self.user)
+        sql_logger = logging.getLogger("wrestling.sql")
+        sql_logger.disabled = True
+        self.addCleanup(setattr, sql_logger, "disabled", False)
+
+    def test_changing_the_holder_opens_a_reign(self):
+        championship = Championship.objects.get(pk=self.data["championships"][0].pk)
+        challenger = Player.objects.filter(championship__isnull=True).first()
+        response = self.client.post(
+            reverse("admin:academy_championship_change", args=[championship.pk]),
+            {"name": championship.name, "player": challenger.pk, "image_url": "", "hike": championship.hike},
+        )
+        self.assertEqual(response.status_code, 302)
+
+        reigns = ChampionshipHistory.objects.filter(championship=championship)
+        self.assertEqual(list(reigns.filter(ended_on__isnull=True).values_list("player", flat=True)), [challenger.pk])
+        self.assertEqual(reigns.filter(ended_on__isnull=True).count(), 1)
+
+    def test_deleting_matches_takes_their_results_back(self):
+        first, second, third = (SingleMatch.objects.get(pk=match.pk) for match in self.data["matches"][:3])
+        for match in (first, second, third):
+            generate_winner(match)
+
+        self.client.post(reverse("admin:match_singlematch_delete", args=[first.pk]), {"post": "yes"})
+        self.client.post(
+            reverse("admin:match_singlematch_changelist"),
+            {"action": "delete_selected", "_selected_action": [second.pk, third.pk], "post": "yes"},
+        )
+        self.assertFalse(SingleMatch.objects.filter(pk__in=[first.pk, second.pk, third.pk]).exists())
+
+        standings = set(TournamentStanding.objects.filter(played__gt=0).values_list("tournament", "player", "played", "wins", "losses"))
+        rebuild_standings()
+        self.assertEqual(standings, set(TournamentStanding.objects.filter(played__gt=0).values_list("tournament", "player", "played", "wins", "losses")))
+        with connection.cursor() as cursor:
+            cursor.execute(f"SELECT rowid FROM {SEARCH_TABLE} WHERE rowid IN (%s, %s, %s)", [first.pk, second.pk, third.pk])
+            self.assertEqual(cursor.fetchall(), [])
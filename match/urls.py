@@ -8,9 +8,13 @@ urlpatterns = [
     path('tournament/create/', views.tournament_create, name='tournament_create'),
     path('tournament/create/league/<int:pk>', views.tournament_create_league, name='tournament_create_league'),
     path('tournament/create/match/<int:pk>', views.tournament_match_setup, name='tournament_match_setup'),
+    path('tournament/create/swiss/<int:pk>', views.tournament_swiss_setup, name='tournament_swiss_setup'),
+    path('tournament/create/elimination/<int:pk>', views.tournament_elimination_setup, name='tournament_elimination_setup'),
+    path('tournament/<int:pk>/bracket/', views.tournament_bracket, name='tournament_bracket'),
     path('tournament/<int:pk>/update/', views.tournament_update, name='tournament_update'),
     path('tournament/<int:pk>/delete/', views.tournament_delete, name='tournament_delete'),
     path('tournament/main_event', views.upcoming_main_tournament, name='main_event'),
+    path('tournament/<int:pk>/forecast/', views.tournament_forecast, name='tournament_forecast'),
     path('tournament/<int:pk>/complete', views.tournament_complete, name='tournament_complete'),
     path("tournament/challenge/<int:player_id>/", views.challenge_for_championship, name="challenge_for_championship"),
 
@@ -22,5 +26,10 @@ urlpatterns = [
     path('single/<int:pk>/delete/', views.singlematch_delete, name='singlematch_delete'),
     path('single/<int:pk>/run/', views.singlematch_execute, name='singlematch_run'),
     path('single/<int:pk>/create_notification/', views.create_notification, name='create_notification'),
+
+    path('job/<int:pk>/', views.job_detail, name='job_detail'),
+    path('job/<int:pk>/cancel/', views.job_cancel, name='job_cancel'),
+    path('job/<int:pk>/resume/', views.job_resume, name='job_resume'),
+    path('live/', views.live_feed, name='live_feed'),
     
 ]
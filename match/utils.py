@@ -1,74 +1,409 @@
+import base64
+import json
 import random
-from academy.models import Championship
+import time
+from math import comb
+from itertools import combinations, islice
+from collections import Counter
+from academy.models import Player, Championship, object_pre_save
+from academy.band_stats import band_stat_changes, record_player_change, apply_band_stat_changes
+from academy.ledger import post, apply_ledger
+from academy.titles import take_title, transfer_titles
+from academy.versions import bump
+from .models import SingleMatch, Tournament, TournamentStanding
+from .standings import standing_changes, record_result, apply_standing_changes, enter_players
+from .search import reindex_match_ids
+from .ratings import expected_score, update_ratings
+from django.core.exceptions import ValidationError
 from django.core.paginator import Paginator, PageNotAnInteger, EmptyPage
+from django.db.models import Q, Case, When, Value, DateTimeField
+from django.db import transaction, OperationalError
+from django.utils.timezone import now
 
-def generate_winner(match):
-    print(match)
-    
-    if not match.winner:
-        player_1 = match.player_1
-        player_2 = match.player_2
-
-        # Get winning percentages (default 50 if missing)
-        p1_win_percent = getattr(player_1, "winning_percentage", 50)
-        p2_win_percent = getattr(player_2, "winning_percentage", 50)
-
-        total = p1_win_percent + p2_win_percent
-        if total == 0:
-            p1_skill_prob = p2_skill_prob = 0.5
-        else:
-            p1_skill_prob = p1_win_percent / total
-            p2_skill_prob = p2_win_percent / total
-
-        # Random factor
-        rand_val = random.random()
-        p1_rand_prob = rand_val
-        p2_rand_prob = 1 - rand_val
-
-        # Final probability
-        p1_final_prob = (p1_skill_prob * 0.2) + (p1_rand_prob * 0.8)
-        p2_final_prob = (p2_skill_prob * 0.2) + (p2_rand_prob * 0.8)
-
-        total_prob = p1_final_prob + p2_final_prob
-        p1_final_prob /= total_prob
-        p2_final_prob /= total_prob
-
-        # Pick winner
-        winner = player_1 if random.random() < p1_final_prob else player_2
-        loser = player_2 if winner == player_1 else player_1
-
-        # Save to match
-        match.winner = winner
-        match.save()
+SKILL_WEIGHT = 0.2
+RANDOM_WEIGHT = 0.8
+# Money goes through the ledger; these are the player fields a result writes directly
+PLAYER_RESULT_FIELDS = ["wins", "matchesplayed", "winningpercentage", "rating"]
+RESOLVE_ATTEMPTS = 3
 
-        
-        price_amount = (match.price_amount * 2/3)
+class MatchConflict(Exception):
+    """Another request or worker resolved a match first."""
+    pass
+
+def retry_on_conflict(func, attempts=RESOLVE_ATTEMPTS, backoff=0.05):
+    """
+    Run ``func`` in a transaction and start it over when it loses a race: a
+    MatchConflict, or a lock timeout or deadlock reported by the database.
+    """
+    for attempt in range(attempts):
         try:
-            championship_obj = Championship.objects.get(player=winner)
-            price_amount += price_amount * championship_obj.hike
-        except Championship.DoesNotExist:
-            pass
-
-        winner.networth = winner.networth + price_amount
-        winner.matchesplayed += 1
-        winner.wins += 1
-        winner.save()
-
-        winner_band = winner.band
-        winner_band.networth = winner_band.networth + (match.price_amount * 1/3)
-        winner_band.save()
-
-        loser.networth = loser.networth - (match.entry_amount * 2/3)
-        loser.matchesplayed += 1
-        loser.save()
-
-        loser_band = loser.band
-        loser_band.networth = loser_band.networth - (match.entry_amount * 1/3)
-        loser_band.save()
+            with transaction.atomic():
+                return func()
+        except (MatchConflict, OperationalError):
+            if attempt == attempts - 1:
+                raise
+            time.sleep(backoff * 2 ** attempt)
+
+def skill_probability(player_1, player_2):
+    p1_skill_prob = expected_score(player_1.rating, player_2.rating)
+    return p1_skill_prob, 1 - p1_skill_prob
+
+def pick_winner(player_1, player_2):
+    p1_skill_prob, p2_skill_prob = skill_probability(player_1, player_2)
+
+    # Random factor
+    rand_val = random.random()
+    p1_rand_prob = rand_val
+    p2_rand_prob = 1 - rand_val
+
+    # Final probability
+    p1_final_prob = (p1_skill_prob * SKILL_WEIGHT) + (p1_rand_prob * RANDOM_WEIGHT)
+    p2_final_prob = (p2_skill_prob * SKILL_WEIGHT) + (p2_rand_prob * RANDOM_WEIGHT)
+
+    total_prob = p1_final_prob + p2_final_prob
+    p1_final_prob /= total_prob
+    p2_final_prob /= total_prob
+
+    # Pick winner
+    winner = player_1 if random.random() < p1_final_prob else player_2
+    loser = player_2 if winner == player_1 else player_1
+    return winner, loser
+
+def settle_match(match, winner, loser, hike=None, entries=None):
+    """
+    Apply the prize and entry money of a resolved match to players and bands
+    in memory, and queue the matching ledger entries in ``entries``.
+    """
+    if loser.band_id == winner.band_id:
+        loser.band = winner.band
+
+    price_amount = (match.price_amount * 2/3)
+    if hike is not None:
+        price_amount += price_amount * hike
+
+    winner.networth = winner.networth + price_amount
+    winner.matchesplayed += 1
+    winner.wins += 1
+
+    winner_band = winner.band
+    winner_band.networth = winner_band.networth + (match.price_amount * 1/3)
+
+    loser.networth = loser.networth - (match.entry_amount * 2/3)
+    loser.matchesplayed += 1
+
+    loser_band = loser.band
+    loser_band.networth = loser_band.networth - (match.entry_amount * 1/3)
+
+    if entries is not None:
+        post(entries, price_amount, "prize", player=winner, match=match)
+        post(entries, match.price_amount * 1/3, "band_share", band=winner_band, match=match)
+        post(entries, -(match.entry_amount * 2/3), "entry", player=loser, match=match)
+        post(entries, -(match.entry_amount * 1/3), "band_share", band=loser_band, match=match)
+
+    update_ratings(winner, loser)
+    return price_amount, -(match.entry_amount * 2/3)
+
+def generate_winner(match):
+    if not match.winner_id and match.player_1_id and match.player_2_id:
+        retry_on_conflict(lambda: resolve_match(match))
     return
 
+def resolve_match(match):
+    """
+    Pick and pay out the winner of ``match`` unless someone already has: the
+    winner is only written WHERE winner IS NULL, so of several requests or
+    workers racing for the same match exactly one pays out. Call it in a
+    transaction. Returns whether this call resolved the match.
+    """
+    # Lock and reload both players so their totals are current
+    players = {
+        player.pk: player
+        for player in Player.all_objects.select_for_update(of=("self",)).select_related("band")
+        .filter(pk__in=[match.player_1_id, match.player_2_id]).order_by("pk")
+    }
+    winner, loser = pick_winner(players[match.player_1_id], players[match.player_2_id])
+
+    match.updated_at = match.resolved_at = now()
+    claimed = SingleMatch.objects.filter(pk=match.pk, winner__isnull=True).update(winner=winner, updated_at=match.updated_at, resolved_at=match.resolved_at)
+    if not claimed:
+        match.refresh_from_db(fields=["winner", "updated_at", "resolved_at"])
+        return False
+    match.winner = winner
+    reindex_match_ids([match.pk])
+
+    titles = {championship.player_id: championship for championship in Championship.objects.filter(player__in=[winner, loser])}
+    if match.is_championship_match:
+        championship = take_title(titles, winner, loser)
+        if championship:
+            transfer_titles([(championship, winner, match.updated_at)])
+    hike = titles[winner.pk].hike if winner.pk in titles else None
+
+    entries = []
+    winner_change, loser_change = settle_match(match, winner, loser, hike, entries)
+    apply_ledger(entries)
+    # Both players in one UPDATE, as MatchResolver.save writes them
+    for player in (winner, loser):
+        object_pre_save(Player, player)
+    Player.all_objects.bulk_update([winner, loser], PLAYER_RESULT_FIELDS)
+    bump(Player)
+    band_stats = band_stat_changes()
+    record_player_change(band_stats, winner)
+    record_player_change(band_stats, loser)
+    apply_band_stat_changes(band_stats)
+
+    changes = standing_changes()
+    record_result(changes, match, winner, loser, winner_change, loser_change)
+    apply_standing_changes(changes)
+    return True
+
+class MatchResolver:
+    """
+    Resolves many matches in memory and writes the results back in bulk.
+
+    Every player and band is loaded once and shared between matches, so the
+    winners are drawn in the same order and the money moves exactly as if
+    generate_winner had been called on each match in turn. save() writes the
+    players' totals as they are in memory: resolve and save in one
+    transaction that starts with refresh(), so nothing another request or
+    worker wrote in between is overwritten.
+    """
+    batch_size = 500
+
+    def __init__(self, on_save=None):
+        self.on_save = on_save
+        self.players = {}
+        self.bands = {}
+        self.changed_players = {}
+        self.ledger = []
+        self.standings = standing_changes()
+        self.matches = []
+        self.title_changes = []
+        self.load_titles()
+
+    def load_titles(self):
+        self.titles = {
+            championship.player_id: championship
+            for championship in Championship.objects.filter(player__isnull=False)
+        }
+
+    def refresh(self):
+        """
+        Reload and lock every player held here, in place, and the title
+        holders. Call it in a transaction, before resolving: what save()
+        writes is then built on the stored totals, not on the ones loaded
+        when the players were added.
+        """
+        current = (
+            Player.all_objects.select_for_update(of=("self",)).select_related("band")
+            .filter(pk__in=list(self.players)).order_by("pk")
+        )
+        for fresh in current:
+            player = self.players[fresh.pk]
+            for field in Player._meta.concrete_fields:
+                setattr(player, field.attname, getattr(fresh, field.attname))
+            player.band = self.bands.setdefault(fresh.band_id, fresh.band)
+            player._band_stat_source = fresh._band_stat_source
+        self.load_titles()
+
+    def add_player(self, player):
+        if player is None:
+            return None
+        player = self.players.setdefault(player.pk, player)
+        player.band = self.bands.setdefault(player.band_id, player.band)
+        return player
+
+    def resolve(self, match):
+        match.player_1 = self.add_player(match.player_1)
+        match.player_2 = self.add_player(match.player_2)
+        if match.winner_id or not match.player_1 or not match.player_2:
+            return None
+
+        winner, loser = pick_winner(match.player_1, match.player_2)
+        match.winner = winner
+        match.updated_at = match.resolved_at = now()
+        if match.is_championship_match:
+            championship = take_title(self.titles, winner, loser)
+            if championship:
+                self.title_changes.append((championship, winner, match.updated_at))
+
+        championship = self.titles.get(winner.pk)
+        winner_change, loser_change = settle_match(match, winner, loser, championship.hike if championship else None, self.ledger)
+        record_result(self.standings, match, winner, loser, winner_change, loser_change)
+        for player in (winner, loser):
+            self.changed_players[player.pk] = player
+        self.matches.append(match)
+        return winner
+
+    def claim(self, matches):
+        # Existing matches only take a winner WHERE winner IS NULL; if another
+        # worker got to one first, nothing of this batch may be written.
+        for start in range(0, len(matches), self.batch_size):
+            batch = matches[start:start + self.batch_size]
+            claimed = SingleMatch.objects.filter(pk__in=[match.pk for match in batch], winner__isnull=True).update(
+                winner=Case(*[When(pk=match.pk, then=Value(match.winner_id)) for match in batch], output_field=SingleMatch._meta.get_field("winner")),
+                updated_at=Case(*[When(pk=match.pk, then=Value(match.updated_at)) for match in batch], output_field=DateTimeField()),
+                resolved_at=Case(*[When(pk=match.pk, then=Value(match.resolved_at)) for match in batch], output_field=DateTimeField()),
+            )
+            if claimed != len(batch):
+                raise MatchConflict(f"{len(batch) - claimed} of {len(batch)} matches were already resolved")
+
+    def save(self):
+        """Write everything resolved since the last save. New matches are created, existing ones updated."""
+        new_matches = [match for match in self.matches if match.pk is None]
+        old_matches = [match for match in self.matches if match.pk is not None]
+        with transaction.atomic():
+            self.claim(old_matches)
+            SingleMatch.objects.bulk_create(new_matches, batch_size=self.batch_size)
+            for player in self.changed_players.values():
+                object_pre_save(Player, player)
+            Player.all_objects.bulk_update(self.changed_players.values(), PLAYER_RESULT_FIELDS, batch_size=self.batch_size)
+            bump(Player)
+            apply_ledger(self.ledger)
+            band_stats = band_stat_changes()
+            for player in self.changed_players.values():
+                record_player_change(band_stats, player)
+            apply_band_stat_changes(band_stats)
+            apply_standing_changes(self.standings)
+            reindex_match_ids(match.pk for match in self.matches)
+            transfer_titles(self.title_changes)
+            if self.on_save:
+                self.on_save(created=len(new_matches), resolved=len(self.matches))
+
+        saved = self.matches
+        self.matches = []
+        self.title_changes = []
+        self.changed_players = {}
+        self.ledger = []
+        self.standings = standing_changes()
+        return saved
+
+def generate_winners(matches, chunk_size=500, on_save=None):
+    """
+    Resolve every pending match in ``matches``, ``chunk_size`` per transaction.
+    Several workers can run this at once: a chunk that loses a match to
+    another worker is rolled back and replayed without it.
+    Returns the resolved matches.
+    """
+    pending = list(matches.filter(winner__isnull=True).order_by("pk").values_list("pk", flat=True))
+    resolved = []
+    for start in range(0, len(pending), chunk_size):
+        chunk = pending[start:start + chunk_size]
+        resolved += retry_on_conflict(lambda: resolve_chunk(chunk, on_save))
+    return resolved
+
+def resolve_chunk(match_ids, on_save=None):
+    """Resolve the matches among ``match_ids`` that are still pending, with fresh players. Call it in a transaction."""
+    resolver = MatchResolver(on_save)
+    pending = SingleMatch.objects.filter(pk__in=match_ids, winner__isnull=True)
+    # The players are locked on their own, in pk order as resolve_match takes
+    # them: reached through nullable foreign keys they would sit on the outer
+    # side of a join, which FOR UPDATE OF cannot lock on every backend.
+    players = {
+        player.pk: player
+        for player in Player.all_objects.select_for_update(of=("self",)).select_related("band")
+        .filter(Q(pk__in=pending.values("player_1")) | Q(pk__in=pending.values("player_2"))).order_by("pk")
+    }
+    for match in pending.select_for_update().order_by("pk"):
+        match.player_1 = players.get(match.player_1_id)
+        match.player_2 = players.get(match.player_2_id)
+        resolver.resolve(match)
+    return resolver.save()
+
+def save_chunk(resolver, tournament, count):
+    # The chunk and the tournament checkpoint commit together, so a rerun
+    # never plays a pairing twice. Call it in the chunk's transaction.
+    resolver.save()
+    Tournament.objects.filter(pk=tournament.pk).update(checkpoint=count)
+    tournament.checkpoint = count
+
+def create_round_robin(players, name_prefix, tournament, price_amount, entry_amount, match_date, count=1, chunk_size=500, on_save=None):
+    """
+    Create and play a match for every pairing of ``players``, numbering them
+    from ``count``. Matches are committed ``chunk_size`` at a time with a fixed
+    number of queries per chunk, each chunk played on freshly locked players,
+    and pairings numbered below the tournament's checkpoint are skipped so an
+    interrupted run can be resumed.
+    Returns the next free match number.
+    """
+    resolver = MatchResolver(on_save)
+    players = [resolver.add_player(player) for player in players]
+    enter_players(tournament, players)
+    pairings = combinations(players, 2)
+
+    done = min(max(tournament.checkpoint - count, 0), comb(len(players), 2))
+    if done:
+        pairings = islice(pairings, done, None)
+        count += done
+
+    while True:
+        chunk = list(islice(pairings, chunk_size))
+        with transaction.atomic():
+            resolver.refresh()
+            for player_1, player_2 in chunk:
+                resolver.resolve(SingleMatch(
+                    name=f"{name_prefix}{count}",
+                    date=match_date,
+                    tournament=tournament,
+                    player_1=player_1,
+                    player_2=player_2,
+                    winner=None,
+                    price_amount=price_amount,
+                    entry_amount=entry_amount
+                ))
+                count += 1
+            save_chunk(resolver, tournament, count)
+        if len(chunk) < chunk_size:
+            return count
+
+def generate_tournament_winner(tournament, price_amount, entry_amount, match_date, count, on_save=None):
+    """
+    Play round robins between the players sharing the most wins until one is left.
+
+    Standings are loaded once and kept up to date in memory; the playoff matches
+    and the players' final totals are written in one go at the end, in the
+    transaction the players were locked in.
+    """
+    with transaction.atomic():
+        win_counts = Counter(dict(
+            TournamentStanding.objects
+            .filter(tournament=tournament, wins__gt=0, player__is_active=True)
+            .values_list("player_id", "wins")
+        ))
+        if not win_counts:
+            return
+
+        resolver = MatchResolver(on_save)
+        while True:
+            max_wins = max(win_counts.values())
+            top_ids = sorted(player_id for player_id, wins in win_counts.items() if wins == max_wins)
+
+            if len(top_ids) == 1:
+                break
+
+            missing = [player_id for player_id in top_ids if player_id not in resolver.players]
+            locked = Player.all_objects.select_for_update(of=("self",)).select_related("band").filter(pk__in=missing).order_by("pk")
+            for player in locked:
+                resolver.add_player(player)
+            top_players = [resolver.players[player_id] for player_id in top_ids]
+
+            for p1, p2 in combinations(top_players, 2):
+                winner = resolver.resolve(SingleMatch(
+                    name=f"Top Round Match {count}: {p1.name} vs {p2.name}",
+                    date=match_date,
+                    tournament=tournament,
+                    player_1=p1,
+                    player_2=p2,
+                    winner=None,
+                    price_amount=price_amount,
+                    entry_amount=entry_amount
+                ))
+                win_counts[winner.pk] += 1
+                count += 1
+
+        resolver.save()
+
 def get_paginated_object_list(request, page_request_var, query_set, count):
-    paginator = Paginator(query_set, count) 
+    paginator = Paginator(query_set, count)
     page = request.GET.get(page_request_var)
     try:
         query_set = paginator.page(page)
@@ -76,4 +411,82 @@ def get_paginated_object_list(request, page_request_var, query_set, count):
         query_set = paginator.page(1)
     except EmptyPage:
         query_set = paginator.page(paginator.num_pages)
-    return query_set
\ No newline at end of file
+    return query_set
+
+class KeysetPage:
+    """A page of a keyset-paginated queryset, with opaque cursors to its neighbours."""
+
+    def __init__(self, object_list, next_cursor=None, previous_cursor=None, estimated_total=None):
+        self.object_list = object_list
+        self.next_cursor = next_cursor
+        self.previous_cursor = previous_cursor
+        self.estimated_total = estimated_total
+
+    def __iter__(self):
+        return iter(self.object_list)
+
+    def __len__(self):
+        return len(self.object_list)
+
+    @property
+    def has_next(self):
+        return self.next_cursor is not None
+
+    @property
+    def has_previous(self):
+        return self.previous_cursor is not None
+
+def encode_cursor(obj, ordering):
+    # str() rather than DjangoJSONEncoder, which rounds datetimes to milliseconds
+    values = [getattr(obj, field.lstrip("-")) for field in ordering]
+    return base64.urlsafe_b64encode(json.dumps(values, default=str).encode()).decode()
+
+def decode_cursor(cursor, model, ordering):
+    try:
+        values = json.loads(base64.urlsafe_b64decode(cursor.encode()))
+        fields = [model._meta.get_field(field.lstrip("-")) for field in ordering]
+        return [getattr(field, "output_field", field).to_python(value) for field, value in zip(fields, values, strict=True)]
+    except (ValueError, TypeError, ValidationError):
+        return None
+
+def keyset_filter(ordering, values, backwards=False):
+    """Rows strictly after ``values`` in ``ordering`` (or before, when ``backwards``)."""
+    condition = Q(pk__in=[])
+    equal = Q()
+    for field, value in zip(ordering, values):
+        name = field.lstrip("-")
+        descending = field.startswith("-") != backwards
+        condition |= equal & Q(**{f"{name}__{'lt' if descending else 'gt'}": value})
+        equal &= Q(**{name: value})
+    return condition
+
+def get_keyset_page(request, query_set, count, ordering, estimated_total=None):
+    """
+    Cursor-based alternative to get_paginated_object_list. Each page is one
+    indexed range scan of ``count + 1`` rows, however deep it is, and no
+    COUNT(*) is run. ``ordering`` must end in a unique field.
+    """
+    model = query_set.model
+    after = request.GET.get("after")
+    before = request.GET.get("before")
+    after = decode_cursor(after, model, ordering) if after else None
+    before = decode_cursor(before, model, ordering) if before else None
+
+    if before is not None:
+        reverse_ordering = [field[1:] if field.startswith("-") else f"-{field}" for field in ordering]
+        rows = list(query_set.filter(keyset_filter(ordering, before, backwards=True)).order_by(*reverse_ordering)[:count + 1])
+        has_previous, has_next = len(rows) > count, True
+        rows = rows[:count][::-1]
+    else:
+        if after is not None:
+            query_set = query_set.filter(keyset_filter(ordering, after))
+        rows = list(query_set.order_by(*ordering)[:count + 1])
+        has_previous, has_next = after is not None, len(rows) > count
+        rows = rows[:count]
+
+    return KeysetPage(
+        rows,
+        next_cursor=encode_cursor(rows[-1], ordering) if has_next and rows else None,
+        previous_cursor=encode_cursor(rows[0], ordering) if has_previous and rows else None,
+        estimated_total=estimated_total,
+    )
@@ -1,67 +1,37 @@
 from django.shortcuts import render, get_object_or_404, redirect
-from .models import SingleMatch, Tournament
-from .forms import SingleMatchForm, NotificationForm, TournamentForm, CreateLeagueForm, CreateMatchSetupForm, ChampionshipChallengeForm, PlayerSelectionFilterForm
-from django.urls import reverse_lazy
-from .utils import generate_winner, get_paginated_object_list
+from django.http import HttpResponse, StreamingHttpResponse
+from .models import SingleMatch, Tournament, Job, TournamentStanding
+from .forms import SingleMatchForm, NotificationForm, TournamentForm, CreateLeagueForm, CreateMatchSetupForm, ChampionshipChallengeForm, PlayerSelectionFilterForm, TournamentForecastForm, SwissSetupForm, EliminationSetupForm
+from .utils import generate_winner, get_paginated_object_list, get_keyset_page
+from .queries import match_rows, match_cards, bracket_matches
+from .conditional import tournament_list_etag, tournament_detail_etag, singlematch_detail_etag, main_event_etag
+from academy.conditional import conditional_page
+from academy.queries import player_choices
+from .jobs import enqueue
+from .standings import enter_players, withdraw_results, restate_results
+from .search import remove_match_ids, reindexing
+from .live import event_stream
+from .forecast import forecast_tournament, tournament_players, MAX_FORECAST_PLAYERS
+from .formats import bracket_rounds
 from django.urls import reverse
 from django.contrib.auth.decorators import login_required
-from academy.models import Championship
-from django.db.models import Case, When, Value, IntegerField
-import datetime
-from academy.models import Band, Player
-from itertools import combinations
-from django.db.models import Count
+from django.db.models import Min, Max
 from django.db import transaction
-from django.db.models import Q
+import datetime
 from datetime import timedelta
 from django.utils.timezone import now
 
 
-def create_match(player1, player2, name, tournament, price_amount, entry_amount, match_date):
-    """Helper to create match and generate winner."""
-    match = SingleMatch.objects.create(
-        name=name,
-        date=match_date,
-        tournament=tournament,
-        player_1=player1,
-        player_2=player2,
-        winner=None,
-        price_amount=price_amount,
-        entry_amount=entry_amount
+def get_tournament_standings(tournament):
+    return (
+        TournamentStanding.objects
+        .filter(tournament=tournament)
+        .select_related("player__band")
+        .order_by("-wins", "played")
     )
-    generate_winner(match)
-    return match
-
-def generate_tournament_winner(tournament, price_amount, entry_amount, match_date, count):
-    while True:
-        player_wins = (
-            Player.objects
-            .filter(single_match_winner__tournament=tournament)
-            .annotate(wins_count=Count("single_match_winner"))
-            .order_by("-wins_count")
-        )
-
-        max_wins = player_wins.first().wins_count
-        top_players = list(player_wins.filter(wins_count=max_wins))
-
-        if len(top_players) == 1:
-            return
-        
-        with transaction.atomic():
-            for p1, p2 in combinations(top_players, 2):
-                create_match(
-                    player1=p1,
-                    player2=p2,
-                    name=f"Top Round Match {count}: {p1.name} vs {p2.name}",
-                    tournament=tournament,
-                    price_amount=price_amount,
-                    entry_amount=entry_amount,
-                    match_date=match_date
-                )
-                count += 1
-    return
 
 @login_required
+@conditional_page(tournament_list_etag)
 def tournament_list(request):
     tournaments = Tournament.objects.all().order_by("is_completed", "is_main_tournament", "-date", "-updated_at")
     return render(request, 'matches/tournament/tournament_list.html', {'tournaments': tournaments})
@@ -74,22 +44,15 @@ def tournament_complete(request, pk):
     return redirect('tournament_list')
 
 @login_required
+@conditional_page(tournament_detail_etag)
 def tournament_detail(request, pk):
     
     tournament = get_object_or_404(Tournament, pk=pk)
-    matches = SingleMatch.objects.filter(tournament=tournament).order_by("-updated_at")
-
-    player_wins = (
-        Player.objects
-        .filter(single_match_winner__tournament=tournament) 
-        .annotate(wins_count=Count("single_match_winner"))
-        .order_by("-wins_count")
-    )
+    matches = match_rows(SingleMatch.objects.filter(tournament=tournament)).order_by("-updated_at")
 
-    top_players = []
-    if player_wins.exists():
-        max_wins = player_wins.first().wins_count
-        top_players = player_wins.filter(wins_count=max_wins)
+    standings = list(get_tournament_standings(tournament))
+    leaders = [standing for standing in standings if standing.wins and standing.player.is_active]
+    top_standings = [standing for standing in leaders if standing.wins == leaders[0].wins] if leaders else []
 
     return render(
         request,
@@ -97,7 +60,36 @@ def tournament_detail(request, pk):
         {
             "tournament": tournament,
             "matches": matches,
-            "top_players": top_players,
+            "standings": standings,
+            "top_standings": top_standings,
+        },
+    )
+
+@login_required
+def tournament_forecast(request, pk):
+    tournament = get_object_or_404(Tournament, pk=pk)
+    form = TournamentForecastForm(request.GET or None, initial={"runs": 10000})
+
+    forecast = []
+    if form.is_valid():
+        players = list(form.cleaned_data.get("players") or tournament_players(tournament))
+        # The simulation grows with the number of pairings: past the cap it
+        # belongs in the forecast_tournament command, not a web request
+        if len(players) > MAX_FORECAST_PLAYERS:
+            form.add_error("players", f"A forecast here covers at most {MAX_FORECAST_PLAYERS} players: pick fewer, or use the forecast_tournament command.")
+        else:
+            forecast = [
+                (player, probability * 100)
+                for player, probability in forecast_tournament(players, runs=form.cleaned_data.get("runs"))
+            ]
+
+    return render(
+        request,
+        "matches/tournament/tournament_forecast.html",
+        {
+            "tournament": tournament,
+            "form": form,
+            "forecast": forecast,
         },
     )
 
@@ -120,7 +112,7 @@ def tournament_match_setup(request, pk):
 
     # --- Player filtering form ---
     filter_form = PlayerSelectionFilterForm(request.GET or None)
-    players_qs = Player.objects.all().order_by("-winningpercentage")
+    players_qs = player_choices().order_by("-rating")
 
     if filter_form.is_valid():
         players_qs = filter_form.filter_queryset(players_qs)
@@ -138,23 +130,55 @@ def tournament_match_setup(request, pk):
             entry_amount = form.cleaned_data.get("entry_amount") or 0
             match_name = form.cleaned_data.get("match_name")
 
-            match_date = datetime.date.today()
-            count = 1
+            job = enqueue(
+                "match_setup",
+                tournament_id=tournament.pk,
+                player_ids=[player.pk for player in players],
+                match_name=match_name,
+                price_amount=price_amount,
+                entry_amount=entry_amount,
+                match_date=datetime.date.today().isoformat(),
+            )
+            return redirect("job_detail", pk=job.pk)
 
-            with transaction.atomic():
-                for p1, p2 in combinations(players, 2):
-                    create_match(
-                        player1=p1,
-                        player2=p2,
-                        name=f"{match_name} Match {count}",
-                        tournament=tournament,
-                        price_amount=price_amount,
-                        entry_amount=entry_amount,
-                        match_date=match_date,
-                    )
-                    count += 1
-            generate_tournament_winner(tournament, price_amount, entry_amount, match_date, count)
-            return redirect("tournament_list")
+    return render(
+        request,
+        "matches/tournament/tournament_match_setup_form.html",
+        {
+            "form": form,
+            "form_name": form_name,
+            "filter_form": filter_form,
+            "list_url": reverse("tournament_list"),
+        },
+    )
+
+
+def tournament_bracket_setup(request, tournament, form_class, form_name):
+    filter_form = PlayerSelectionFilterForm(request.GET or None)
+    players_qs = player_choices().order_by("-rating")
+
+    if filter_form.is_valid():
+        players_qs = filter_form.filter_queryset(players_qs)
+
+    form = form_class(request.POST or None)
+    form.fields["players"].queryset = players_qs
+
+    if request.method == "POST" and form.is_valid():
+        tournament.format = form_class.tournament_format
+        tournament.save()
+        # The format's extra fields (the Swiss round count) go to the job as they are
+        options = {name: form.cleaned_data.get(name) for name in form.fields if name not in CreateMatchSetupForm.base_fields}
+        job = enqueue(
+            form_class.tournament_format,
+            tournament_id=tournament.pk,
+            player_ids=[player.pk for player in form.cleaned_data.get("players")],
+            match_name=form.cleaned_data.get("match_name"),
+            price_amount=form.cleaned_data.get("price_amount") or 0,
+            entry_amount=form.cleaned_data.get("entry_amount") or 0,
+            match_date=datetime.date.today().isoformat(),
+            **options,
+        )
+        return redirect("job_detail", pk=job.pk)
 
     return render(
         request,
@@ -167,6 +191,32 @@ def tournament_match_setup(request, pk):
         },
     )
 
+@login_required
+def tournament_swiss_setup(request, pk):
+    tournament = get_object_or_404(Tournament, pk=pk)
+    return tournament_bracket_setup(request, tournament, SwissSetupForm, f"Swiss Tournament - {tournament.name}")
+
+@login_required
+def tournament_elimination_setup(request, pk):
+    tournament = get_object_or_404(Tournament, pk=pk)
+    return tournament_bracket_setup(request, tournament, EliminationSetupForm, f"Single Elimination - {tournament.name}")
+
+@login_required
+def tournament_bracket(request, pk):
+    tournament = get_object_or_404(Tournament, pk=pk)
+    matches = list(
+        bracket_matches(SingleMatch.objects.filter(tournament=tournament))
+        .order_by("round_number", "pk")
+    )
+    return render(
+        request,
+        "matches/tournament/tournament_bracket.html",
+        {
+            "tournament": tournament,
+            "standings": get_tournament_standings(tournament),
+            "rounds": bracket_rounds(matches),
+        },
+    )
 
 @login_required
 def tournament_create_league(request, pk):
@@ -181,43 +231,16 @@ def tournament_create_league(request, pk):
             price_amount = form.cleaned_data.get("price_amount") or 0
             entry_amount = form.cleaned_data.get("entry_amount") or 0
 
-            match_date = datetime.date.today()
-            count = 1
-
-            with transaction.atomic():
-                if bands:
-                    for band in bands:
-                        players = Player.objects.filter(band=band)
-                        if gender != "Both":
-                            players = players.filter(gender=gender)
-                        for p1, p2 in combinations(players, 2):
-                            create_match(
-                                player1=p1,
-                                player2=p2,
-                                name=f"{band.name} Stage Match: {count}",
-                                tournament=tournament,
-                                price_amount=price_amount,
-                                entry_amount=entry_amount,
-                                match_date=match_date
-                            )
-                            count += 1
-                else:
-                    players = Player.objects.all()
-                    if gender != "Both":
-                        players = players.filter(gender=gender)
-                    for p1, p2 in combinations(players, 2):
-                        create_match(
-                            player1=p1,
-                            player2=p2,
-                            name=f"League Stage Match: {count}",
-                            tournament=tournament,
-                            price_amount=price_amount,
-                            entry_amount=entry_amount,
-                            match_date=match_date
-                        )
-                        count += 1
-            generate_tournament_winner(tournament, price_amount, entry_amount, match_date, count)
-            return redirect('tournament_list')
+            job = enqueue(
+                "league",
+                tournament_id=tournament.pk,
+                gender=gender,
+                band_ids=[band.pk for band in bands] if bands else [],
+                price_amount=price_amount,
+                entry_amount=entry_amount,
+                match_date=datetime.date.today().isoformat(),
+            )
+            return redirect('job_detail', pk=job.pk)
 
     else:
         form = CreateLeagueForm()
@@ -249,46 +272,45 @@ def tournament_update(request, pk):
 def tournament_delete(request, pk):
     instance = get_object_or_404(Tournament, pk=pk)
     if request.method == 'POST':
-        instance.delete()
+        # The matches stay, without a tournament
+        with transaction.atomic(), reindexing(SingleMatch.objects.filter(tournament=instance)):
+            instance.delete()
         if request.htmx:
-                tournaments = Tournament.objects.all().order_by("-updated_at")
-                return render(request, "matches/tournament/partials/table_body.html", {"tournaments": tournaments})
+            return HttpResponse()
     return render(
         request,
         "partials/confirm_delete.html",
-        {"instance": instance, "reverse_url": reverse("tournament_list"), "delete_view_name": "tournament_delete"},
+        {"instance": instance, "reverse_url": reverse("tournament_list"), "delete_view_name": "tournament_delete", "row_id": f"tournament-{instance.pk}"},
     )
 
+SINGLE_MATCH_ORDERING = ("is_finished", "-updated_at", "-id")
+
 def get_single_match_object_list():
-    return (
-        SingleMatch.objects
-        .annotate(
-            is_unfinished=Case(
-                When(winner__isnull=True, then=Value(0)),
-                default=Value(1),
-                output_field=IntegerField(),
-            )
-        )
-    ).order_by("is_unfinished", "-updated_at")
+    return match_rows().order_by(*SINGLE_MATCH_ORDERING)
 
-@login_required
-def singlematch_list(request):
+def get_single_match_page(request):
+    """Search results page by rank; the full list pages by cursor along singlematch_list_idx."""
     query = request.GET.get("q")
-    matches = get_single_match_object_list()
     if query:
-        matches = matches.search(query)
-    page_request_var = 'page'
-    matches = get_paginated_object_list(request, page_request_var, matches, 25)
+        return get_paginated_object_list(request, 'page', match_rows(SingleMatch.objects.search(query)), 25)
+    bounds = SingleMatch.objects.aggregate(first=Min("id"), last=Max("id"))
+    estimated_total = bounds["last"] - bounds["first"] + 1 if bounds["last"] else 0
+    return get_keyset_page(request, get_single_match_object_list(), 25, SINGLE_MATCH_ORDERING, estimated_total)
+
+@login_required
+def singlematch_list(request):
     context = {
         'tournament': None, 
-        "page_request_var": page_request_var, 
-        'matches': matches
+        "page_request_var": 'page', 
+        'query': request.GET.get("q"),
+        'matches': get_single_match_page(request)
         }
     return render(request, 'matches/singlematch/singlematch_list.html', context)
 
 @login_required
+@conditional_page(singlematch_detail_etag)
 def singlematch_detail(request, pk):
-    match = get_object_or_404(SingleMatch, pk=pk)
+    match = get_object_or_404(match_cards(), pk=pk)
     notifications = match.match_notification.all().order_by("timestamp")
 
     return render(
@@ -306,7 +328,9 @@ def singlematch_create(request):
     if request.method == 'POST':
         form = SingleMatchForm(request.POST)
         if form.is_valid():
-            form.save()
+            with transaction.atomic():
+                match = form.save()
+                enter_players(match.tournament, [match.player_1, match.player_2])
             return redirect('singlematch_list')
     else:
         form = SingleMatchForm()
@@ -319,7 +343,9 @@ def singlematch_update(request, pk):
     if request.method == 'POST':
         form = SingleMatchForm(request.POST, instance=match)
         if form.is_valid():
-            form.save()
+            # A finished match can change tournament or players: its result moves with it
+            with transaction.atomic(), restate_results(SingleMatch.objects.filter(pk=match.pk)):
+                form.save()
             return redirect('singlematch_detail', pk=match.pk)
     else:
         form = SingleMatchForm(instance=match)
@@ -329,36 +355,45 @@ def singlematch_update(request, pk):
 def singlematch_delete(request, pk):
     instance = get_object_or_404(SingleMatch, pk=pk)
     if request.method == 'POST':
-        instance.delete()
+        with transaction.atomic():
+            withdraw_results(SingleMatch.objects.filter(pk=pk))
+            instance.delete()
+            remove_match_ids([pk])
         if request.htmx:
-            matches = get_single_match_object_list()
-            page_request_var = 'page'
-            matches = get_paginated_object_list(request, page_request_var, matches, 25)
-            context = {
-                'tournament': None, 
-                "page_request_var": page_request_var, 
-                'matches': matches
-                }
-            return render(
-                request,
-                "matches/singlematch/partials/table_body.html",
-                context
-            )
-    return render(request, 'partials/confirm_delete.html', {'instance': instance, 'reverse_url': reverse('singlematch_list'), "delete_view_name": "singlematch_delete"})
+            return HttpResponse()
+    return render(request, 'partials/confirm_delete.html', {'instance': instance, 'reverse_url': reverse('singlematch_list'), "delete_view_name": "singlematch_delete", "row_id": f"match-{instance.pk}"})
 
 @login_required
 def singlematch_execute(request, pk):
     match = get_object_or_404(SingleMatch, pk=pk)
-    generate_winner(match)
+    # Only a POST resolves: a prefetched or repeated GET must never pay out
+    if request.method == "POST":
+        generate_winner(match)
     return redirect('singlematch_detail', pk=match.pk)
 
 @login_required
 def singlematch_complete_all_matches(request):
-    matches = SingleMatch.objects.filter(winner=None, tournament__is_main_tournament=False)
-    with transaction.atomic():
-        for match in matches:
-            generate_winner(match)
-    return redirect('singlematch_list')
+    job = enqueue("complete_all_matches")
+    return redirect('job_detail', pk=job.pk)
+
+@login_required
+def job_detail(request, pk):
+    job = get_object_or_404(Job, pk=pk)
+    if request.htmx:
+        return render(request, "matches/jobs/partials/progress.html", {"job": job})
+    return render(request, "matches/jobs/job_detail.html", {"job": job})
+
+@login_required
+def job_cancel(request, pk):
+    if request.method == "POST":
+        Job.objects.filter(pk=pk, status__in=["pending", "running"]).update(status="cancelled")
+    return redirect("job_detail", pk=pk)
+
+@login_required
+def job_resume(request, pk):
+    if request.method == "POST":
+        Job.objects.filter(pk=pk, status__in=["failed", "cancelled"]).update(status="pending", error="", finished_at=None)
+    return redirect("job_detail", pk=pk)
 
 @login_required
 def create_notification(request, pk):
@@ -382,6 +417,7 @@ def create_notification(request, pk):
     )
 
 @login_required
+@conditional_page(main_event_etag)
 def upcoming_main_tournament(request):
     seven_days_ago = now().date() - timedelta(days=7)
 
@@ -401,7 +437,7 @@ def upcoming_main_tournament(request):
         if days_until < 0:
             championship_freeze = True
 
-    matches = SingleMatch.objects.filter(tournament=tournament)
+    matches = match_cards(SingleMatch.objects.filter(tournament=tournament))
 
     # Dropdown list of all completed main tournaments
     completed_tournaments = Tournament.objects.filter(
@@ -412,7 +448,7 @@ def upcoming_main_tournament(request):
     if request.headers.get("HX-Request"):
         tournament_id = request.GET.get("tournament_id")
         tournament = get_object_or_404(Tournament, pk=tournament_id)
-        matches = SingleMatch.objects.filter(tournament=tournament)
+        matches = match_cards(SingleMatch.objects.filter(tournament=tournament))
         return render(
             request,
             "matches/tournament/partials/tournament_details_partial.html",
@@ -436,7 +472,7 @@ def upcoming_main_tournament(request):
 
 @login_required
 def challenge_for_championship(request, player_id):
-    challenger = get_object_or_404(Player, pk=player_id)  # Top player in this tournament
+    challenger = get_object_or_404(player_choices(), pk=player_id)  # Top player in this tournament
 
     if request.method == "POST":
         form = ChampionshipChallengeForm(request.POST)
@@ -453,6 +489,7 @@ def challenge_for_championship(request, player_id):
                 entry_amount=form.cleaned_data['entry_amount'],
                 is_championship_match=True
             )
+            enter_players(match.tournament, [match.player_1, match.player_2])
             return redirect("singlematch_detail", pk=match.pk)
     else:
         form = ChampionshipChallengeForm()
@@ -464,4 +501,22 @@ def challenge_for_championship(request, player_id):
             "form": form,
             "challenger": challenger
         },
-    )
\ No newline at end of file
+    )
+
+@login_required
+async def live_feed(request):
+    """
+    Match results, title changes and notifications pushed as Server-Sent
+    Events while they are written. Every client shares the one poller of
+    the process (see match.live). Serve it through wrestling.asgi: under
+    WSGI each open stream holds a worker.
+    """
+    tournament_id = request.GET.get("tournament", "")
+    response = StreamingHttpResponse(
+        event_stream(int(tournament_id) if tournament_id.isdigit() else None),
+        content_type="text/event-stream",
+    )
+    response["Cache-Control"] = "no-cache"
+    # Tell proxies not to buffer the stream
+    response["X-Accel-Buffering"] = "no"
+    return response
@@ -2,6 +2,9 @@
 ASGI config for wrestling project.
 
 It exposes the ASGI callable as a module-level variable named ``application``.
+Serve it with an ASGI server (``uvicorn wrestling.asgi:application``) for the
+live feed: its Server-Sent Events stream stays open for as long as a client
+watches.
 
 For more information on this file, see
 https://docs.djangoproject.com/en/5.2/howto/deployment/asgi/
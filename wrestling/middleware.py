@@ -0,0 +1,116 @@
+import json
+import logging
+import re
+import time
+from collections import Counter
+from contextlib import ExitStack
+from asgiref.sync import async_to_sync, iscoroutinefunction, markcoroutinefunction, sync_to_async
+from django.conf import settings
+from django.db import connections
+from django.urls import Resolver404, get_resolver
+
+logger = logging.getLogger("wrestling.sql")
+
+def fingerprint(sql):
+    """Collapse literals and IN lists, so the same query with other values reads the same."""
+    sql = re.sub(r"'(?:[^']|'')*'", "?", sql)
+    sql = re.sub(r"\b\d+(?:\.\d+)?\b", "?", sql)
+    sql = re.sub(r"\(\s*(?:%s|\?)(?:\s*,\s*(?:%s|\?))*\s*\)", "(...)", sql)
+    sql = sql.replace("%s", "?")
+    return re.sub(r"\s+", " ", sql).strip()
+
+class QueryRecorder:
+    """A connection.execute_wrapper that counts and times every query, whatever DEBUG is set to."""
+
+    def __init__(self):
+        self.count = 0
+        self.duration = 0.0
+        self.fingerprints = Counter()
+
+    def __call__(self, execute, sql, params, many, context):
+        start = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            self.duration += time.perf_counter() - start
+            self.count += 1
+            self.fingerprints[fingerprint(sql)] += 1
+
+    def duplicates(self):
+        return {sql: count for sql, count in self.fingerprints.most_common() if count > 1}
+
+def is_async_view(request):
+    try:
+        match = get_resolver(getattr(request, "urlconf", None)).resolve(request.path_info)
+    except Resolver404:
+        return False
+    return iscoroutinefunction(match.func)
+
+class QueryInstrumentationMiddleware:
+    """
+    Records the query count, SQL time and repeated queries of every request,
+    and the fragment cache hits and misses of its templates. They go out as a
+    Server-Timing header and one "wrestling.sql" log line; views over their
+    QUERY_BUDGETS entry (by URL name) log a warning.
+    """
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        if iscoroutinefunction(get_response):
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+        return self.record(request, self.get_response)
+
+    async def __acall__(self, request):
+        # An async view (the live feed) runs its queries in sync_to_async
+        # threads, out of the recorder's reach, and its stream outlives the
+        # request: it is passed straight through, with no thread hop. Sync
+        # views are recorded in the thread they run in.
+        if is_async_view(request):
+            return await self.get_response(request)
+        return await sync_to_async(self.record)(request, async_to_sync(self.get_response))
+
+    def record(self, request, get_response):
+        recorder = QueryRecorder()
+        request.fragment_cache = Counter()
+        start = time.perf_counter()
+        with ExitStack() as stack:
+            for connection in connections.all():
+                stack.enter_context(connection.execute_wrapper(recorder))
+            response = get_response(request)
+        total = time.perf_counter() - start
+
+        view_name = request.resolver_match.view_name if request.resolver_match else None
+        duplicates = recorder.duplicates()
+        response.headers["Server-Timing"] = ", ".join([
+            f'sql;dur={recorder.duration * 1000:.1f};desc="{recorder.count} queries"',
+            f'dup;desc="{sum(duplicates.values()) - len(duplicates)} repeated"',
+            f"total;dur={total * 1000:.1f}",
+        ])
+        cache_stats = request.fragment_cache
+        if cache_stats:
+            response.headers["Server-Timing"] += f', cache;desc="{cache_stats["hits"]} hits, {cache_stats["misses"]} misses"'
+
+        record = {
+            "view": view_name,
+            "path": request.path,
+            "status": response.status_code,
+            "queries": recorder.count,
+            "sql_ms": round(recorder.duration * 1000, 1),
+            "total_ms": round(total * 1000, 1),
+            "duplicates": dict(list(duplicates.items())[:5]),
+            "cache_hits": cache_stats["hits"],
+            "cache_misses": cache_stats["misses"],
+        }
+        logger.info(json.dumps(record))
+
+        budgets = getattr(settings, "QUERY_BUDGETS", {})
+        budget = budgets.get(view_name, getattr(settings, "QUERY_BUDGET_DEFAULT", None))
+        if budget is not None and recorder.count > budget:
+            logger.warning("%s ran %d queries, over its budget of %d: %s", view_name, recorder.count, budget, json.dumps(record))
+        return response
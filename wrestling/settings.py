@@ -52,10 +52,34 @@ MIDDLEWARE = [
     'django.contrib.messages.middleware.MessageMiddleware',
     'django.middleware.clickjacking.XFrameOptionsMiddleware',
     'django_htmx.middleware.HtmxMiddleware',
+    'wrestling.middleware.QueryInstrumentationMiddleware',
 ]
 
+# Query budgets per URL name, checked by QueryInstrumentationMiddleware.
+# Views without an entry fall back to QUERY_BUDGET_DEFAULT (None: no budget).
+QUERY_BUDGET_DEFAULT = 50
+QUERY_BUDGETS = {
+    'band-list': 30,
+    'player-list': 30,
+    'tournament_detail': 40,
+    'tournament_match_setup': 30,
+    'singlematch_list': 20,
+}
+
 ROOT_URLCONF = 'wrestling.urls'
 
+# Fragments cached with {% versioned_cache %} are keyed by model versions kept
+# in the database, so a per-process backend stays correct with several
+# workers; FileBasedCache shares the entries between them as well.
+CACHES = {
+    'default': {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+    },
+}
+# Entries from older versions are never read again and only wait to expire.
+# Fragments showing "time since" durations are at most this stale.
+FRAGMENT_CACHE_TIMEOUT = 300
+
 TEMPLATES = [
     {
         'BACKEND': 'django.template.backends.django.DjangoTemplates',
@@ -81,6 +105,14 @@ DATABASES = {
     'default': {
         'ENGINE': 'django.db.backends.sqlite3',
         'NAME': BASE_DIR / 'db.sqlite3',
+        # WAL lets pages keep reading while a league is being written, and
+        # IMMEDIATE transactions wait for the write lock instead of failing
+        # with "database is locked" half way through.
+        'OPTIONS': {
+            'init_command': 'PRAGMA journal_mode=WAL;',
+            'transaction_mode': 'IMMEDIATE',
+            'timeout': 20,
+        },
     }
 }
 
@@ -132,4 +164,20 @@ STATIC_URL = 'static/'
 
 DEFAULT_AUTO_FIELD = 'django.db.models.BigAutoField'
 
-LOGIN_URL = '/login/'
\ No newline at end of file
+LOGIN_URL = '/login/'
+
+LOGGING = {
+    'version': 1,
+    'disable_existing_loggers': False,
+    'handlers': {
+        'console': {
+            'class': 'logging.StreamHandler',
+        },
+    },
+    'loggers': {
+        'wrestling.sql': {
+            'handlers': ['console'],
+            'level': 'INFO',
+        },
+    },
+}